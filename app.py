@@ -1,45 +1,191 @@
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, Response, render_template, request, jsonify, send_file
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import os
+import random
 import re
+import sys
 import markdown
 import io
+import json
+import logging
+import multiprocessing
+import time
+import hashlib
+import sqlite3
+import tempfile
+import threading
+import urllib.parse
+import uuid
+import zlib
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import mm
+from reportlab.lib.utils import ImageReader
+from PIL import Image as PILImage
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image as RLImage, PageBreak, Table, TableStyle, Preformatted, KeepTogether
 from reportlab.lib import colors
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
 from reportlab.pdfgen import canvas
+from reportlab.graphics.shapes import Drawing, Group
 import base64
+import bisect
+import contextlib
+import functools
 from dotenv import load_dotenv
 
+# Worker du pool de rendu PDF (spawn) : le module y est réimporté pour render_pdf seulement,
+# les effets de bord du serveur (messages de démarrage, cache LLM SQLite) y sont sautés.
+# Le nom du processus est fixé avant cet import (parent_process() ne l'est qu'après)
+PDF_WORKER_PROCESS = multiprocessing.current_process().name != 'MainProcess'
+from werkzeug.wsgi import ClosingIterator
+
+load_dotenv()
+
+# Journalisation par catégorie (pathway.llm, pathway.models, pathway.cache, pathway.pdf) :
+# niveau global, niveaux et échantillonnage par catégorie, sortie texte ou JSON (une ligne par message)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_LEVELS = os.getenv('LOG_LEVELS', '')  # ex. "pdf=DEBUG,models=WARNING"
+LOG_SAMPLE = os.getenv('LOG_SAMPLE', '')  # ex. "pdf=0.05" : part des messages DEBUG/INFO conservés
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()
+LOG_RECORD_FIELDS = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'sampled'}
+SAMPLED = {'sampled': True}  # extra= des messages d'une série déjà tirée par log_sampled
+
+def parse_category_settings(value, convert):
+    """'pdf=DEBUG,llm=WARNING' -> {'pdf': convert('DEBUG'), ...} ; les entrées invalides sont ignorées"""
+    settings = {}
+    for item in value.split(','):
+        name, sep, setting = item.partition('=')
+        if sep and name.strip():
+            try:
+                settings[name.strip()] = convert(setting.strip())
+            except ValueError:
+                pass
+    return settings
+
+def log_level(name):
+    level = logging.getLevelName(name.upper())
+    if not isinstance(level, int):
+        raise ValueError(name)
+    return level
+
+def sample_rate(value):
+    return min(max(float(value), 0.0), 1.0)
+
+LOG_SAMPLE_RATES = parse_category_settings(LOG_SAMPLE, sample_rate)
+
+class StructuredFormatter(logging.Formatter):
+    """Message suivi des champs passés en extra= (clé=valeur), ou objet JSON par ligne"""
+
+    def __init__(self, as_json):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+        self.as_json = as_json
+
+    @staticmethod
+    def fields(record):
+        return {key: value for key, value in vars(record).items() if key not in LOG_RECORD_FIELDS}
+
+    def formatMessage(self, record):
+        text = super().formatMessage(record)
+        fields = self.fields(record)
+        return text + ''.join(f' {key}={value}' for key, value in fields.items()) if fields else text
+
+    def format(self, record):
+        if not self.as_json:
+            return super().format(record)
+        entry = {'ts': self.formatTime(record), 'level': record.levelname, 'logger': record.name,
+                 'msg': record.getMessage(), **self.fields(record)}
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class SamplingFilter(logging.Filter):
+    """Conserve une fraction des messages DEBUG/INFO d'une catégorie ; avertissements et erreurs passent tous"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        sampled = getattr(record, 'sampled', None)
+        return sampled if sampled is not None else random.random() < self.rate
+
+def configure_logging():
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(StructuredFormatter(LOG_FORMAT == 'json'))
+    root = logging.getLogger('pathway')
+    root.handlers[:] = [handler]
+    root.setLevel(log_level(LOG_LEVEL))
+    root.propagate = False
+    for name, level in parse_category_settings(LOG_LEVELS, log_level).items():
+        logging.getLogger(f'pathway.{name}').setLevel(level)
+    for name, rate in LOG_SAMPLE_RATES.items():
+        logging.getLogger(f'pathway.{name}').addFilter(SamplingFilter(rate))
+
+def log_sampled(logger, level=logging.DEBUG):
+    """Tirage unique pour une série de diagnostics (un export PDF entier) : à appeler avant de les construire.
+
+    Les messages de la série sont ensuite émis avec extra=SAMPLED, sans second tirage.
+    """
+    if not logger.isEnabledFor(level):
+        return False
+    rate = LOG_SAMPLE_RATES.get(logger.name.partition('.')[2], 1.0)
+    return rate >= 1 or random.random() < rate
+
+configure_logging()
+log = logging.getLogger('pathway')
+llm_log = logging.getLogger('pathway.llm')
+models_log = logging.getLogger('pathway.models')
+cache_log = logging.getLogger('pathway.cache')
+pdf_log = logging.getLogger('pathway.pdf')
+
 # Importer svglib pour gérer les SVG (optionnel)
 try:
     from svglib.svglib import svg2rlg
     from reportlab.graphics import renderPDF
     SVG_SUPPORT = True
-    print("✅ svglib chargé - Support SVG activé")
+    if not PDF_WORKER_PROCESS:
+        log.info("✅ svglib chargé - Support SVG activé")
 except ImportError:
     SVG_SUPPORT = False
-    print("⚠️ svglib non installé - Les SVG seront convertis en images")
+    if not PDF_WORKER_PROCESS:
+        log.warning("⚠️ svglib non installé - Les SVG seront convertis en images")
 
 # Parser HTML (optionnel)
 try:
-    from bs4 import BeautifulSoup
-    BS4_SUPPORT = True
+    from lxml import html as lxml_html
+    LXML_SUPPORT = True
 except ImportError:
-    BS4_SUPPORT = False
-    print("⚠️ bs4 non installé - Rendu HTML simplifié dans le PDF")
-
-load_dotenv()
+    LXML_SUPPORT = False
+    if not PDF_WORKER_PROCESS:
+        log.warning("⚠️ lxml non installé - Rendu HTML simplifié dans le PDF")
 
 app = Flask(__name__)
 
-# Désactiver le cache des templates pour le développement
-app.config['TEMPLATES_AUTO_RELOAD'] = True
-app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
+# Mode de service : development (serveur Flask, templates rechargés, pas de cache navigateur)
+# ou production (waitress, templates compilés une fois, fichiers statiques mis en cache)
+PATHWAY_ENV = os.getenv('PATHWAY_ENV', 'development').lower()
+PRODUCTION = PATHWAY_ENV == 'production'
+STATIC_MAX_AGE = int(os.getenv('STATIC_MAX_AGE', 43200 if PRODUCTION else 0))
+MAX_CONTENT_LENGTH_MB = float(os.getenv('MAX_CONTENT_LENGTH_MB', 100 if PRODUCTION else 0))  # 0 : pas de limite
+
+app.config['TEMPLATES_AUTO_RELOAD'] = not PRODUCTION
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = STATIC_MAX_AGE
+app.config['MAX_CONTENT_LENGTH'] = int(MAX_CONTENT_LENGTH_MB * 1024 * 1024) or None
+
+# Serveur waitress (mode production)
+WAITRESS_THREADS = int(os.getenv('WAITRESS_THREADS', 16))
+WAITRESS_CONNECTION_LIMIT = int(os.getenv('WAITRESS_CONNECTION_LIMIT', 100))
+WAITRESS_BACKLOG = int(os.getenv('WAITRESS_BACKLOG', 1024))
+WAITRESS_CHANNEL_TIMEOUT = int(os.getenv('WAITRESS_CHANNEL_TIMEOUT', 120))
+SHUTDOWN_TIMEOUT = float(os.getenv('SHUTDOWN_TIMEOUT', 30))
 
 # Configuration en mémoire
 config = {
@@ -48,6 +194,641 @@ config = {
     'ollama_base_url': os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434'),
 }
 
+# Client HTTP amont (Mistral, Ollama) : pool de connexions par hôte + keep-alive
+# La taille du pool suit par défaut le nombre de threads waitress
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', WAITRESS_THREADS))
+HTTP_POOL_HOSTS = int(os.getenv('HTTP_POOL_HOSTS', 10))
+HTTP_CONNECT_RETRIES = int(os.getenv('HTTP_CONNECT_RETRIES', 2))
+HTTP_RETRY_BACKOFF = float(os.getenv('HTTP_RETRY_BACKOFF', 0.3))
+
+def create_http_session():
+    """Crée la session HTTP partagée par tous les appels LLM et listes de modèles"""
+    # Seules les erreurs de connexion sont rejouées (requête jamais partie : sans risque pour un POST).
+    # read=False : un timeout de lecture remonte tel quel (requests.exceptions.ReadTimeout -> 408)
+    retry = Retry(
+        total=HTTP_CONNECT_RETRIES,
+        connect=HTTP_CONNECT_RETRIES,
+        read=False,
+        backoff_factor=HTTP_RETRY_BACKOFF,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_HOSTS,
+        pool_maxsize=HTTP_POOL_SIZE,
+        max_retries=retry
+    )
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+http_session = create_http_session()
+
+# Métriques Prometheus (/metrics) : enregistrement sans verrou partagé, agrégation à la lecture
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LLM_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+METRICS_MAX_MODELS = int(os.getenv('METRICS_MAX_MODELS', 50))
+
+class Metric:
+    """Compteur, jauge ou histogramme ; les valeurs vivent dans les fragments du registre"""
+
+    def __init__(self, registry, kind, name, help_text, labels, buckets=None):
+        self.registry = registry
+        self.kind = kind
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+
+    def inc(self, *labels, amount=1):
+        shard = self.registry.shard()
+        key = (self.name, labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def dec(self, *labels):
+        self.inc(*labels, amount=-1)
+
+    def observe(self, value, *labels):
+        shard = self.registry.shard()
+        key = (self.name, labels)
+        counts = shard.get(key)
+        if counts is None:
+            # Un compte par borne, un pour +Inf, puis la somme des valeurs
+            counts = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+class MetricsRegistry:
+    """Registre de métriques au format texte Prometheus.
+
+    Chaque thread écrit dans son propre dictionnaire, enregistré une seule fois sous verrou : un
+    enregistrement est une mise à jour de dict locale, sans contention entre threads de requête.
+    La lecture additionne les fragments ; ceux des threads terminés sont fusionnés puis oubliés.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._local = threading.local()
+        self._shards = []  # (thread, fragment)
+        self._retired = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name, help_text, labels=()):
+        return self._register(Metric(self, 'counter', name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()):
+        return self._register(Metric(self, 'gauge', name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self._register(Metric(self, 'histogram', name, help_text, labels, tuple(buckets)))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+            return shard
+
+    @staticmethod
+    def _merge(target, source):
+        # dict.copy() et list() sont atomiques sous le GIL : pas de lecture d'un dict en cours de modification
+        for key, value in source.copy().items():
+            current = target.get(key)
+            if isinstance(value, list):
+                value = list(value)
+                target[key] = value if current is None else [a + b for a, b in zip(current, value)]
+            else:
+                target[key] = value if current is None else current + value
+
+    def collect(self):
+        """Valeurs agrégées : {(nom, labels): nombre, ou [comptes par borne..., somme] pour un histogramme}"""
+        totals = {}
+        with self._lock:
+            alive = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    alive.append((thread, shard))
+                else:
+                    self._merge(self._retired, shard)
+            self._shards = alive
+            self._merge(totals, self._retired)
+            for _, shard in alive:
+                self._merge(totals, shard)
+        return totals
+
+    def render(self):
+        """Exposition texte Prometheus (version 0.0.4)"""
+        series = {}
+        for (name, labels), value in self.collect().items():
+            series.setdefault(name, []).append((labels, value))
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            samples = sorted(series.get(metric.name, []))
+            if not samples and not metric.labels and metric.kind != 'histogram':
+                samples = [((), 0)]
+            for labels, value in samples:
+                pairs = list(zip(metric.labels, labels))
+                if metric.kind != 'histogram':
+                    lines.append(f'{metric.name}{format_labels(pairs)} {format_number(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (float('inf'),), value):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(float(bound))
+                    lines.append(f'{metric.name}_bucket{format_labels(pairs + [("le", le)])} {cumulative}')
+                lines.append(f'{metric.name}_sum{format_labels(pairs)} {format_number(value[-1])}')
+                lines.append(f'{metric.name}_count{format_labels(pairs)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+def format_labels(pairs):
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+def format_number(value):
+    return repr(round(value, 6)) if isinstance(value, float) else str(value)
+
+metrics = MetricsRegistry()
+
+HTTP_REQUESTS = metrics.counter('pathway_http_requests_total', 'Requêtes HTTP traitées', ('route', 'method', 'status'))
+HTTP_DURATION = metrics.histogram('pathway_http_request_duration_seconds',
+                                  'Durée des requêtes HTTP, jusqu\'à la fin de l\'envoi du corps (flux SSE compris)',
+                                  ('route', 'method'))
+HTTP_IN_FLIGHT = metrics.gauge('pathway_http_requests_in_flight', 'Requêtes HTTP en cours de traitement')
+HTTP_ERRORS = metrics.counter('pathway_http_errors_total',
+                              'Réponses en erreur par classe (408, 422, 429, 503, sinon 4xx/5xx)', ('route', 'class'))
+STREAM_ERRORS = metrics.counter('pathway_stream_errors_total',
+                                'Erreurs signalées dans un flux SSE (réponse HTTP 200) par classe', ('class',))
+LLM_DURATION = metrics.histogram('pathway_llm_request_duration_seconds',
+                                 'Latence des appels LLM amont (fin du flux en streaming)',
+                                 ('engine', 'model', 'stream'), LLM_LATENCY_BUCKETS)
+LLM_REQUESTS = metrics.counter('pathway_llm_requests_total', 'Appels LLM amont par issue (statut HTTP, timeout, connection)',
+                               ('engine', 'model', 'outcome'))
+
+HTTP_METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'))
+TRACKED_ERROR_CLASSES = frozenset(('408', '422', '429', '503'))
+
+def error_class(status):
+    """Classe d'erreur d'un statut HTTP : les statuts suivis gardent leur code, les autres 4xx/5xx"""
+    status = str(status)
+    return status if status in TRACKED_ERROR_CLASSES else f'{status[0]}xx'
+
+class MetricsMiddleware:
+    """Middleware WSGI : compte, chronomètre et classe les réponses par route Flask (règle, pas URL)"""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        start = time.perf_counter()
+        status = ['500']
+        recorded = []
+        
+        def capture(status_line, headers, exc_info=None):
+            status[0] = status_line[:3]
+            return start_response(status_line, headers, exc_info)
+        
+        def done():
+            if recorded:
+                return  # close() appelé plusieurs fois
+            recorded.append(True)
+            route = environ.get('pathway.route', 'unmatched')
+            method = environ.get('REQUEST_METHOD', 'GET')
+            method = method if method in HTTP_METHODS else 'other'
+            HTTP_IN_FLIGHT.dec()
+            HTTP_REQUESTS.inc(route, method, status[0])
+            HTTP_DURATION.observe(time.perf_counter() - start, route, method)
+            if status[0] >= '400':
+                HTTP_ERRORS.inc(route, error_class(status[0]))
+        
+        HTTP_IN_FLIGHT.inc()
+        try:
+            app_iter = self.wsgi_app(environ, capture)
+        except BaseException:
+            done()
+            raise
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if isinstance(file_wrapper, type) and type(app_iter) is file_wrapper:
+            # Fichier envoyé par le serveur lui-même (waitress) : l'envelopper l'obligerait à l'itérer en Python
+            done()
+            return app_iter
+        return ClosingIterator(app_iter, done)
+
+app.wsgi_app = MetricsMiddleware(app.wsgi_app)
+
+@app.before_request
+def label_route():
+    """Route des métriques : la règle d'URL (/api/pdf/<job_id>), jamais l'URL elle-même"""
+    request.environ['pathway.route'] = request.url_rule.rule if request.url_rule else 'unmatched'
+
+@app.before_request
+def limit_content_length():
+    """Corps annoncé au-delà de MAX_CONTENT_LENGTH_MB : 413 avant toute lecture (waitress l'applique aussi en production)"""
+    limit = app.config['MAX_CONTENT_LENGTH']
+    if limit and request.content_length and request.content_length > limit:
+        return jsonify({'error': f'Requête trop volumineuse (max {MAX_CONTENT_LENGTH_MB:g} Mo)'}), 413
+
+_llm_model_labels = set()
+_llm_model_labels_lock = threading.Lock()
+
+def llm_model_label(engine, model):
+    """Modèle en label : le nom vient du client, les modèles au-delà de METRICS_MAX_MODELS deviennent 'other'"""
+    key = (engine, model)
+    if key in _llm_model_labels:
+        return model
+    with _llm_model_labels_lock:
+        if len(_llm_model_labels) < METRICS_MAX_MODELS:
+            _llm_model_labels.add(key)
+            return model
+    return 'other'
+
+def upstream_outcome(e):
+    """Issue d'un appel amont qui a levé une exception"""
+    if isinstance(e, requests.exceptions.HTTPError) and e.response is not None:
+        return str(e.response.status_code)
+    if isinstance(e, requests.exceptions.Timeout):
+        return 'timeout'
+    if isinstance(e, requests.exceptions.ConnectionError):
+        return 'connection'
+    return 'error'
+
+def observe_llm(engine, model, stream, outcome, start):
+    model = llm_model_label(engine, model)
+    LLM_DURATION.observe(time.perf_counter() - start, engine, model, 'true' if stream else 'false')
+    LLM_REQUESTS.inc(engine, model, outcome)
+
+def llm_post(engine, model, url, stream=False, **kwargs):
+    """POST chronométré vers un moteur LLM ; en streaming réussi, l'appelant enregistre la fin du flux"""
+    start = time.perf_counter()
+    try:
+        response = http_session.post(url, stream=stream, **kwargs)
+    except requests.exceptions.RequestException as e:
+        observe_llm(engine, model, stream, upstream_outcome(e), start)
+        raise
+    if not stream or response.status_code >= 400:
+        observe_llm(engine, model, stream, str(response.status_code), start)
+    return response, start
+
+# Répertoire des données locales (caches, stockages)
+DATA_DIR = os.getenv('PATHWAY_DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
+
+# Cache des réponses LLM (mémoire LRU + disque SQLite)
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'true').lower() == 'true'
+LLM_CACHE_TTL = int(os.getenv('LLM_CACHE_TTL', 7 * 24 * 3600))
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv('LLM_CACHE_MEMORY_ENTRIES', 256))
+LLM_CACHE_DISK_MAX_MB = float(os.getenv('LLM_CACHE_DISK_MAX_MB', 50))
+LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH', os.path.join(DATA_DIR, 'llm_cache.sqlite3'))
+
+class ResponseCache:
+    """Cache à deux niveaux des sorties LLM validées : LRU en mémoire puis SQLite borné en taille.
+
+    Les lectures ne font pas d'écriture SQLite : les dates d'accès (ordre LRU du disque) sont
+    notées en mémoire et écrites par lots de TOUCH_BATCH, ou avant chaque éviction.
+    """
+
+    TOUCH_BATCH = 64
+
+    def __init__(self, path, memory_entries, disk_max_bytes, ttl):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.disk_max_bytes = disk_max_bytes
+        self.ttl = ttl
+        self._memory = OrderedDict()  # clé -> (expiration, valeur)
+        self._touched = {}  # clé -> dernier accès pas encore écrit sur disque
+        self._lock = threading.Lock()
+        self._db = None
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'expired': 0}
+        if path and disk_max_bytes > 0:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                self._db = sqlite3.connect(path, check_same_thread=False)
+                self._db.execute('PRAGMA journal_mode=WAL')
+                self._db.execute(
+                    'CREATE TABLE IF NOT EXISTS entries ('
+                    'key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, '
+                    'expires REAL NOT NULL, last_access REAL NOT NULL)'
+                )
+                self._db.execute('CREATE INDEX IF NOT EXISTS idx_entries_access ON entries(last_access)')
+                self._db.commit()
+            except sqlite3.Error as e:
+                cache_log.warning("⚠️ Cache LLM disque indisponible (%s): %s", path, e)
+                self._db = None
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self.stats['memory_hits'] += 1
+                    self._touch(key, now)
+                    return entry[1]
+                del self._memory[key]
+                self.stats['expired'] += 1
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute('SELECT value, expires FROM entries WHERE key = ?', (key,)).fetchone()
+                    if row is not None:
+                        value, expires = row
+                        if expires > now:
+                            self._touch(key, now)
+                            self._remember(key, expires, value)
+                            self.stats['disk_hits'] += 1
+                            return value
+                        self._db.execute('DELETE FROM entries WHERE key = ?', (key,))
+                        self._db.commit()
+                        self.stats['expired'] += 1
+                except sqlite3.Error as e:
+                    cache_log.warning("⚠️ Lecture cache LLM échouée: %s", e)
+
+            self.stats['misses'] += 1
+            return None
+
+    def set(self, key, value):
+        now = time.time()
+        expires = now + self.ttl
+        with self._lock:
+            self._remember(key, expires, value)
+            self.stats['stores'] += 1
+            if self._db is not None:
+                try:
+                    self._touched.pop(key, None)
+                    self._db.execute(
+                        'INSERT OR REPLACE INTO entries (key, value, size, expires, last_access) VALUES (?, ?, ?, ?, ?)',
+                        (key, value, len(value.encode('utf-8')), expires, now)
+                    )
+                    self._flush_touches()  # ordre LRU à jour avant l'éviction
+                    self._evict_disk(now)
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    cache_log.warning("⚠️ Écriture cache LLM échouée: %s", e)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._touched.clear()
+            if self._db is not None:
+                self._db.execute('DELETE FROM entries')
+                self._db.commit()
+
+    def snapshot(self):
+        """Compteurs et occupation courante du cache"""
+        with self._lock:
+            data = dict(self.stats)
+            data['memory_entries'] = len(self._memory)
+            data['disk_entries'] = 0
+            data['disk_bytes'] = 0
+            if self._db is not None:
+                count, size = self._db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+                data['disk_entries'] = count
+                data['disk_bytes'] = size
+        return data
+
+    def _touch(self, key, now):
+        """Note un accès (sous le verrou) ; écrit le lot sur disque quand il est plein"""
+        if self._db is None:
+            return
+        self._touched[key] = now
+        if len(self._touched) >= self.TOUCH_BATCH:
+            try:
+                self._flush_touches()
+                self._db.commit()
+            except sqlite3.Error as e:
+                cache_log.warning("⚠️ Mise à jour des accès du cache LLM échouée: %s", e)
+
+    def _flush_touches(self):
+        if self._touched:
+            self._db.executemany('UPDATE entries SET last_access = ? WHERE key = ?',
+                                 [(accessed, key) for key, accessed in self._touched.items()])
+            self._touched.clear()
+
+    def _remember(self, key, expires, value):
+        self._memory[key] = (expires, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def _evict_disk(self, now):
+        # Entrées expirées d'abord, puis les moins récemment utilisées jusqu'à repasser sous la limite
+        self._db.execute('DELETE FROM entries WHERE expires <= ?', (now,))
+        total = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= self.disk_max_bytes:
+            return
+        for key, size in self._db.execute('SELECT key, size FROM entries ORDER BY last_access').fetchall():
+            self._db.execute('DELETE FROM entries WHERE key = ?', (key,))
+            self.stats['evictions'] += 1
+            total -= size
+            if total <= self.disk_max_bytes:
+                break
+
+def llm_base_url(engine):
+    """URL de base du serveur qui répond pour ce moteur (configuration courante)"""
+    return config['ollama_base_url'] if engine == 'ollama' else config['mistral_base_url']
+
+def llm_cache_key(engine, model, base_url, system_prompt, temperature, prompt, meta=None):
+    """Clé de cache adressée par contenu : moteur, modèle, serveur, prompt système, température, prompt et méta.
+
+    Le serveur en fait partie : après un changement d'URL (réglages), les réponses de l'ancien ne sont plus servies.
+    """
+    system_hash = hashlib.sha256(system_prompt.encode('utf-8')).hexdigest()
+    raw = json.dumps([engine, model, base_url, system_hash, temperature, prompt, meta or {}], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+response_cache = ResponseCache(
+    LLM_CACHE_PATH,
+    LLM_CACHE_MEMORY_ENTRIES,
+    int(LLM_CACHE_DISK_MAX_MB * 1024 * 1024),
+    LLM_CACHE_TTL
+) if LLM_CACHE_ENABLED and not PDF_WORKER_PROCESS else None
+
+class SingleFlight:
+    """Regroupe les appels identiques en cours : un seul appel amont, résultat partagé par tous"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.stats = {'leaders': 0, 'coalesced': 0}
+
+    def do(self, key, func):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self.stats['leaders'] += 1
+            else:
+                self.stats['coalesced'] += 1
+        if not leader:
+            return future.result()
+        try:
+            result = func()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def snapshot(self):
+        with self._lock:
+            return {**self.stats, 'in_flight': len(self._calls)}
+
+inflight = SingleFlight()
+
+class SharedStream:
+    """Événements SSE d'une génération en cours : publiés par le meneur, rejoués à chaque suiveur"""
+
+    def __init__(self, flights, key):
+        self._flights = flights
+        self.key = key
+        self.events = []
+        self.finished = False
+        self.followers = 0
+        self._cond = threading.Condition()
+
+    def publish(self, event):
+        with self._cond:
+            self.events.append(event)
+            self._cond.notify_all()
+
+    def finish(self):
+        with self._cond:
+            if self.finished:
+                return
+            self.finished = True
+            self._cond.notify_all()
+        self._flights.release(self)
+
+    def has_followers(self):
+        with self._cond:
+            return self.followers > 0
+
+    def lead(self, events, started):
+        """Relaie les événements au client du meneur en les publiant.
+
+        Si ce client se déconnecte, la lecture continue tant que des suiveurs écoutent ;
+        le flux amont n'est fermé (events.close()) que lorsque plus personne ne l'attend.
+        """
+        started.append(True)
+        try:
+            for event in events:
+                self.publish(event)
+                yield event
+        except GeneratorExit:
+            for event in events:
+                self.publish(event)
+                if not self.has_followers():
+                    break
+        finally:
+            events.close()
+            self.finish()
+
+    def follow(self, started):
+        """Rejoue les événements depuis le début, puis au fil de leur publication"""
+        started.append(True)
+        index = 0
+        try:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: len(self.events) > index or self.finished)
+                    batch = self.events[index:]
+                    finished = self.finished
+                index += len(batch)
+                yield from batch
+                if finished:
+                    return
+        finally:
+            self.leave()
+
+    def leave(self):
+        with self._cond:
+            self.followers -= 1
+
+    def response(self, headers, events=None):
+        """Réponse SSE du meneur (events : relais du flux amont) ou d'un suiveur (events=None).
+
+        Si le serveur ferme la réponse sans l'avoir lue, le meneur produit quand même le flux
+        pour ses suiveurs, et le suiveur est retiré.
+        """
+        started = []
+        generator = self.follow(started) if events is None else self.lead(events, started)
+
+        def on_close():
+            if started:
+                return
+            if events is None:
+                self.leave()
+                return
+            drain = self.lead(events, started)
+            try:
+                for _ in drain:
+                    if not self.has_followers():
+                        break
+            finally:
+                drain.close()
+
+        response = Response(generator, mimetype='text/event-stream', headers=headers)
+        response.call_on_close(on_close)
+        return response
+
+class StreamFlight:
+    """Regroupe les générations en streaming identiques en cours (pendant de SingleFlight pour les flux SSE).
+
+    Le premier client lit le flux amont ; les suivants reçoivent les mêmes événements depuis le début.
+    """
+
+    def __init__(self):
+        self._streams = {}
+        self._lock = threading.Lock()
+        self.stats = {'leaders': 0, 'coalesced': 0}
+
+    def join(self, key):
+        """Retourne (flux partagé, True si l'appelant est le meneur et doit appeler le LLM)"""
+        with self._lock:
+            stream = self._streams.get(key)
+            if stream is None:
+                stream = self._streams[key] = SharedStream(self, key)
+                self.stats['leaders'] += 1
+                return stream, True
+            self.stats['coalesced'] += 1
+        with stream._cond:
+            stream.followers += 1
+        return stream, False
+
+    def release(self, stream):
+        with self._lock:
+            if self._streams.get(stream.key) is stream:
+                del self._streams[stream.key]
+
+    def snapshot(self):
+        with self._lock:
+            return {**self.stats, 'in_flight': len(self._streams)}
+
+stream_flights = StreamFlight()
+
+def stream_failed(flight, error):
+    """Échec du meneur avant le flux : transmis aux suiveurs en événement 'error', puis retourné tel quel"""
+    if flight is not None:
+        body, status = error
+        flight.publish(sse_event('error', {**body.get_json(), 'status': status}))
+        flight.finish()
+    return error
+
 SYSTEM_PROMPT = """Tu convertis une description FR/EN en code Mermaid v10 **valide**.
 Règles :
 - Détecte type pertinent : flowchart, sequence, class, state, er, gantt.
@@ -184,110 +965,316 @@ def generate():
         if not prompt.strip():
             return jsonify({'error': 'Prompt requis'}), 400
             
-        if engine == 'ollama':
-            return generate_ollama(prompt, model)
-        elif engine == 'mistral':
-            return generate_mistral(prompt, model)
-        else:
-            return jsonify({'error': 'Moteur non supporté'}), 400
+        return run_diagram(prompt, engine, model)
             
     except Exception as e:
         return jsonify({'error': f'Erreur serveur: {str(e)}'}), 500
 
+def run_diagram(prompt, engine, model):
+    """Génère un diagramme avec le moteur demandé (réponse JSON Flask).
+
+    Les demandes identiques déjà en cours partagent le même appel amont.
+    """
+    if engine == 'ollama':
+        generate_func = generate_ollama
+    elif engine == 'mistral':
+        generate_func = generate_mistral
+    else:
+        return jsonify({'error': 'Moteur non supporté'}), 400
+    key = llm_cache_key(engine, model, llm_base_url(engine), SYSTEM_PROMPT, None, prompt)
+    body, status = inflight.do(key, lambda: call_in_app_context(generate_func, prompt, model))
+    return jsonify(body), status
+
+def build_ollama_request(prompt, model, stream=False):
+    """Retourne (url, payload) de l'appel Ollama pour un diagramme"""
+    url = f"{config['ollama_base_url']}/api/generate"
+    payload = {
+        "model": model,
+        "prompt": f"{SYSTEM_PROMPT}\n\nDescription: {prompt}",
+        "stream": stream
+    }
+    return url, payload
+
+def ollama_error_response(e):
+    """Traduit une exception de l'appel Ollama en réponse JSON"""
+    if isinstance(e, requests.exceptions.Timeout):
+        return jsonify({'error': 'Timeout: Ollama ne répond pas'}), 408
+    if isinstance(e, requests.exceptions.ConnectionError):
+        return jsonify({'error': 'Impossible de se connecter à Ollama'}), 503
+    return jsonify({'error': f'Erreur Ollama: {str(e)}'}), 500
+
 def generate_ollama(prompt, model):
     try:
-        url = f"{config['ollama_base_url']}/api/generate"
-        payload = {
-            "model": model,
-            "prompt": f"{SYSTEM_PROMPT}\n\nDescription: {prompt}",
-            "stream": False
-        }
+        cache_key = llm_cache_key('ollama', model, llm_base_url('ollama'), SYSTEM_PROMPT, None, prompt)
+        cached = response_cache.get(cache_key) if response_cache else None
+        if cached is not None:
+            return jsonify({'mermaid': cached})
+        
+        url, payload = build_ollama_request(prompt, model)
         
-        response = requests.post(url, json=payload, timeout=60)
+        response, _ = llm_post('ollama', model, url, json=payload, timeout=60)
         response.raise_for_status()
         
         result = response.json()
-        mermaid_code = result.get('response', '').strip()
+        # Même forme que Mistral et le streaming : code sans balises ``` (mis en cache tel quel)
+        mermaid_code = strip_mermaid_fences(result.get('response', '')).strip()
         
         if not is_valid_mermaid(mermaid_code):
             return jsonify({'error': 'Réponse invalide: pas de code Mermaid détecté'}), 422
+        
+        if response_cache:
+            response_cache.set(cache_key, mermaid_code)
             
         return jsonify({'mermaid': mermaid_code})
         
-    except requests.exceptions.Timeout:
-        return jsonify({'error': 'Timeout: Ollama ne répond pas'}), 408
-    except requests.exceptions.ConnectionError:
-        return jsonify({'error': 'Impossible de se connecter à Ollama'}), 503
     except Exception as e:
-        return jsonify({'error': f'Erreur Ollama: {str(e)}'}), 500
+        return ollama_error_response(e)
+
+def build_mistral_request(prompt, model, stream=False):
+    """Retourne (url, headers, payload) de l'appel Mistral pour un diagramme"""
+    url = f"{config['mistral_base_url']}/v1/chat/completions"
+    headers = {
+        'Authorization': f"Bearer {config['mistral_api_key']}",
+        'Content-Type': 'application/json'
+    }
+    payload = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": f"Description: {prompt}"}
+        ],
+        "temperature": 0.1,
+        "max_tokens": 2000
+    }
+    if stream:
+        payload['stream'] = True
+    return url, headers, payload
+
+def mistral_error_response(e):
+    """Traduit une exception de l'appel Mistral (diagramme) en réponse JSON"""
+    if isinstance(e, requests.exceptions.Timeout):
+        return jsonify({'error': 'Timeout: Mistral ne répond pas dans les délais'}), 408
+    if isinstance(e, requests.exceptions.HTTPError):
+        if hasattr(e, 'response') and e.response is not None:
+            if e.response.status_code == 401:
+                return jsonify({'error': 'Clé API Mistral invalide ou expirée'}), 401
+            elif e.response.status_code == 403:
+                return jsonify({'error': 'Accès non autorisé à l\'API Mistral'}), 403
+            elif e.response.status_code == 429:
+                return jsonify({'error': 'Limite de débit API Mistral atteinte'}), 429
+            else:
+                return jsonify({'error': f'Erreur API Mistral: {e.response.status_code}'}), 503
+        return jsonify({'error': f'Erreur HTTP Mistral: {str(e)}'}), 503
+    if isinstance(e, requests.exceptions.RequestException):
+        return jsonify({'error': f'Erreur de connexion Mistral: {str(e)}'}), 503
+    if isinstance(e, KeyError):
+        return jsonify({'error': f'Réponse API Mistral malformée: {str(e)}'}), 502
+    return jsonify({'error': f'Erreur Mistral: {str(e)}'}), 500
 
 def generate_mistral(prompt, model):
     try:
         if not config['mistral_api_key']:
             return jsonify({'error': 'Clé API Mistral manquante dans la configuration'}), 401
             
-        url = f"{config['mistral_base_url']}/v1/chat/completions"
-        headers = {
-            'Authorization': f"Bearer {config['mistral_api_key']}",
-            'Content-Type': 'application/json'
-        }
-        payload = {
-            "model": model,
-            "messages": [
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": f"Description: {prompt}"}
-            ],
-            "temperature": 0.1,
-            "max_tokens": 2000
-        }
+        url, headers, payload = build_mistral_request(prompt, model)
         
-        response = requests.post(url, json=payload, headers=headers, timeout=60)
+        cache_key = llm_cache_key('mistral', model, llm_base_url('mistral'), SYSTEM_PROMPT, payload['temperature'], prompt)
+        cached = response_cache.get(cache_key) if response_cache else None
+        if cached is not None:
+            return jsonify({'mermaid': cached})
         
-        # Debug logging
-        print(f"Mistral API Status: {response.status_code}")
+        response, _ = llm_post('mistral', model, url, json=payload, headers=headers, timeout=60)
+        
+        llm_log.debug("Mistral API Status: %s", response.status_code, extra={'engine': 'mistral', 'model': model})
         if response.status_code != 200:
-            print(f"Mistral API Error: {response.text}")
+            llm_log.warning("Mistral API Error %s: %.500s", response.status_code, response.text)
         
         response.raise_for_status()
         
         result = response.json()
-        mermaid_code = result['choices'][0]['message']['content'].strip()
-        
         # Nettoyer le code Mermaid des balises markdown
-        if mermaid_code.startswith('```mermaid'):
-            lines = mermaid_code.split('\n')
-            mermaid_code = '\n'.join(lines[1:-1]) if len(lines) > 2 else mermaid_code
-        elif mermaid_code.startswith('```'):
-            lines = mermaid_code.split('\n')
-            mermaid_code = '\n'.join(lines[1:-1]) if len(lines) > 2 else mermaid_code
-        
-        mermaid_code = mermaid_code.strip()
+        mermaid_code = strip_mermaid_fences(result['choices'][0]['message']['content']).strip()
         
         if not is_valid_mermaid(mermaid_code):
-            print(f"⚠️ Code Mermaid invalide généré: {mermaid_code[:100]}...")
+            llm_log.warning("⚠️ Code Mermaid invalide généré: %.100s...", mermaid_code)
             return jsonify({'error': 'Réponse invalide: pas de code Mermaid détecté'}), 422
+        
+        if response_cache:
+            response_cache.set(cache_key, mermaid_code)
             
         return jsonify({'mermaid': mermaid_code})
         
-    except requests.exceptions.Timeout:
-        return jsonify({'error': 'Timeout: Mistral ne répond pas dans les délais'}), 408
-    except requests.exceptions.HTTPError as e:
-        if hasattr(e, 'response') and e.response is not None:
-            if e.response.status_code == 401:
-                return jsonify({'error': 'Clé API Mistral invalide ou expirée'}), 401
-            elif e.response.status_code == 403:
-                return jsonify({'error': 'Accès non autorisé à l\'API Mistral'}), 403
-            elif e.response.status_code == 429:
-                return jsonify({'error': 'Limite de débit API Mistral atteinte'}), 429
-            else:
-                return jsonify({'error': f'Erreur API Mistral: {e.response.status_code}'}), 503
-        return jsonify({'error': f'Erreur HTTP Mistral: {str(e)}'}), 503
-    except requests.exceptions.RequestException as e:
-        return jsonify({'error': f'Erreur de connexion Mistral: {str(e)}'}), 503
-    except KeyError as e:
-        return jsonify({'error': f'Réponse API Mistral malformée: {str(e)}'}), 502
     except Exception as e:
-        return jsonify({'error': f'Erreur Mistral: {str(e)}'}), 500
+        return mistral_error_response(e)
+
+# Nombre de caractères examinés avant d'abandonner une génération en streaming qui n'est pas du Mermaid
+MERMAID_PROBE_CHARS = int(os.getenv('MERMAID_PROBE_CHARS', 300))
+
+class MermaidStreamGuard:
+    """Surveille un flux de génération Mermaid.
+
+    Rejette la réponse dès que les MERMAID_PROBE_CHARS premiers caractères ne contiennent
+    aucun en-tête Mermaid. Le code émis suit la règle de strip_mermaid_fences (contenu du premier
+    bloc ```, même après une phrase d'introduction) : rien n'est émis tant que son début n'est pas
+    connu, et finish() applique la même vérification que l'appel bloquant.
+    """
+
+    def __init__(self, probe_chars=MERMAID_PROBE_CHARS):
+        self.probe_chars = probe_chars
+        self.text = ''
+        self.valid = None   # None tant que la sonde n'a pas tranché
+        self.start = None   # début du code dans le texte, None tant qu'un bloc ``` peut encore suivre
+        self.emitted = 0
+
+    def feed(self, delta):
+        """Ajoute un fragment et retourne le code émissible (vide tant que la sonde est indécise)"""
+        self.text += delta
+        if self.valid is None:
+            if MERMAID_HEADER_RE.search(self.text[:self.probe_chars]):
+                self.valid = True
+            elif len(self.text) >= self.probe_chars:
+                self.valid = False
+        if self.start is None:
+            self.start = self._code_start()
+        if not self.valid or self.start is None:
+            return ''
+        body = self._body()
+        chunk = body[self.emitted:]
+        self.emitted = len(body)
+        return chunk
+
+    def finish(self):
+        """Termine le flux : retourne le code final nettoyé comme par l'appel bloquant, ou None s'il n'est pas valide"""
+        mermaid_code = strip_mermaid_fences(self.text).strip()
+        if self.valid is False or not is_valid_mermaid(mermaid_code):
+            return None
+        return mermaid_code
+
+    def _code_start(self):
+        head = self.text.lstrip()
+        if MERMAID_START_RE.match(head):
+            return len(self.text) - len(head)
+        fence = self.text.find('```')
+        if fence != -1:
+            nl = self.text.find('\n', fence)
+            return nl + 1 if nl != -1 else None
+        return None
+
+    def _body(self):
+        # Code depuis son début, jusqu'à la balise fermante (ou une ligne qui pourrait en être une)
+        text = self.text[self.start:]
+        closing = text.find('\n```')
+        if closing != -1:
+            return text[:closing]
+        last_line = text[text.rfind('\n') + 1:].lstrip()
+        if '```'.startswith(last_line) or last_line.startswith('```'):
+            return text[:len(text) - len(last_line)]
+        return text
+
+def iter_ollama_stream(response):
+    """Itère sur les fragments de texte d'une réponse Ollama en streaming (NDJSON)"""
+    response.encoding = 'utf-8'  # sans charset, requests décoderait text/* en ISO-8859-1
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            continue
+        chunk = json.loads(line)
+        if chunk.get('response'):
+            yield chunk['response']
+        if chunk.get('done'):
+            break
+
+@app.route('/api/generate/stream', methods=['POST'])
+def generate_stream():
+    """Génère un diagramme en streaming (Server-Sent Events : delta, done, error).
+
+    La requête amont est interrompue dès que la sortie n'est manifestement pas du Mermaid.
+    """
+    data = request.json or {}
+    prompt = data.get('prompt', '')
+    engine = data.get('engine', 'ollama')
+    model = data.get('model', 'mistral')
+    
+    if not prompt.strip():
+        return jsonify({'error': 'Prompt requis'}), 400
+    if engine not in ('ollama', 'mistral'):
+        return jsonify({'error': 'Moteur non supporté'}), 400
+    
+    sse_headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    flight = None
+    try:
+        if engine == 'ollama':
+            error_response = ollama_error_response
+            url, payload = build_ollama_request(prompt, model, stream=True)
+            cache_key = llm_cache_key('ollama', model, llm_base_url('ollama'), SYSTEM_PROMPT, None, prompt)
+            headers = None
+            iter_stream = iter_ollama_stream
+        else:
+            error_response = mistral_error_response
+            if not config['mistral_api_key']:
+                return jsonify({'error': 'Clé API Mistral manquante dans la configuration'}), 401
+            url, headers, payload = build_mistral_request(prompt, model, stream=True)
+            cache_key = llm_cache_key('mistral', model, llm_base_url('mistral'), SYSTEM_PROMPT, payload['temperature'], prompt)
+            iter_stream = iter_mistral_stream
+        
+        cached = response_cache.get(cache_key) if response_cache else None
+        if cached is not None:
+            def replay():
+                yield sse_event('delta', {'text': cached})
+                yield sse_event('done', {'mermaid': cached})
+            return Response(replay(), mimetype='text/event-stream', headers=sse_headers)
+        
+        # Même génération déjà en cours : rejoue son flux au lieu d'appeler le LLM une seconde fois
+        flight, leader = stream_flights.join(cache_key)
+        if not leader:
+            return flight.response(sse_headers)
+        
+        response, started = llm_post(engine, model, url, stream=True, json=payload, headers=headers, timeout=60)
+        try:
+            response.raise_for_status()
+        except Exception:
+            response.close()
+            raise
+    except Exception as e:
+        return stream_failed(flight, error_response(e))
+    
+    def relay():
+        guard = MermaidStreamGuard()
+        outcome = str(response.status_code)
+        try:
+            for delta in iter_stream(response):
+                text = guard.feed(delta)
+                if guard.valid is False:
+                    llm_log.warning("⚠️ Génération %s interrompue: pas de code Mermaid dans les %d premiers caractères",
+                                    engine, guard.probe_chars)
+                    break
+                if text:
+                    yield sse_event('delta', {'text': text})
+            mermaid_code = guard.finish()
+            if mermaid_code is None:
+                yield sse_event('error', {'error': 'Réponse invalide: pas de code Mermaid détecté', 'status': 422})
+                return
+            if not guard.emitted:
+                # Début du code jamais tranché en cours de flux (phrase sans bloc ```) : envoyé en une fois
+                yield sse_event('delta', {'text': mermaid_code})
+            if response_cache:
+                response_cache.set(cache_key, mermaid_code)
+            yield sse_event('done', {'mermaid': mermaid_code})
+        except requests.exceptions.RequestException as e:
+            outcome = upstream_outcome(e)
+            yield sse_event('error', {'error': f'Erreur de connexion {engine}: {str(e)}', 'status': 503})
+        except (KeyError, IndexError, ValueError) as e:
+            yield sse_event('error', {'error': f'Réponse {engine} malformée: {str(e)}', 'status': 502})
+        finally:
+            # Ferme la connexion amont : arrête la génération (et sa facturation) en cas d'abandon
+            response.close()
+            observe_llm(engine, model, True, outcome, started)
+    
+    return flight.response(sse_headers, relay())
+
+# Carrés et symboles de la zone 'Geometric Shapes' (U+25A0–U+25FF) et blocs voisins
+SQUARES_RE = re.compile(r'[\u25A0-\u25FF\u2B00-\u2BFF\u2580-\u259F]')
+# Espaces (y compris invisibles) à normaliser en un seul espace
+SPACES_RE = re.compile(r'[\s\u200B\u200C\u200D\u2060]+')
 
 def clean_squares(text):
     """Nettoie les carrés et symboles de la zone 'Geometric Shapes' et similaires.
@@ -295,59 +1282,215 @@ def clean_squares(text):
     """
     if not text:
         return text
-    import re
-    # Supprimer tous symboles dans Geometric Shapes (U+25A0–U+25FF) et quelques blocs voisins
-    text = re.sub(r'[\u25A0-\u25FF\u2B00-\u2BFF\u2580-\u259F]', '', text)
-    # Supprimer points/puces exotiques éventuels
-    text = re.sub(r'[\u2022\u2043\u2219\u00B7]', '', text) if False else text  # désactivé (on gère les puces via bulletText)
-    # Supprimer espaces invisibles
-    text = re.sub(r'[\u200B\u200C\u200D\u2060\u00A0]', ' ', text)
-    # Normaliser les espaces
-    text = re.sub(r'\s+', ' ', text)
+    # Les puces exotiques (•, ·...) sont conservées : les puces sont gérées par le rendu des listes
+    text = SQUARES_RE.sub('', text)
+    # Espaces invisibles et espaces multiples -> un seul espace
+    text = SPACES_RE.sub(' ', text)
     return text.strip()
 
+# Nettoyage du HTML de l'éditeur (Quill), travaillé en UTF-8 : chaque motif commence par un octet
+# littéral, ce qui permet au moteur regex une recherche rapide (pas de rappel Python par caractère)
+SQUARES_UTF8_RE = re.compile(rb'\xe2[\x96\x97\xac-\xaf][\x80-\xbf]')        # U+2580–U+25FF, U+2B00–U+2BFF
+INVISIBLE_UTF8_RE = re.compile(rb'\xe2(?:\x80[\x8b-\x8d]|\x81\xa0)')        # U+200B–U+200D, U+2060
+NUMERIC_ENTITY_RE = re.compile(rb'&#(?:[0-9]{1,7}|[xX][0-9a-fA-F]{1,6});')
+LIST_ITEM_DATA_RE = re.compile(rb'<li[^>]*data-list=["\'](?:bullet|ordered)["\'][^>]*>')
+INVISIBLE_CODES = frozenset((0x200B, 0x200C, 0x200D, 0x2060, 0xA0))
+
+def sanitize_report_html(html_input, stats=None):
+    """Normalise le HTML du compte rendu avant le rendu PDF.
+
+    Supprime les carrés (caractères et entités numériques), remplace les espaces invisibles
+    (caractères, &nbsp;, &zwj;...) par un espace et réduit les <li data-list="..."> à <li>.
+    Si `stats` est fourni, il reçoit le nombre de remplacements (squares, invisible, list_attrs).
+    """
+    data = html_input.encode('utf-8')
+    data, squares = SQUARES_UTF8_RE.subn(b'', data)
+    data, invisible = INVISIBLE_UTF8_RE.subn(b' ', data)
+    if b'\xc2\xa0' in data:
+        size = len(data)
+        data = data.replace(b'\xc2\xa0', b' ')
+        invisible += size - len(data)  # 2 octets -> 1
+    if b'&' in data:
+        for entity in (b'&nbsp;', b'&zwj;', b'&zwnj;'):
+            if entity in data:
+                invisible += data.count(entity)
+                data = data.replace(entity, b' ')
+        if b'&#' in data:
+            counts = [0, 0]
+
+            def replace_entity(match):
+                token = match.group()
+                code = int(token[3:-1], 16) if token[2] in b'xX' else int(token[2:-1])
+                if 0x2580 <= code <= 0x25FF or 0x2B00 <= code <= 0x2BFF:
+                    counts[0] += 1
+                    return b''
+                if code in INVISIBLE_CODES:
+                    counts[1] += 1
+                    return b' '
+                return token
+
+            data = NUMERIC_ENTITY_RE.sub(replace_entity, data)
+            squares += counts[0]
+            invisible += counts[1]
+    list_attrs = 0
+    if b'data-list' in data:
+        data, list_attrs = LIST_ITEM_DATA_RE.subn(b'<li>', data)
+    if stats is not None:
+        stats.update({'squares': squares, 'invisible': invisible, 'list_attrs': list_attrs})
+    return data.decode('utf-8')
+
+# Patterns Mermaid courants (en-têtes de diagramme)
+MERMAID_HEADER_RE = re.compile('|'.join([
+    r'flowchart\s+(TD|LR|TB|RL|BT)',
+    r'sequenceDiagram',
+    r'classDiagram',
+    r'stateDiagram',
+    r'erDiagram',
+    r'gantt',
+    r'pie\s+(title|showData)',
+    r'graph\s+(TD|LR|TB|RL|BT)',
+    r'journey',
+    r'gitGraph',
+    r'gitgraph'
+]), re.IGNORECASE)
+
+# Réponse qui commence directement par le code (en-tête, front matter YAML ou directive %%)
+MERMAID_START_RE = re.compile(rf'(?:{MERMAID_HEADER_RE.pattern}|---|%%)', re.IGNORECASE)
+MERMAID_FENCE_RE = re.compile(r'```[^\n]*\n(.*?)(?:\n```|\Z)', re.DOTALL)
+
+def strip_mermaid_fences(text):
+    """Code Mermaid d'une réponse : contenu du premier bloc ```mermaid / ```, même précédé d'une phrase,
+    ou le texte lui-même (sans balise fermante) s'il commence directement par le code"""
+    text = text.strip()
+    if MERMAID_START_RE.match(text):
+        closing = text.find('\n```')
+        return text[:closing] if closing != -1 else text
+    match = MERMAID_FENCE_RE.search(text)
+    return match.group(1) if match else text
+
 def is_valid_mermaid(text):
     """Vérifie si le texte contient du code Mermaid valide"""
     if not text:
         return False
     
     # Nettoyer le texte des balises markdown
-    text = text.strip()
+    text = strip_mermaid_fences(text)
     
-    # Supprimer les balises markdown si présentes
-    if text.startswith('```mermaid'):
-        lines = text.split('\n')
-        text = '\n'.join(lines[1:-1]) if len(lines) > 2 else text
-    elif text.startswith('```'):
-        lines = text.split('\n')
-        text = '\n'.join(lines[1:-1]) if len(lines) > 2 else text
-    
-    # Patterns Mermaid courants
-    patterns = [
-        r'flowchart\s+(TD|LR|TB|RL|BT)',
-        r'sequenceDiagram',
-        r'classDiagram',
-        r'stateDiagram',
-        r'erDiagram',
-        r'gantt',
-        r'pie\s+(title|showData)',
-        r'graph\s+(TD|LR|TB|RL|BT)',
-        r'journey',
-        r'gitGraph',
-        r'gitgraph'
-    ]
+    return MERMAID_HEADER_RE.search(text) is not None
+
+# Cache des listes de modèles (stale-while-revalidate)
+MODEL_CACHE_TTL = int(os.getenv('MODEL_CACHE_TTL', 300))
+
+class ModelListCache:
+    """Listes de modèles par (fournisseur, URL, empreinte de la clé API).
+
+    Une entrée périmée est servie immédiatement et rafraîchie en arrière-plan.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entries = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(provider, base_url, api_key=''):
+        key_hash = hashlib.sha256(api_key.encode('utf-8')).hexdigest() if api_key else ''
+        return (provider, base_url, key_hash)
+
+    def get(self, key, fetch):
+        """Retourne la liste en cache (rafraîchie en fond si périmée) ou l'obtient de façon synchrone"""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return self.refresh(key, fetch)
+        if time.time() - entry['fetched_at'] > self.ttl:
+            self.refresh_async(key, fetch)
+        return entry['models']
+
+    def refresh(self, key, fetch):
+        models = fetch()
+        with self._lock:
+            self._entries[key] = {'models': models, 'fetched_at': time.time()}
+        return models
+
+    def refresh_async(self, key, fetch):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def worker():
+            try:
+                self.refresh(key, fetch)
+            except Exception as e:
+                models_log.warning("⚠️ Rafraîchissement des modèles %s échoué: %s", key[0], e)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def invalidate(self, provider=None):
+        with self._lock:
+            for key in [k for k in self._entries if provider is None or k[0] == provider]:
+                del self._entries[key]
+
+model_cache = ModelListCache(MODEL_CACHE_TTL)
+
+def fetch_ollama_models(base_url):
+    """Interroge Ollama pour la liste des modèles installés"""
+    url = f"{base_url}/api/tags"
+    response = http_session.get(url, timeout=10)
+    response.raise_for_status()
+    
+    data = response.json()
+    return [model['name'] for model in data.get('models', [])]
+
+def fetch_mistral_models(base_url, api_key):
+    """Interroge l'API Mistral pour la liste des modèles disponibles"""
+    url = f"{base_url}/v1/models"
+    headers = {
+        'Authorization': f"Bearer {api_key}",
+        'Content-Type': 'application/json'
+    }
+    
+    response = http_session.get(url, headers=headers, timeout=10)
+    
+    # Ni la clé ni le corps de la réponse ne sont journalisés au-delà du niveau DEBUG
+    models_log.debug("🔍 Mistral %s - Status: %s - Response: %.200s", url, response.status_code, response.text)
+    
+    response.raise_for_status()
     
-    return any(re.search(pattern, text, re.IGNORECASE) for pattern in patterns)
+    data = response.json()
+    
+    # D'après la doc Mistral, la structure est : {"object": "list", "data": [...]}
+    models_data = data.get('data', [])
+    models = [model['id'] for model in models_data if 'id' in model]
+    
+    models_log.debug("🔍 Modèles Mistral: %s", models)
+    return models
+
+def ollama_model_source():
+    """Clé de cache et fonction de récupération pour la configuration Ollama courante"""
+    base_url = config['ollama_base_url']
+    return ModelListCache.key('ollama', base_url), lambda: fetch_ollama_models(base_url)
+
+def mistral_model_source():
+    """Clé de cache et fonction de récupération pour la configuration Mistral courante"""
+    base_url, api_key = config['mistral_base_url'], config['mistral_api_key']
+    return ModelListCache.key('mistral', base_url, api_key), lambda: fetch_mistral_models(base_url, api_key)
+
+def warm_model_cache():
+    """Précharge les listes de modèles en arrière-plan (démarrage, changement de configuration)"""
+    model_cache.refresh_async(*ollama_model_source())
+    if config['mistral_api_key']:
+        model_cache.refresh_async(*mistral_model_source())
 
 @app.route('/api/ollama/models')
 def ollama_models():
     try:
-        url = f"{config['ollama_base_url']}/api/tags"
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        
-        data = response.json()
-        models = [model['name'] for model in data.get('models', [])]
+        models = model_cache.get(*ollama_model_source())
         
         return jsonify({'models': models})
         
@@ -364,40 +1507,14 @@ def mistral_models():
         test_url = request.headers.get('X-Test-Base-URL')
         
         if test_key and test_url:
-            # Mode test : utiliser les paramètres passés en headers
-            api_key = test_key
-            base_url = test_url
-            print(f"🧪 Mode TEST - Base URL: {base_url}, API Key: {api_key[:10]}...")
+            # Mode test : utiliser les paramètres passés en headers, sans passer par le cache
+            models_log.info("🧪 Test de connexion Mistral: %s", test_url)
+            models = fetch_mistral_models(test_url, test_key)
         else:
             # Mode normal : utiliser la config
             if not config['mistral_api_key']:
                 return jsonify({'error': 'Clé API Mistral manquante'}), 401
-            api_key = config['mistral_api_key']
-            base_url = config['mistral_base_url']
-            
-        url = f"{base_url}/v1/models"
-        headers = {
-            'Authorization': f"Bearer {api_key}",
-            'Content-Type': 'application/json'
-        }
-        
-        print(f"🔍 DEBUG Mistral - URL: {url}")
-        print(f"🔍 DEBUG Mistral - Headers: Authorization Bearer {api_key[:10]}...")
-        
-        response = requests.get(url, headers=headers, timeout=10)
-        
-        print(f"🔍 DEBUG Mistral - Status: {response.status_code}")
-        print(f"🔍 DEBUG Mistral - Response: {response.text[:200]}...")
-        
-        response.raise_for_status()
-        
-        data = response.json()
-        
-        # D'après la doc Mistral, la structure est : {"object": "list", "data": [...]}
-        models_data = data.get('data', [])
-        models = [model['id'] for model in models_data if 'id' in model]
-        
-        print(f"🔍 DEBUG Mistral - Models found: {models}")
+            models = model_cache.get(*mistral_model_source())
         
         return jsonify({'models': models})
         
@@ -412,15 +1529,37 @@ def mistral_models():
         elif e.response.status_code == 429:
             error_msg = 'Limite de débit API Mistral atteinte'
         
-        print(f"🔍 DEBUG Mistral Error - {error_msg}: {e.response.text}")
+        models_log.warning("Modèles Mistral - %s: %.200s", error_msg, e.response.text)
         return jsonify({'error': error_msg}), e.response.status_code
     except requests.exceptions.RequestException as e:
-        print(f"🔍 DEBUG Mistral - Request Error: {str(e)}")
+        models_log.warning("Modèles Mistral - erreur de connexion: %s", e)
         return jsonify({'error': 'Erreur de connexion à l\'API Mistral'}), 503
     except Exception as e:
-        print(f"🔍 DEBUG Mistral - General Error: {str(e)}")
+        models_log.error("Modèles Mistral - erreur: %s", e)
         return jsonify({'error': f'Erreur lors de la récupération des modèles Mistral: {str(e)}'}), 500
 
+@app.route('/api/cache/stats')
+def cache_stats():
+    stats = {'enabled': False}
+    if response_cache:
+        stats = {'enabled': True, **response_cache.snapshot()}
+    stats['coalescing'] = inflight.snapshot()
+    stats['stream_coalescing'] = stream_flights.snapshot()
+    # Avec le pool, les caches de rendu vivent dans les workers : totaux ici, détail par worker dans pdf_pool
+    if pdf_pool:
+        stats.update(pdf_pool.cache_snapshot())
+    else:
+        stats.update({name: value for name, value in pdf_cache_stats().items() if name != 'pid'})
+    stats['pdf_pool'] = pdf_pool.snapshot() if pdf_pool else None
+    stats['pdf_results'] = pdf_results.snapshot()
+    stats['assets'] = asset_store.snapshot()
+    return jsonify(stats)
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Métriques au format texte Prometheus (requêtes, latences LLM, étapes des exports PDF)"""
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/api/settings')
 def get_settings():
     return jsonify({
@@ -446,6 +1585,11 @@ def update_mistral_settings():
             'MISTRAL_BASE_URL': config['mistral_base_url'],
             'MISTRAL_API_KEY': config['mistral_api_key']
         })
+        
+        # Les listes de modèles dépendent des identifiants : invalider puis recharger en fond
+        model_cache.invalidate('mistral')
+        if config['mistral_api_key']:
+            model_cache.refresh_async(*mistral_model_source())
             
         return jsonify({
             'success': True,
@@ -456,173 +1600,614 @@ def update_mistral_settings():
     except Exception as e:
         return jsonify({'error': f'Erreur lors de la mise à jour: {str(e)}'}), 500
 
-@app.route('/api/generate-report', methods=['POST'])
+def build_report_prompt(notes, meta):
+    """Construit le prompt utilisateur du compte rendu avec ses métadonnées"""
+    user_prompt = f"Notes de réunion :\n\n{notes}"
+    if meta.get('date'):
+        user_prompt = f"Date : {meta['date']}\n\n" + user_prompt
+    if meta.get('participants'):
+        user_prompt = f"Participants : {meta['participants']}\n\n" + user_prompt
+    return user_prompt
+
+def build_report_request(template, user_prompt, stream=False):
+    """Retourne (url, headers, payload) de l'appel Mistral pour un compte rendu"""
+    url = f"{config['mistral_base_url']}/v1/chat/completions"
+    headers = {
+        'Authorization': f"Bearer {config['mistral_api_key']}",
+        'Content-Type': 'application/json'
+    }
+    payload = {
+        "model": "mistral-medium-latest",
+        "messages": [
+            {"role": "system", "content": REPORT_PROMPTS[template]},
+            {"role": "user", "content": user_prompt}
+        ],
+        "temperature": 0.3,
+        "max_tokens": 3000
+    }
+    if stream:
+        payload['stream'] = True
+    return url, headers, payload
+
+def clean_report_markdown(report):
+    """Extrait UNIQUEMENT le Markdown pur de la réponse du modèle (mêmes règles que le flux : ReportStreamCleaner)"""
+    cleaner = ReportStreamCleaner()
+    return cleaner.feed(report) + cleaner.finish()
+
+def report_error_response(e):
+    """Traduit une exception de l'appel Mistral (compte rendu) en réponse JSON"""
+    if isinstance(e, requests.exceptions.Timeout):
+        return jsonify({'error': 'Timeout: Mistral ne répond pas dans les délais'}), 408
+    if isinstance(e, requests.exceptions.HTTPError):
+        if hasattr(e, 'response') and e.response is not None:
+            if e.response.status_code == 401:
+                return jsonify({'error': 'Clé API Mistral invalide ou expirée'}), 401
+            elif e.response.status_code == 429:
+                return jsonify({'error': 'Limite de débit API Mistral atteinte. Réessayez dans quelques instants.'}), 429
+            else:
+                return jsonify({'error': f'Erreur API Mistral: {e.response.status_code}'}), 503
+        return jsonify({'error': f'Erreur HTTP Mistral: {str(e)}'}), 503
+    if isinstance(e, KeyError):
+        return jsonify({'error': f'Réponse API Mistral malformée: {str(e)}'}), 502
+    return jsonify({'error': f'Erreur lors de la génération du compte rendu: {str(e)}'}), 500
+
+def parse_report_request(data):
+    """Valide le corps d'une requête de compte rendu : (notes, template, meta, erreur)"""
+    data = data if isinstance(data, dict) else {}
+    notes = data.get('notes', '')
+    template = data.get('template', 'client_formel')
+    meta = data.get('meta') or {}
+    
+    if not isinstance(notes, str):
+        return '', template, meta, (jsonify({'error': 'Le champ notes doit être du texte'}), 400)
+    notes = notes.strip()
+    if not notes:
+        return notes, template, meta, (jsonify({'error': 'Notes requises'}), 400)
+    
+    if not isinstance(meta, dict):
+        return notes, template, {}, (jsonify({'error': 'Le champ meta doit être un objet'}), 400)
+    
+    if not isinstance(template, str) or template not in REPORT_PROMPTS:
+        return notes, template, meta, (jsonify({'error': f'Template inconnu: {template}'}), 400)
+    
+    if not config['mistral_api_key']:
+        return notes, template, meta, (jsonify({'error': 'Clé API Mistral manquante dans la configuration'}), 401)
+    
+    return notes, template, meta, None
+
+@app.route('/api/generate-report', methods=['POST'])
 def generate_report():
     """Génère un compte rendu professionnel à partir de notes brutes"""
+    notes, template, meta, error = parse_report_request(request.get_json(silent=True))
+    if error:
+        return error
+    try:
+        return run_report(notes, template, meta)
+    except Exception as e:
+        return report_error_response(e)
+
+def run_report(notes, template, meta):
+    """Génère un compte rendu (réponse JSON Flask) ; les demandes identiques en cours sont regroupées"""
+    try:
+        user_prompt = build_report_prompt(notes, meta)
+        _, _, payload = build_report_request(template, user_prompt)
+        key = llm_cache_key('mistral', payload['model'], llm_base_url('mistral'), REPORT_PROMPTS[template], payload['temperature'], user_prompt, meta)
+    except Exception as e:
+        return report_error_response(e)
+    body, status = inflight.do(key, lambda: call_in_app_context(generate_mistral_report, notes, template, meta))
+    return jsonify(body), status
+
+def generate_mistral_report(notes, template, meta):
+    """Appelle Mistral et nettoie le compte rendu (réponse JSON Flask)"""
     try:
-        data = request.json
-        notes = data.get('notes', '').strip()
-        template = data.get('template', 'client_formel')
-        meta = data.get('meta', {})
-        
-        if not notes:
-            return jsonify({'error': 'Notes requises'}), 400
-        
-        if template not in REPORT_PROMPTS:
-            return jsonify({'error': f'Template inconnu: {template}'}), 400
-        
-        if not config['mistral_api_key']:
-            return jsonify({'error': 'Clé API Mistral manquante dans la configuration'}), 401
-        
         # Construire le prompt utilisateur avec métadonnées
-        user_prompt = f"Notes de réunion :\n\n{notes}"
-        if meta.get('date'):
-            user_prompt = f"Date : {meta['date']}\n\n" + user_prompt
-        if meta.get('participants'):
-            user_prompt = f"Participants : {meta['participants']}\n\n" + user_prompt
+        user_prompt = build_report_prompt(notes, meta)
         
         # Appel à Mistral AI
-        url = f"{config['mistral_base_url']}/v1/chat/completions"
-        headers = {
-            'Authorization': f"Bearer {config['mistral_api_key']}",
-            'Content-Type': 'application/json'
-        }
-        payload = {
-            "model": "mistral-medium-latest",
-            "messages": [
-                {"role": "system", "content": REPORT_PROMPTS[template]},
-                {"role": "user", "content": user_prompt}
-            ],
-            "temperature": 0.3,
-            "max_tokens": 3000
-        }
+        url, headers, payload = build_report_request(template, user_prompt)
         
-        response = requests.post(url, json=payload, headers=headers, timeout=60)
+        cache_key = llm_cache_key('mistral', payload['model'], llm_base_url('mistral'), REPORT_PROMPTS[template], payload['temperature'], user_prompt, meta)
+        cached = response_cache.get(cache_key) if response_cache else None
+        if cached is not None:
+            return jsonify({'report': cached})
         
-        print(f" Génération CR - Template: {template}, Status: {response.status_code}")
+        response, _ = llm_post('mistral', payload['model'], url, json=payload, headers=headers, timeout=60)
+        
+        llm_log.debug("Génération CR - Template: %s, Status: %s", template, response.status_code)
         
         response.raise_for_status()
         
         result = response.json()
-        report = result['choices'][0]['message']['content'].strip()
-        
-        # Nettoyer le rapport : extraire UNIQUEMENT le Markdown pur
-        # Cas 1 : Markdown dans un bloc de code ```markdown ... ```
-        if '```markdown' in report:
-            match = re.search(r'```markdown\s*\n(.*?)\n```', report, re.DOTALL)
-            if match:
-                report = match.group(1).strip()
-        # Cas 2 : Bloc de code générique ``` ... ```
-        elif '```' in report:
-            match = re.search(r'```\s*\n(.*?)\n```', report, re.DOTALL)
-            if match:
-                report = match.group(1).strip()
+        report = clean_report_markdown(result['choices'][0]['message']['content'])
         
-        # Cas 3 : Introduction + Markdown (retirer tout avant le premier ##)
-        if not report.startswith('#'):
-            match = re.search(r'(##\s+.*)', report, re.DOTALL)
-            if match:
-                report = match.group(1).strip()
+        llm_log.debug("📝 Markdown nettoyé (100 premiers chars): %.100s", report)
         
-        print(f"📝 Markdown nettoyé (100 premiers chars): {report[:100]}")
+        # Seul un compte rendu nettoyé (commençant par un titre Markdown) est mis en cache
+        if response_cache and report.startswith('#'):
+            response_cache.set(cache_key, report)
         
         return jsonify({'report': report})
         
-    except requests.exceptions.Timeout:
-        return jsonify({'error': 'Timeout: Mistral ne répond pas dans les délais'}), 408
-    except requests.exceptions.HTTPError as e:
-        if hasattr(e, 'response') and e.response is not None:
-            if e.response.status_code == 401:
-                return jsonify({'error': 'Clé API Mistral invalide ou expirée'}), 401
-            elif e.response.status_code == 429:
-                return jsonify({'error': 'Limite de débit API Mistral atteinte. Réessayez dans quelques instants.'}), 429
-            else:
-                return jsonify({'error': f'Erreur API Mistral: {e.response.status_code}'}), 503
-        return jsonify({'error': f'Erreur HTTP Mistral: {str(e)}'}), 503
-    except KeyError as e:
-        return jsonify({'error': f'Réponse API Mistral malformée: {str(e)}'}), 502
     except Exception as e:
-        return jsonify({'error': f'Erreur lors de la génération du compte rendu: {str(e)}'}), 500
+        return report_error_response(e)
 
-@app.route('/api/generate-pdf', methods=['POST'])
-def generate_pdf():
-    """Génère un PDF professionnel à partir du projet complet avec ReportLab"""
+class ReportStreamCleaner:
+    """Extrait le Markdown pur d'une réponse de compte rendu, au fil des tokens ou en une fois.
+
+    Règles, identiques quel que soit le découpage du texte :
+    - une balise ``` (```markdown...) avant le compte rendu ouvre un bloc qui l'encapsule : les lignes
+      qui la précèdent et tout ce qui suit la balise fermante sont ignorés ;
+    - le compte rendu commence à sa première ligne si c'est un titre (#), sinon au premier titre ## ;
+      les lignes d'introduction sont retirées ;
+    - une fois le compte rendu commencé hors bloc, les ``` suivants font partie du contenu ;
+    - sans aucun titre, tout le texte (hors balises) est conservé ; espaces de début et de fin retirés.
+
+    Le texte est émis dès qu'il ne peut plus être une ligne de contrôle ; la concaténation des retours
+    de feed() et finish() est exactement clean_report_markdown(texte complet).
+    """
+
+    def __init__(self):
+        self.pending = ''       # fin du texte reçu, pas encore traitée
+        self.held = []          # lignes avant le premier titre (conservées s'il n'y en a aucun)
+        self.first_line = True  # la prochaine ligne non vide est la première du compte rendu
+        self.started = False    # premier titre rencontré
+        self.in_fence = False   # réponse encapsulée dans un bloc ```
+        self.finished = False   # bloc ``` refermé : la suite est ignorée
+        self.partial = False    # début de la ligne courante déjà émis
+        self.blank = ''         # espaces en fin de texte émis, retenus jusqu'au texte suivant
+        self.parts = []
+
+    @property
+    def text(self):
+        """Texte nettoyé émis jusqu'ici"""
+        return ''.join(self.parts)
+
+    def feed(self, delta):
+        """Ajoute un fragment reçu et retourne le texte nettoyé émissible"""
+        self.pending += delta
+        emitted = len(self.parts)
+        while self.pending and not self.finished:
+            nl = self.pending.find('\n')
+            if nl == -1:
+                self._partial_line()
+                break
+            line, self.pending = self.pending[:nl + 1], self.pending[nl + 1:]
+            self._line(line)
+        return ''.join(self.parts[emitted:])
+
+    def finish(self):
+        """Termine le flux et retourne le dernier texte émissible"""
+        emitted = len(self.parts)
+        if not self.finished and self.pending:
+            line, self.pending = self.pending, ''
+            self._line(line)
+        if not self.started:
+            self._emit(''.join(self.held).strip())
+            self.held = []
+        self.finished = True
+        return ''.join(self.parts[emitted:])
+
+    def _line(self, line):
+        if self.partial:
+            self.partial = False
+            self._emit(line)
+            return
+        stripped = line.strip()
+        if stripped.startswith('```') and (self.in_fence or not self.started):
+            if self.in_fence:
+                self.finished = True
+            else:
+                self.in_fence = True
+                self.held = []
+                self.first_line = True
+        elif self.started:
+            self._emit(line)
+        elif self._is_heading(stripped):
+            self._start(line)
+        else:
+            self.held.append(line)
+            if stripped:
+                self.first_line = False
+
+    def _partial_line(self):
+        text = self.pending
+        if self.partial or (self.started and not (self.in_fence and self._maybe_fence(text.lstrip()))):
+            self.partial = True
+            self.pending = ''
+            self._emit(text)
+        elif not self.started and self._is_heading(text.lstrip()):
+            self.partial = True
+            self.pending = ''
+            self._start(text)
+
+    def _is_heading(self, text):
+        return text.startswith('##') or (self.first_line and text.startswith('#'))
+
+    def _start(self, line):
+        self.started = True
+        self.held = []
+        self._emit(line.lstrip())
+
+    def _emit(self, text):
+        text = self.blank + text
+        body = text.rstrip()
+        self.blank = text[len(body):]
+        if body:
+            self.parts.append(body)
+
+    @staticmethod
+    def _maybe_fence(text):
+        return '```'.startswith(text) or text.startswith('```')
+
+def sse_event(event, data):
+    """Formate un événement Server-Sent Events"""
+    if event == 'error':
+        STREAM_ERRORS.inc(error_class(data.get('status', 500)))
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def iter_mistral_stream(response):
+    """Itère sur les fragments de texte d'une réponse Mistral en streaming (SSE)"""
+    response.encoding = 'utf-8'  # sans charset, requests décoderait text/* en ISO-8859-1
+    for line in response.iter_lines(decode_unicode=True):
+        if not line or not line.startswith('data:'):
+            continue
+        chunk = line[5:].strip()
+        if chunk == '[DONE]':
+            break
+        delta = json.loads(chunk)['choices'][0].get('delta', {}).get('content')
+        if delta:
+            yield delta
+
+@app.route('/api/generate-report/stream', methods=['POST'])
+def generate_report_stream():
+    """Génère un compte rendu en streaming (Server-Sent Events : delta, done, error)"""
+    flight = None
     try:
-        data = request.json
-        project = data.get('project', {})
+        notes, template, meta, error = parse_report_request(request.get_json(silent=True))
+        if error:
+            return error
         
-        # Extraire les données du projet
-        diagram = project.get('diagram', {})
-        report_data = project.get('report', {})
-        images = project.get('images', [])
-        pdf_config = project.get('pdfConfig', {})
+        user_prompt = build_report_prompt(notes, meta)
+        url, headers, payload = build_report_request(template, user_prompt, stream=True)
         
-        # Créer un buffer en mémoire
-        pdf_buffer = io.BytesIO()
+        sse_headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        cache_key = llm_cache_key('mistral', payload['model'], llm_base_url('mistral'), REPORT_PROMPTS[template], payload['temperature'], user_prompt, meta)
+        cached = response_cache.get(cache_key) if response_cache else None
+        if cached is not None:
+            def replay():
+                yield sse_event('delta', {'text': cached})
+                yield sse_event('done', {'report': cached})
+            return Response(replay(), mimetype='text/event-stream', headers=sse_headers)
         
-        # Fonction de pied de page
-        def footer_canvas(canvas, doc):
-            """Ajoute un footer sur chaque page avec mentions légales"""
-            canvas.saveState()
-            
-            # Mentions légales personnalisées ou par défaut
-            footer_text = pdf_config.get('legal', 'ENOVACOM - Tous droits réservés')
-            
-            # Style du footer
-            canvas.setFont('Helvetica', 8)
-            canvas.setFillColor(colors.HexColor('#666666'))  # Gris discret
-            
-            # Position du footer (bas de page avec marge)
-            page_width = A4[0]
-            footer_y = 15*mm  # 15mm du bas de la page
-            
-            # Centrer le footer
-            text_width = canvas.stringWidth(footer_text, 'Helvetica', 8)
-            canvas.drawString((page_width - text_width) / 2, footer_y, footer_text)
-            
-            # Optionnel: Ajouter numéro de page
-            if pdf_config.get('page_numbers', True):  # Par défaut activé
-                page_num = f"Page {doc.page}"
-                canvas.setFont('Helvetica', 8)
-                canvas.setFillColor(colors.HexColor('#999999'))  # Plus clair pour le numéro
-                # Numéro de page en bas à droite
-                right_margin = pdf_config.get('theme', {}).get('margins', {}).get('right', 18) * mm
-                canvas.drawRightString(page_width - right_margin, footer_y, page_num)
-            
-            canvas.restoreState()
-        
-        # Créer le document PDF avec pied de page
-        doc = SimpleDocTemplate(
-            pdf_buffer,
-            pagesize=A4,
-            rightMargin=pdf_config.get('theme', {}).get('margins', {}).get('right', 18) * mm,
-            leftMargin=pdf_config.get('theme', {}).get('margins', {}).get('left', 18) * mm,
-            topMargin=pdf_config.get('theme', {}).get('margins', {}).get('top', 24) * mm,
-            bottomMargin=pdf_config.get('theme', {}).get('margins', {}).get('bottom', 28) * mm,
-            onFirstPage=footer_canvas,
-            onLaterPages=footer_canvas
-        )
+        flight, leader = stream_flights.join(cache_key)
+        if not leader:
+            return flight.response(sse_headers)
         
-        # Styles
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
+        # Les erreurs HTTP amont (401, 429...) sont connues dès les en-têtes : réponse JSON classique
+        response, started = llm_post('mistral', payload['model'], url, stream=True, json=payload, headers=headers, timeout=60)
+        llm_log.debug("Génération CR (stream) - Template: %s, Status: %s", template, response.status_code)
+        try:
+            response.raise_for_status()
+        except Exception:
+            response.close()
+            raise
+    except Exception as e:
+        return stream_failed(flight, report_error_response(e))
+    
+    def relay():
+        cleaner = ReportStreamCleaner()
+        outcome = str(response.status_code)
+        try:
+            for delta in iter_mistral_stream(response):
+                text = cleaner.feed(delta)
+                if text:
+                    yield sse_event('delta', {'text': text})
+            text = cleaner.finish()
+            if text:
+                yield sse_event('delta', {'text': text})
+            report = cleaner.text
+            if response_cache and report.startswith('#'):
+                response_cache.set(cache_key, report)
+            yield sse_event('done', {'report': report})
+        except requests.exceptions.RequestException as e:
+            outcome = upstream_outcome(e)
+            yield sse_event('error', {'error': f'Erreur de connexion Mistral: {str(e)}', 'status': 503})
+        except (KeyError, IndexError, ValueError) as e:
+            yield sse_event('error', {'error': f'Réponse API Mistral malformée: {str(e)}', 'status': 502})
+        finally:
+            # Fermeture aussi en cas d'annulation côté client : la requête amont est interrompue
+            response.close()
+            observe_llm('mistral', payload['model'], True, outcome, started)
+    
+    return flight.response(sse_headers, relay())
+
+# Jobs LLM asynchrones : exécuteur dédié pour ne pas bloquer les threads waitress
+LLM_JOB_WORKERS = int(os.getenv('LLM_JOB_WORKERS', 4))
+LLM_JOB_QUEUE = int(os.getenv('LLM_JOB_QUEUE', 32))
+LLM_JOB_RESULT_TTL = int(os.getenv('LLM_JOB_RESULT_TTL', 600))
+LLM_JOB_MAX_WAIT = float(os.getenv('LLM_JOB_MAX_WAIT', 30))
+
+def call_in_app_context(func, *args):
+    """Exécute une fonction de génération hors requête HTTP et retourne (corps JSON, statut)"""
+    with app.app_context():
+        rv = func(*args)
+    response, status = rv if isinstance(rv, tuple) else (rv, rv.status_code)
+    return response.get_json(), status
+
+class JobManager:
+    """Exécute des jobs sur un pool de threads borné et conserve leurs résultats un temps limité"""
+
+    FINAL_STATES = ('done', 'failed')
+
+    def __init__(self, workers, max_queue, ttl, name='job'):
+        self.workers = workers
+        self.max_pending = workers + max_queue
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._jobs = {}
+        self._cond = threading.Condition()
+
+    def submit(self, kind, func, *args, track=False):
+        """Planifie func(*args) -> (corps, statut) ; retourne le job, ou None si la file est pleine.
+
+        Avec track=True, func reçoit aussi job_id et progress(étape, **infos) pour publier sa progression.
+        """
+        with self._cond:
+            self._purge()
+            pending = sum(1 for job in self._jobs.values() if job['status'] not in self.FINAL_STATES)
+            if pending >= self.max_pending:
+                return None
+            job = {
+                'id': uuid.uuid4().hex,
+                'type': kind,
+                'status': 'queued',
+                'created': time.time(),
+                'started': None,
+                'finished': None,
+                'http_status': None,
+                'progress': None,
+                'result': None
+            }
+            self._jobs[job['id']] = job
+        self._executor.submit(self._run, job, func, args, track)
+        return self.view(job)
+
+    def get(self, job_id, wait=0):
+        """Retourne l'état du job ; attend jusqu'à `wait` secondes qu'il se termine (long-poll)"""
+        with self._cond:
+            self._purge()
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if wait > 0:
+                self._cond.wait_for(lambda: job['status'] in self.FINAL_STATES, timeout=wait)
+            return self.view(job)
+
+    def view(self, job):
+        data = {k: job[k] for k in ('id', 'type', 'status', 'created', 'started', 'finished', 'http_status')}
+        if job['progress'] is not None:
+            data['progress'] = job['progress']
+        if job['status'] == 'done':
+            data['result'] = job['result']
+        elif job['status'] == 'failed':
+            data['error'] = (job['result'] or {}).get('error', 'Erreur inconnue')
+        return data
+
+    def _run(self, job, func, args, track):
+        with self._cond:
+            job['status'] = 'running'
+            job['started'] = time.time()
+        try:
+            if track:
+                body, status = func(*args, job_id=job['id'], progress=lambda stage, **info: self._progress(job, stage, info))
+            else:
+                body, status = func(*args)
+        except Exception as e:
+            body, status = {'error': f'Erreur serveur: {str(e)}'}, 500
+        with self._cond:
+            job['result'] = body
+            job['http_status'] = status
+            job['status'] = 'done' if status == 200 else 'failed'
+            job['finished'] = time.time()
+            self._cond.notify_all()
+
+    def _progress(self, job, stage, info):
+        with self._cond:
+            job['progress'] = {'stage': stage, **info}
+
+    def shutdown(self):
+        """Arrêt du serveur : les jobs en attente sont annulés, ceux en cours se terminent"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _purge(self):
+        limit = time.time() - self.ttl
+        expired = [job_id for job_id, job in self._jobs.items() if job['finished'] and job['finished'] < limit]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+llm_jobs = JobManager(LLM_JOB_WORKERS, LLM_JOB_QUEUE, LLM_JOB_RESULT_TTL, name='llm-job')
+
+@app.route('/api/jobs', methods=['POST'])
+def create_job():
+    """Crée un job de génération (diagram ou report) et retourne son identifiant immédiatement"""
+    data = request.json or {}
+    kind = data.get('type')
+    
+    if kind == 'diagram':
+        prompt = data.get('prompt', '')
+        if not prompt.strip():
+            return jsonify({'error': 'Prompt requis'}), 400
+        args = (run_diagram, prompt, data.get('engine', 'ollama'), data.get('model', 'mistral'))
+    elif kind == 'report':
+        notes, template, meta, error = parse_report_request(data)
+        if error:
+            return error
+        args = (run_report, notes, template, meta)
+    else:
+        return jsonify({'error': f'Type de job inconnu: {kind}'}), 400
+    
+    job = llm_jobs.submit(kind, call_in_app_context, *args)
+    if job is None:
+        return jsonify({'error': 'Trop de générations en attente, réessayez dans quelques instants'}), 503
+    return jsonify({**job, 'poll': f"/api/jobs/{job['id']}"}), 202
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    """État et résultat d'un job ; ?wait=N attend jusqu'à N secondes la fin du job"""
+    try:
+        wait = min(float(request.args.get('wait', 0)), LLM_JOB_MAX_WAIT)
+    except ValueError:
+        return jsonify({'error': 'Paramètre wait invalide'}), 400
+    job = llm_jobs.get(job_id, wait=wait)
+    if job is None:
+        return jsonify({'error': 'Job inconnu ou expiré'}), 404
+    return jsonify(job)
+
+# Génération par lots : un pool par moteur, dimensionné à sa limite de concurrence
+BATCH_WORKERS = int(os.getenv('BATCH_WORKERS', 8))
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', 50))
+ENGINE_CONCURRENCY = {
+    'mistral': int(os.getenv('MISTRAL_MAX_CONCURRENCY', 4)),
+    'ollama': int(os.getenv('OLLAMA_MAX_CONCURRENCY', 2)),
+}
+
+# Les éléments en attente de leur moteur restent dans la file de son pool, jamais dans un thread
+# bloqué : un lot Ollama (2 à la fois) n'immobilise pas les threads des éléments Mistral
+batch_executors = {
+    engine: ThreadPoolExecutor(max_workers=max(1, min(limit, BATCH_WORKERS)), thread_name_prefix=f'batch-{engine}')
+    for engine, limit in ENGINE_CONCURRENCY.items()
+}
+
+def run_batch_item(prompt, engine, model):
+    """Génère un diagramme du lot (exécuté dans le pool du moteur)"""
+    return call_in_app_context(run_diagram, prompt, engine, model)
+
+@app.route('/api/generate/batch', methods=['POST'])
+def generate_batch():
+    """Génère plusieurs diagrammes en parallèle ; résultats en NDJSON dans l'ordre de fin"""
+    data = request.json or {}
+    items = data.get('items')
+    default_engine = data.get('engine', 'ollama')
+    default_model = data.get('model', 'mistral')
+    
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'Liste items requise'}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({'error': f'Maximum {BATCH_MAX_ITEMS} diagrammes par lot'}), 400
+    
+    def result_line(index, item, body, status):
+        line = {'index': index, 'status': status, **body}
+        if isinstance(item, dict) and 'id' in item:
+            line['id'] = item['id']
+        return json.dumps(line, ensure_ascii=False) + '\n'
+    
+    rejected = []
+    futures = {}
+    for index, item in enumerate(items):
+        if isinstance(item, str):
+            item = {'prompt': item}
+        prompt = item.get('prompt', '') if isinstance(item, dict) else ''
+        if not isinstance(prompt, str) or not prompt.strip():
+            rejected.append(result_line(index, item, {'error': 'Prompt requis'}, 400))
+            continue
+        engine = item.get('engine', default_engine)
+        if engine not in batch_executors:
+            rejected.append(result_line(index, item, {'error': 'Moteur non supporté'}, 400))
+            continue
+        future = batch_executors[engine].submit(run_batch_item, prompt, engine, item.get('model', default_model))
+        futures[future] = (index, item)
+    
+    def stream():
+        ok = 0
+        try:
+            yield from rejected
+            for future in as_completed(futures):
+                index, item = futures[future]
+                try:
+                    body, status = future.result()
+                except Exception as e:
+                    body, status = {'error': f'Erreur serveur: {str(e)}'}, 500
+                ok += status == 200
+                yield result_line(index, item, body, status)
+            yield json.dumps({'done': True, 'total': len(items), 'succeeded': ok, 'failed': len(items) - ok}) + '\n'
+        finally:
+            # Client parti : abandonner les éléments pas encore démarrés
+            for future in futures:
+                future.cancel()
+    
+    return Response(stream(), mimetype='application/x-ndjson', headers={'X-Accel-Buffering': 'no'})
+
+# Métriques des exports PDF : étapes chronométrées dans le thread (ou le worker) qui fait le rendu,
+# puis enregistrées par le processus web, seul à exposer /metrics
+PDF_STAGES = metrics.histogram('pathway_pdf_stage_seconds',
+                               'Durée des étapes du rendu PDF (sanitize, html_parse, image_decode, svg_convert, story, build)',
+                               ('stage',))
+PDF_EXPORTS = metrics.counter('pathway_pdf_exports_total', 'Exports PDF par mode (sync, async) et issue (ok, error, rejected)',
+                              ('mode', 'outcome'))
+PDF_BYTES = metrics.histogram('pathway_pdf_output_bytes', 'Taille des PDF générés (octets)',
+                              buckets=(16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864))
+PDF_PAGES = metrics.histogram('pathway_pdf_pages', 'Nombre de pages des PDF générés',
+                              buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500))
+
+_pdf_stats = threading.local()
+
+@contextlib.contextmanager
+def pdf_stage(name):
+    """Chronomètre une étape du rendu PDF en cours dans ce thread (sans effet hors render_pdf_with_stats)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats = getattr(_pdf_stats, 'current', None)
+        if stats is not None:
+            stages = stats['stages']
+            stages[name] = stages.get(name, 0.0) + time.perf_counter() - start
+
+def observe_pdf_export(mode, size, stats):
+    PDF_EXPORTS.inc(mode, 'ok')
+    PDF_BYTES.observe(size)
+    PDF_PAGES.observe(stats['pages'])
+    for stage, seconds in stats['stages'].items():
+        PDF_STAGES.observe(seconds, stage)
+
+# Registre des styles PDF par thème (couleur primaire, marges), borné en mémoire
+PDF_THEME_CACHE_SIZE = int(os.getenv('PDF_THEME_CACHE_SIZE', 16))
+
+@functools.lru_cache(maxsize=1)
+def sample_styles():
+    """Feuille de styles ReportLab de base, construite une seule fois"""
+    return getSampleStyleSheet()
+
+class PdfTheme:
+    """Styles ReportLab et mise en page d'un thème PDF, construits une fois puis partagés entre exports"""
+
+    def __init__(self, primary, left, right, top, bottom):
+        styles = sample_styles()
+        self.primary = colors.HexColor(primary)
+        self.left_margin = left * mm
+        self.right_margin = right * mm
+        self.top_margin = top * mm
+        self.bottom_margin = bottom * mm
+        self.available_width = A4[0] - self.left_margin - self.right_margin
+
+        self.title = ParagraphStyle(
             'CustomTitle',
             parent=styles['Heading1'],
             fontSize=18,
-            textColor=colors.HexColor(pdf_config.get('theme', {}).get('primary', '#0C4A45')),
+            textColor=self.primary,
             spaceAfter=12,
             alignment=TA_CENTER  # Centrer le titre
         )
-        heading_style = ParagraphStyle(
+        self.heading = ParagraphStyle(
             'CustomHeading',
             parent=styles['Heading2'],
             fontSize=14,
-            textColor=colors.HexColor(pdf_config.get('theme', {}).get('primary', '#0C4A45')),
+            textColor=self.primary,
             spaceAfter=6,
             spaceBefore=12
         )
         # Style normal - Taille raisonnable pour PDF
-        normal_style = ParagraphStyle(
+        self.normal = ParagraphStyle(
             'CustomNormal',
             parent=styles['Normal'],
             fontSize=11,
@@ -632,7 +2217,7 @@ def generate_pdf():
             fontName='Helvetica'
         )
         # Style bloc de code préformaté (global)
-        pre_style = ParagraphStyle(
+        self.pre = ParagraphStyle(
             'Preformatted',
             parent=styles['Code'],
             fontSize=9,
@@ -643,594 +2228,1899 @@ def generate_pdf():
             leftIndent=6,
             rightIndent=6,
         )
-        
-        # Contenu du PDF
-        story = []
-        
-        # Logo en en-tête (si présent)
-        if pdf_config.get('logo'):
+
+        # Styles de titres - Tailles proportionnées pour PDF
+        self.h1 = ParagraphStyle('H1', parent=styles['Heading1'], textColor=self.primary, fontSize=18, spaceBefore=12, spaceAfter=10, leading=22, fontName='Helvetica-Bold')
+        self.h2 = ParagraphStyle('H2', parent=styles['Heading2'], textColor=self.primary, fontSize=14, spaceBefore=10, spaceAfter=8, leading=17, fontName='Helvetica-Bold')
+        self.h3 = ParagraphStyle('H3', parent=styles['Heading3'], textColor=self.primary, fontSize=12, spaceBefore=8, spaceAfter=6, leading=15, fontName='Helvetica-Bold')
+        self.h4 = ParagraphStyle('H4', parent=styles['Heading4'], textColor=colors.HexColor('#374151'), fontSize=11, spaceBefore=6, spaceAfter=5, leading=14, fontName='Helvetica-Bold')
+        self.h5 = ParagraphStyle('H5', parent=styles['Heading5'], textColor=colors.HexColor('#4B5563'), fontSize=10, spaceBefore=5, spaceAfter=4, leading=13, fontName='Helvetica-Bold')
+        self.h6 = ParagraphStyle('H6', parent=styles['Heading6'], textColor=colors.HexColor('#6B7280'), fontSize=9, spaceBefore=4, spaceAfter=3, leading=11, fontName='Helvetica-Bold')
+
+        # Style pour le code
+        self.code = ParagraphStyle(
+            'Code',
+            parent=styles['Code'],
+            fontSize=9,
+            fontName='Courier',
+            textColor=colors.HexColor('#1F2937'),
+            backColor=colors.HexColor('#F3F4F6'),
+            leftIndent=10,
+            rightIndent=10,
+            spaceBefore=4,
+            spaceAfter=4
+        )
+        # Style pour les cellules de tableau
+        self.table_cell = ParagraphStyle(
+            'TableCell',
+            parent=self.normal,
+            fontSize=10,
+            leading=14,
+            spaceAfter=0,
+            spaceBefore=0
+        )
+        # Style spécial pour en-tête (texte BLANC)
+        self.table_header_cell = ParagraphStyle(
+            'TableHeaderCell',
+            parent=self.normal,
+            fontSize=10,
+            leading=14,
+            spaceAfter=0,
+            spaceBefore=0,
+            textColor=colors.white,
+            fontName='Helvetica-Bold'
+        )
+        # Citation
+        self.quote = ParagraphStyle(
+            'Quote',
+            parent=self.normal,
+            leftIndent=20,
+            rightIndent=20,
+            textColor=colors.HexColor('#6B7280'),
+            borderColor=colors.HexColor('#0C4A45'),
+            borderWidth=2,
+            borderPadding=8,
+            spaceBefore=6,
+            spaceAfter=6
+        )
+        # Titre d'image en gros au-dessus (H2)
+        self.image_title = ParagraphStyle(
+            'ImageTitle',
+            parent=self.h2,  # Style H2 pour un gros titre
+            alignment=TA_LEFT,
+            spaceBefore=20,
+            spaceAfter=12,
+            fontSize=16,
+            fontName='Helvetica-Bold',
+            textColor=self.primary
+        )
+        self.watermark = ParagraphStyle(
+            'Watermark',
+            parent=self.normal,
+            fontSize=10,
+            textColor=colors.HexColor('#DC2626'),
+            alignment=TA_CENTER,
+            fontName='Helvetica-Bold'
+        )
+        self._list_styles = {}
+
+    def list_style(self, indent_level):
+        """Style des items de liste d'un niveau d'imbrication (créé à la première demande)"""
+        style = self._list_styles.get(indent_level)
+        if style is None:
+            # On n'utilise PAS bulletText, on insère le bullet dans le texte
+            style = self._list_styles.setdefault(indent_level, ParagraphStyle(
+                f'ListItem_{indent_level}',
+                parent=self.normal,
+                leftIndent=20 * (indent_level + 1),
+                spaceBefore=2,
+                spaceAfter=2,
+                fontSize=11,
+                leading=16,
+                fontName='Helvetica'  # Police Unicode complète
+            ))
+        return style
+
+@functools.lru_cache(maxsize=PDF_THEME_CACHE_SIZE)
+def get_pdf_theme(primary, left, right, top, bottom):
+    return PdfTheme(primary, left, right, top, bottom)
+
+def pdf_theme_for(pdf_config):
+    """Thème PDF (mis en cache) correspondant à la configuration du projet"""
+    theme = pdf_config.get('theme', {})
+    margins = theme.get('margins', {})
+    return get_pdf_theme(
+        theme.get('primary', '#0C4A45'),
+        margins.get('left', 18),
+        margins.get('right', 18),
+        margins.get('top', 24),
+        margins.get('bottom', 28)
+    )
+
+# Compte rendu converti une fois en "recette" de flowables, réutilisée tant que le HTML ne change pas
+REPORT_RECIPE_CACHE_SIZE = int(os.getenv('REPORT_RECIPE_CACHE_SIZE', 32))
+
+def build_report_recipe(html_input):
+    """Convertit le HTML de l'éditeur en recette de rendu (tuples immuables, indépendants du thème).
+
+    Opérations : ('paragraph', texte, style), ('spacer', hauteur), ('table', lignes) où style est un
+    nom d'attribut de PdfTheme ou ('list', niveau), et chaque ligne de tableau un couple (style, textes).
+    """
+    # Extraits du HTML avant/après nettoyage : construits seulement si le niveau DEBUG est tiré
+    trace = log_sampled(pdf_log)
+    if trace:
+        pdf_log.debug("HTML brut de Quill (%d chars): %.1000s", len(html_input), html_input, extra=SAMPLED)
+
+    # NETTOYAGE en une passe : carrés, entités, espaces invisibles, attributs data-list
+    sanitize_stats = {}
+    with pdf_stage('sanitize'):
+        html_input = sanitize_report_html(html_input, sanitize_stats)
+    if trace:
+        pdf_log.debug("HTML après nettoyage (%d carré(s) supprimé(s)): %.500s", sanitize_stats['squares'], html_input,
+                      extra=SAMPLED)
+
+    if LXML_SUPPORT:
+        try:
+            with pdf_stage('html_parse'):
+                document = lxml_html.document_fromstring(html_input)
+            return ReportHtmlConverter().convert(document.body)
+        except Exception as parse_e:
+            pdf_log.warning("⚠️ Parser HTML échoué: %s", parse_e)
+    # Fallback : texte brut
+    return (('paragraph', re.sub('<[^<]+?>', '', html_input), 'normal'),)
+
+# Balises inline traduites en balises ReportLab : (ouverture, fermeture)
+INLINE_MARKUP = {
+    'strong': ('<b>', '</b>'),
+    'b': ('<b>', '</b>'),
+    'em': ('<i>', '</i>'),
+    'i': ('<i>', '</i>'),
+    'u': ('<u>', '</u>'),
+    'code': ('<font name="Courier" size="9" color="#1F2937">', '</font>'),  # Code inline
+}
+HEADING_TAGS = frozenset(('h1', 'h2', 'h3', 'h4', 'h5', 'h6'))
+
+class ReportHtmlConverter:
+    """Conversion de l'arbre lxml du compte rendu en recette, en un seul parcours.
+
+    Le texte riche est accumulé dans une liste de jetons (mots et balises ReportLab) joints une
+    seule fois. Les espaces sont normalisés au fil de l'eau : une suite d'espaces devient un espace,
+    et les espaces en bord de contenu d'un élément sont supprimés.
+    """
+
+    def __init__(self):
+        self.ops = []
+
+    def convert(self, root):
+        if root.text:
+            self._root_text(root.text)
+        for el in root:
+            if isinstance(el.tag, str):
+                self._block(el, el.tag.lower())
+            if el.tail:
+                self._root_text(el.tail)
+        return tuple(self.ops)
+
+    def _paragraph(self, text, style):
+        if text:
+            self.ops.append(('paragraph', text, style))
+            # Espace après paragraphes normaux
+            if style == 'normal':
+                self.ops.append(('spacer', 6))
+
+    def _root_text(self, text):
+        self._paragraph(clean_squares(text.strip()), 'normal')
+
+    def _block(self, el, name):
+        if name in ('p', 'div'):
+            content = self.inline(el)
+            if not content or content == '<br/>':
+                # Paragraphe vide = saut de ligne plus marqué
+                self.ops.append(('spacer', 12))
+            else:
+                self._paragraph(content, 'normal')
+        elif name in HEADING_TAGS:
+            text = self.inline(el)
+            if text:
+                self.ops.append(('paragraph', text, name))
+        elif name in ('ul', 'ol'):
+            self._list(el, name == 'ol', 0)
+            self.ops.append(('spacer', 8))
+        elif name == 'table':
+            self._table(el)
+        elif name == 'br':
+            # Saut de ligne explicite
+            self.ops.append(('spacer', 12))
+        elif name == 'pre':
+            # Bloc de code préformaté
+            code_text = ''.join(el.itertext())
+            if code_text.strip():
+                self.ops.append(('paragraph', code_text, 'code'))
+                self.ops.append(('spacer', 4))
+        elif name == 'blockquote':
+            # Citation
+            quote_text = self.inline(el)
+            if quote_text:
+                self.ops.append(('paragraph', quote_text, 'quote'))
+                self.ops.append(('spacer', 4))
+
+    def _list(self, list_el, ordered, level):
+        """Items d'une liste puis, pour chacun, ses sous-listes directes (niveau suivant)"""
+        counter = 1
+        for li in list_el:
+            if li.tag != 'li':
+                continue
+            # Texte de l'item, sans ses sous-listes
+            text = self.inline(li, skip_lists=True)
+            if text:
+                if ordered:
+                    bullet = f'{counter}. '
+                    counter += 1
+                else:
+                    # Tiret simple pour tous les niveaux (plus propre)
+                    bullet = '-'
+                self.ops.append(('paragraph', f'{bullet} {text}', ('list', level)))
+            for sub_list in li:
+                if sub_list.tag in ('ul', 'ol'):
+                    self._list(sub_list, sub_list.tag == 'ol', level + 1)
+
+    def _table(self, table_el):
+        rows = []
+        # En-tête (thead uniquement)
+        thead = next(table_el.iter('thead'), None)
+        if thead is not None:
+            for tr in thead.iter('tr'):
+                head_row = tuple(f'<font color="white"><b>{cell_text(th)}</b></font>' for th in tr.iter('th', 'td'))
+                if head_row:
+                    rows.append(('table_header_cell', head_row))
+
+        # Corps (tbody, sinon les tr directs du tableau)
+        tbody = next(table_el.iter('tbody'), None)
+        body_rows = tbody.iter('tr') if tbody is not None else (tr for tr in table_el if tr.tag == 'tr')
+        for tr in body_rows:
+            cells = tuple(cell_text(td) for td in tr.iter('td', 'th'))
+            if cells:
+                rows.append(('table_cell', cells))
+
+        if rows:
+            self.ops.append(('table', tuple(rows)))
+            self.ops.append(('spacer', 10))
+
+    def inline(self, el, skip_lists=False):
+        """Texte ReportLab du contenu de l'élément (gras, italique, liens, code, sauts de ligne)"""
+        self._tokens = []
+        self._emitted = 0
+        self._pending = None  # Profondeur de l'espace en attente d'être émis
+        self._skip_lists = skip_lists
+        self._inline(el, 0)
+        return ''.join(self._tokens)
+
+    def _emit(self, token):
+        if self._pending is not None:
+            self._tokens.append(' ')
+            self._pending = None
+        self._tokens.append(token)
+        self._emitted += 1
+
+    def _text(self, text, depth, started_at):
+        text = SQUARES_RE.sub('', text)
+        for i, word in enumerate(SPACES_RE.split(text)):
+            # Un espace n'est gardé qu'après un jeton émis dans ce même élément
+            if i and self._emitted > started_at:
+                self._pending = depth
+            if word:
+                self._emit(word)
+
+    def _inline(self, el, depth):
+        started_at = self._emitted
+        if el.text:
+            self._text(el.text, depth, started_at)
+        for child in el:
+            tag = child.tag
+            if isinstance(tag, str):
+                tag = tag.lower()
+                markup = INLINE_MARKUP.get(tag)
+                if markup:
+                    self._emit(markup[0])
+                    self._inline(child, depth + 1)
+                    self._emit(markup[1])
+                elif tag == 'br':
+                    self._emit('<br/>')
+                elif tag == 'p':
+                    # Paragraphe imbriqué : ajouter un saut de ligne
+                    before = self._emitted
+                    self._inline(child, depth + 1)
+                    if self._emitted > before:
+                        self._emit('<br/><br/>')
+                elif tag == 'a':
+                    self._emit(f'<a href="{child.get("href", "")}">')
+                    self._inline(child, depth + 1)
+                    self._emit('</a>')
+                elif not (self._skip_lists and tag in ('ul', 'ol')):
+                    self._inline(child, depth + 1)
+            if child.tail:
+                self._text(child.tail, depth, started_at)
+        # Espace en fin de contenu : supprimé
+        if self._pending == depth:
+            self._pending = None
+
+def cell_text(el):
+    """Texte brut d'une cellule de tableau"""
+    return clean_squares(' '.join(part.strip() for part in el.itertext() if part.strip()))
+
+def report_table(rows, theme):
+    """Tableau ReportLab d'une opération 'table' de la recette"""
+    cells = [[Paragraph(text, getattr(theme, style)) for text in texts] for style, texts in rows]
+
+    # Calculer la largeur disponible
+    num_cols = len(cells[0]) if cells else 1
+    col_widths = [theme.available_width / num_cols] * num_cols
+
+    # Créer le tableau avec largeurs de colonnes
+    tbl = Table(cells, colWidths=col_widths, hAlign='LEFT', repeatRows=1, splitByRow=True)
+    # Fond d'en-tête plus clair pour meilleure lisibilité
+    header_bg = colors.HexColor('#0f5650')  # Version plus claire du vert Enovacom
+    grid_color = colors.HexColor('#0C4A45')
+    style_cmds = [
+        ('GRID', (0,0), (-1,-1), 0.75, grid_color),
+        ('FONTNAME', (0,0), (-1,-1), 'Helvetica'),
+        ('FONTSIZE', (0,0), (-1,-1), 9),
+        ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
+        ('LEFTPADDING', (0,0), (-1,-1), 6),
+        ('RIGHTPADDING', (0,0), (-1,-1), 6),
+        ('TOPPADDING', (0,0), (-1,-1), 4),
+        ('BOTTOMPADDING', (0,0), (-1,-1), 4),
+        ('WORDWRAP', (0,0), (-1,-1), True),  # Retour à la ligne automatique
+        ('BACKGROUND', (0,0), (-1,0), header_bg),
+        ('TEXTCOLOR', (0,0), (-1,0), colors.white),  # Blanc pour lisibilité
+        ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+    ]
+    for r in range(1, len(cells)):
+        if r % 2 == 0:
+            style_cmds.append(('BACKGROUND', (0,r), (-1,r), colors.HexColor('#F9FAFB')))
+    tbl.setStyle(TableStyle(style_cmds))
+    return tbl
+
+def report_flowables(recipe, theme):
+    """Flowables neufs (ils ne sont pas réutilisables d'un document à l'autre) à partir d'une recette"""
+    story = []
+    for op in recipe:
+        kind = op[0]
+        if kind == 'paragraph':
+            style = op[2]
+            style = theme.list_style(style[1]) if isinstance(style, tuple) else getattr(theme, style)
+            story.append(Paragraph(op[1], style))
+        elif kind == 'spacer':
+            story.append(Spacer(1, op[1]))
+        elif kind == 'table':
+            story.append(report_table(op[1], theme))
+    return story
+
+class ReportRecipeCache:
+    """LRU des recettes de compte rendu, indexées par le hash du HTML brut"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, html_input):
+        digest = hashlib.sha256(html_input.encode('utf-8')).hexdigest()
+        with self._lock:
+            recipe = self._entries.get(digest)
+            if recipe is not None:
+                self._entries.move_to_end(digest)
+                self.stats['hits'] += 1
+                return recipe
+            self.stats['misses'] += 1
+
+        recipe = build_report_recipe(html_input)
+        if self.max_entries > 0:
+            with self._lock:
+                self._entries[digest] = recipe
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.stats['evictions'] += 1
+        return recipe
+
+    def snapshot(self):
+        with self._lock:
+            return {**self.stats, 'entries': len(self._entries), 'max_entries': self.max_entries}
+
+report_recipes = ReportRecipeCache(REPORT_RECIPE_CACHE_SIZE)
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+# Magasin local des images envoyées par /api/assets, adressées par le SHA-256 de leur contenu
+ASSET_STORE_DIR = os.getenv('ASSET_STORE_DIR', os.path.join(DATA_DIR, 'assets'))
+ASSET_STORE_MAX_MB = float(os.getenv('ASSET_STORE_MAX_MB', 500))
+ASSET_MAX_MB = float(os.getenv('ASSET_MAX_MB', 20))
+ASSET_CHUNK = 256 * 1024
+ASSET_DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+
+class AssetStore:
+    """Fichiers d'images nommés par leur SHA-256, bornés en volume total (LRU sur la date d'accès).
+
+    La date de modification des fichiers sert de date d'accès : les workers du pool de rendu
+    lisent le répertoire directement et rafraîchissent cette date à chaque lecture.
+    Le type MIME relevé à l'envoi est gardé à côté (<hash>.mime) : le servir ne décode pas l'image.
+    """
+
+    MIME_SUFFIX = '.mime'
+
+    def __init__(self, directory, max_bytes, max_asset_bytes):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self.max_asset_bytes = max_asset_bytes
+        self._lock = threading.Lock()
+        self.stats = {'uploads': 0, 'duplicates': 0, 'rejected': 0, 'evicted': 0}
+
+    def path(self, digest):
+        return os.path.join(self.directory, digest)
+
+    def exists(self, digest):
+        return bool(ASSET_DIGEST_RE.match(digest or '')) and os.path.exists(self.path(digest))
+
+    def open(self, digest):
+        """(fichier ouvert, type MIME) de l'asset ; FileNotFoundError s'il est inconnu ou a été évincé.
+
+        Le fichier ouvert reste lisible même si une éviction le supprime pendant l'envoi.
+        """
+        if not ASSET_DIGEST_RE.match(digest or ''):
+            raise FileNotFoundError(f'Asset invalide: {digest!r}')
+        f = open(self.path(digest), 'rb')
+        try:
+            with open(self.path(digest) + self.MIME_SUFFIX, encoding='ascii') as meta:
+                mimetype = meta.read().strip()
+        except OSError:
+            mimetype = ''
+        if not mimetype:
+            # Asset enregistré avant les fichiers .mime : en-tête lu une fois, type mémorisé
             try:
-                logo_data = pdf_config.get('logo')
-                if logo_data.startswith('data:image'):
-                    # Décoder le logo base64
-                    logo_data = logo_data.split(',')[1]
-                    logo_bytes = base64.b64decode(logo_data)
-                    logo_buffer = io.BytesIO(logo_bytes)
-                    
-                    # Calculer la largeur disponible (A4 - marges)
-                    page_width = A4[0]
-                    left_margin = pdf_config.get('theme', {}).get('margins', {}).get('left', 18) * mm
-                    right_margin = pdf_config.get('theme', {}).get('margins', {}).get('right', 18) * mm
-                    available_width = page_width - left_margin - right_margin
-                    
-                    # Ajouter le logo au PDF (TOUTE la largeur disponible)
-                    logo_img = RLImage(logo_buffer, width=available_width, height=60*mm, kind='proportional')
-                    story.append(logo_img)
-                    story.append(Spacer(1, 20))
-            except Exception as e:
-                print(f"⚠️ Erreur ajout logo: {e}")
-        
-        # En-tête
-        story.append(Paragraph(pdf_config.get('title', 'Document'), title_style))
-        if pdf_config.get('client'):
-            story.append(Paragraph(f"Client: {pdf_config.get('client')}", normal_style))
-        if pdf_config.get('subtitle'):
-            story.append(Paragraph(f"{pdf_config.get('subtitle')}", normal_style))
-        story.append(Spacer(1, 12))
-        
-        # Ordre des blocs
-        order = pdf_config.get('order', ['diagram', 'report', 'images'])
-        
-        for block in order:
-            if block == 'diagram':
-                # DIAGRAMME SUPPRIMÉ - L'utilisateur peut l'ajouter manuellement via les images
-                print("📊 Diagramme ignoré - Utilisez la section Images pour ajouter le diagramme manuellement")
-                pass
-            
-            elif block == 'report' and report_data.get('generated'):
-                # Rendu propre du HTML de l'éditeur dans le PDF
-                html_input = report_data.get('generated', '')
-                
-                # DEBUG MASSIF: Tracer complètement le HTML
-                print(f"\n{'='*80}")
-                print(f"=== HTML BRUT DE QUILL (TOTAL: {len(html_input)} chars) ===")
-                print(f"{'='*80}")
-                print(html_input[:1000])  # Premiers 1000 chars
-                print(f"\n=== RECHERCHE DE CARRÉS DANS LE HTML BRUT ===")
-                import re
-                carres_detectes = []
-                if '■' in html_input:
-                    count = html_input.count('■')
-                    carres_detectes.append(f"■ (U+25A0): {count} occurrences")
-                    print(f"❌ CARRÉ ■ trouvé {count} fois dans le HTML brut")
-                if '▪' in html_input:
-                    count = html_input.count('▪')
-                    carres_detectes.append(f"▪ (U+25AA): {count} occurrences")
-                    print(f"❌ CARRÉ ▪ trouvé {count} fois dans le HTML brut")
-                # Chercher d'autres carrés
-                for char in ['◼', '◾', '▮', '◆', '⬛', '▫', '□', '▢', '⬜']:
-                    if char in html_input:
-                        count = html_input.count(char)
-                        carres_detectes.append(f"{char} (U+{ord(char):04X}): {count} occurrences")
-                        print(f"❌ CARRÉ {char} trouvé {count} fois")
-                
-                if carres_detectes:
-                    print(f"\n⚠️ TOTAL: {len(carres_detectes)} types de carrés détectés")
-                    for info in carres_detectes:
-                        print(f"  - {info}")
+                with PILImage.open(f) as img:
+                    mimetype = PILImage.MIME.get(img.format, 'application/octet-stream')
+            except Exception:
+                mimetype = 'application/octet-stream'
+            f.seek(0)
+            self._write_mimetype(digest, mimetype)
+        return f, mimetype
+
+    def _write_mimetype(self, digest, mimetype):
+        try:
+            with open(self.path(digest) + self.MIME_SUFFIX, 'w', encoding='ascii') as meta:
+                meta.write(mimetype)
+        except OSError as e:
+            log.warning("⚠️ Type MIME de l'asset %s non enregistré: %s", digest[:12], e)
+
+    def read(self, digest):
+        """Octets de l'asset (FileNotFoundError s'il est inconnu ou a été évincé)"""
+        if not ASSET_DIGEST_RE.match(digest or ''):
+            raise FileNotFoundError(f'Asset invalide: {digest!r}')
+        path = self.path(digest)
+        with open(path, 'rb') as f:
+            data = f.read()
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def save(self, stream):
+        """Enregistre une image lue par blocs ; retourne (description, None) ou (None, (message, statut))"""
+        os.makedirs(self.directory, exist_ok=True)
+        fd, partial = tempfile.mkstemp(dir=self.directory, suffix='.part')
+        sha = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                while True:
+                    chunk = stream.read(ASSET_CHUNK)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > self.max_asset_bytes:
+                        return None, self._reject(f'Image trop volumineuse (max {self.max_asset_bytes // (1024 * 1024)} Mo)', 413)
+                    sha.update(chunk)
+                    f.write(chunk)
+            try:
+                # En-tête seulement : format et dimensions sans décoder les pixels
+                with PILImage.open(partial) as img:
+                    image_format, (width, height) = img.format, img.size
+            except Exception:
+                return None, self._reject('Fichier non reconnu comme image', 400)
+
+            digest = sha.hexdigest()
+            path = self.path(digest)
+            with self._lock:
+                if os.path.exists(path):
+                    os.utime(path)
+                    self.stats['duplicates'] += 1
                 else:
-                    print(f"\n✅ AUCUN carré détecté dans le HTML brut")
-                
-                # NETTOYAGE ULTRA AGRESSIF - Éliminer TOUS les carrés
-                # Carrés Unicode (pleins)
-                html_input = html_input.replace('■', '')  # SUPPRIMER complètement
-                html_input = html_input.replace('▪', '')  # SUPPRIMER complètement
-                html_input = html_input.replace('◼', '')  # SUPPRIMER complètement
-                html_input = html_input.replace('◾', '')  # SUPPRIMER complètement
-                html_input = html_input.replace('▮', '')  # SUPPRIMER complètement
-                html_input = html_input.replace('◆', '')  # SUPPRIMER complètement
-                html_input = html_input.replace('⬛', '')  # SUPPRIMER complètement
-                html_input = html_input.replace('⬜', '')  # SUPPRIMER complètement
-                html_input = html_input.replace('▫', '')  # SUPPRIMER complètement
-                html_input = html_input.replace('□', '')  # SUPPRIMER complètement
-                html_input = html_input.replace('▢', '')  # SUPPRIMER complètement
-                # HTML entities (tous les formats)
-                html_input = html_input.replace('&#9632;', '')  # SUPPRIMER
-                html_input = html_input.replace('&#x25A0;', '')  # SUPPRIMER
-                html_input = html_input.replace('&#9642;', '')  # SUPPRIMER
-                html_input = html_input.replace('&#x25AA;', '')  # SUPPRIMER
-                html_input = html_input.replace('&#9724;', '')  # SUPPRIMER
-                html_input = html_input.replace('&nbsp;■', '')  # SUPPRIMER
-                # Regex pour attraper tout ce qui reste
-                html_input = re.sub(r'[■▪◼◾▮◆⬛▫□▢⬜]', '', html_input)
-                # Nettoyer les balises <li> avec data-list
-                html_input = re.sub(r'<li[^>]*data-list=["\']bullet["\'][^>]*>', '<li>', html_input)
-                html_input = re.sub(r'<li[^>]*data-list=["\']ordered["\'][^>]*>', '<li>', html_input)
-                
-                print(f"\n=== HTML APRÈS NETTOYAGE (premiers 500 chars) ===")
-                print(html_input[:500])
-                
-                if BS4_SUPPORT:
-                    try:
-                        soup = BeautifulSoup(html_input, 'html.parser')
-
-                        # Styles de titres - Tailles proportionnées pour PDF
-                        primary = colors.HexColor(pdf_config.get('theme', {}).get('primary', '#0C4A45'))
-                        h1_style = ParagraphStyle('H1', parent=styles['Heading1'], textColor=primary, fontSize=18, spaceBefore=12, spaceAfter=10, leading=22, fontName='Helvetica-Bold')
-                        h2_style = ParagraphStyle('H2', parent=styles['Heading2'], textColor=primary, fontSize=14, spaceBefore=10, spaceAfter=8, leading=17, fontName='Helvetica-Bold')
-                        h3_style = ParagraphStyle('H3', parent=styles['Heading3'], textColor=primary, fontSize=12, spaceBefore=8, spaceAfter=6, leading=15, fontName='Helvetica-Bold')
-                        h4_style = ParagraphStyle('H4', parent=styles['Heading4'], textColor=colors.HexColor('#374151'), fontSize=11, spaceBefore=6, spaceAfter=5, leading=14, fontName='Helvetica-Bold')
-                        h5_style = ParagraphStyle('H5', parent=styles['Heading5'], textColor=colors.HexColor('#4B5563'), fontSize=10, spaceBefore=5, spaceAfter=4, leading=13, fontName='Helvetica-Bold')
-                        h6_style = ParagraphStyle('H6', parent=styles['Heading6'], textColor=colors.HexColor('#6B7280'), fontSize=9, spaceBefore=4, spaceAfter=3, leading=11, fontName='Helvetica-Bold')
-                        
-                        # Style pour le code
-                        code_style = ParagraphStyle(
-                            'Code',
-                            parent=styles['Code'],
-                            fontSize=9,
-                            fontName='Courier',
-                            textColor=colors.HexColor('#1F2937'),
-                            backColor=colors.HexColor('#F3F4F6'),
-                            leftIndent=10,
-                            rightIndent=10,
-                            spaceBefore=4,
-                            spaceAfter=4
-                        )
-
-                        def html_to_reportlab(element, preserve_spaces=False):
-                            """Convertit un élément HTML en texte avec balises ReportLab"""
-                            if isinstance(element, str):
-                                # Nettoyer les carrés
-                                text = clean_squares(str(element))
-                                if preserve_spaces:
-                                    return text
-                                return text
-                            
-                            text = ''
-                            for child in element.children:
-                                if child.name == 'strong' or child.name == 'b':
-                                    text += f'<b>{html_to_reportlab(child, preserve_spaces)}</b>'
-                                elif child.name == 'em' or child.name == 'i':
-                                    text += f'<i>{html_to_reportlab(child, preserve_spaces)}</i>'
-                                elif child.name == 'u':
-                                    text += f'<u>{html_to_reportlab(child, preserve_spaces)}</u>'
-                                elif child.name == 'code':
-                                    # Code inline
-                                    text += f'<font name="Courier" size="9" color="#1F2937">{html_to_reportlab(child, True)}</font>'
-                                elif child.name == 'br':
-                                    text += '<br/>'
-                                elif child.name == 'p':
-                                    # Paragraphe imbriqué : ajouter un saut de ligne
-                                    inner = html_to_reportlab(child, preserve_spaces)
-                                    if inner.strip():
-                                        text += inner + '<br/><br/>'
-                                elif child.name == 'a':
-                                    href = child.get('href', '')
-                                    text += f'<a href="{href}">{html_to_reportlab(child, preserve_spaces)}</a>'
-                                elif child.name is None:
-                                    # Texte brut
-                                    text += str(child)
-                                else:
-                                    # Autres balises : récursion
-                                    text += html_to_reportlab(child, preserve_spaces)
-                            # Nettoyer les carrés dans le texte final
-                            return clean_squares(text)
-
-                        def add_paragraph(element, style=normal_style, add_spacer=True):
-                            """Ajoute un paragraphe avec mise en forme préservée"""
-                            if isinstance(element, str):
-                                t = clean_squares(element.strip())
-                            else:
-                                t = clean_squares(html_to_reportlab(element).strip())
-                            if t:
-                                story.append(Paragraph(t, style))
-                                # Espace après paragraphes normaux
-                                if add_spacer and style == normal_style:
-                                    story.append(Spacer(1, 6))
-
-                        def render_list(list_tag, ordered=False, indent_level=0):
-                            """Rend une liste avec support des listes imbriquées"""
-                            counter = 1
-                            
-                            # Style unique pour tous les items de liste
-                            # On n'utilise PAS bulletText, on insère le bullet dans le texte
-                            list_style = ParagraphStyle(
-                                f'ListItem_{indent_level}',
-                                parent=normal_style,
-                                leftIndent=20 * (indent_level + 1),
-                                spaceBefore=2,
-                                spaceAfter=2,
-                                fontSize=11,
-                                leading=16,
-                                fontName='Helvetica'  # Police Unicode complète
-                            )
-                            
-                            for li in list_tag.find_all('li', recursive=False):
-                                # Extraire le texte et les sous-listes
-                                li_copy = li.__copy__()
-                                
-                                # Retirer les sous-listes pour ne garder que le texte direct
-                                for sub_list in li_copy.find_all(['ul', 'ol']):
-                                    sub_list.decompose()
-                                
-                                # Texte de l'item
-                                raw_text = html_to_reportlab(li_copy).strip()
-                                
-                                # DEBUG: Avant nettoyage
-                                print(f"\n--- ITEM DE LISTE (niveau {indent_level}) ---")
-                                print(f"AVANT clean_squares: {repr(raw_text[:150])}")
-                                
-                                # NETTOYER AGRESSIVEMENT les carrés
-                                text = clean_squares(raw_text)
-                                
-                                # DEBUG: Après nettoyage
-                                print(f"APRÈS clean_squares: {repr(text[:150])}")
-                                
-                                # Vérification finale
-                                if '■' in text or '▪' in text:
-                                    print(f"\n❌❌❌ CARRÉ ENCORE PRÉSENT APRÈS NETTOYAGE!")
-                                    print(f"Texte: {repr(text[:100])}")
-                                    # Montrer le code Unicode de chaque caractère suspect
-                                    for i, char in enumerate(text[:50]):
-                                        if ord(char) >= 0x2580:
-                                            print(f"  Position {i}: '{char}' = U+{ord(char):04X}")
-                                
-                                if text:
-                                    # Bullet selon le type et le niveau
-                                    if ordered:
-                                        bullet = f'{counter}. '
-                                        counter += 1
-                                    else:
-                                        # FORCER les bullets ronds (ignorer le HTML)
-                                        bullets = ['•', '◦', '–', '−']
-                                        bullet = bullets[min(indent_level, len(bullets)-1)]
-                                    
-                                    # SOLUTION SIMPLE: Utiliser uniquement des tirets pour tous les niveaux
-                                    # Plus élégant et lisible que les "o"
-                                    if ordered:
-                                        ascii_bullet = bullet  # Les numéros sont OK
-                                    else:
-                                        # Tiret simple pour tous les niveaux (plus propre)
-                                        ascii_bullet = '-'
-                                    
-                                    final_text = f'{ascii_bullet} {text}'
-                                    
-                                    print(f"Bullet ASCII utilisé: {repr(ascii_bullet)}")
-                                    print(f"Texte final envoyé au PDF: {repr(final_text[:100])}")
-                                    
-                                    # Ajouter l'item avec le bullet ASCII
-                                    story.append(Paragraph(final_text, list_style))
-                                
-                                # Gérer les sous-listes
-                                for sub_list in li.find_all(['ul', 'ol'], recursive=False):
-                                    is_ordered = sub_list.name == 'ol'
-                                    render_list(sub_list, ordered=is_ordered, indent_level=indent_level + 1)
-
-                        def render_table(table_tag):
-                            rows = []
-                            
-                            # Style pour les cellules de tableau
-                            cell_style = ParagraphStyle(
-                                'TableCell',
-                                parent=normal_style,
-                                fontSize=10,
-                                leading=14,
-                                spaceAfter=0,
-                                spaceBefore=0
-                            )
-                            
-                            # Style spécial pour en-tête (texte BLANC)
-                            header_cell_style = ParagraphStyle(
-                                'TableHeaderCell',
-                                parent=normal_style,
-                                fontSize=10,
-                                leading=14,
-                                spaceAfter=0,
-                                spaceBefore=0,
-                                textColor=colors.white,
-                                fontName='Helvetica-Bold'
-                            )
-                            
-                            # En-tête (thead uniquement)
-                            thead = table_tag.find('thead')
-                            if thead:
-                                for tr in thead.find_all('tr'):
-                                    head_row = [Paragraph(f'<font color="white"><b>{clean_squares(th.get_text(" ", strip=True))}</b></font>', header_cell_style) for th in tr.find_all(['th', 'td'])]
-                                    if head_row:
-                                        rows.append(head_row)
-                            
-                            # Corps (tbody ou tr hors thead)
-                            tbody = table_tag.find('tbody')
-                            if tbody:
-                                # Si tbody existe, chercher dedans
-                                for tr in tbody.find_all('tr'):
-                                    cells = [Paragraph(clean_squares(td.get_text(" ", strip=True)), cell_style) for td in tr.find_all(['td', 'th'])]
-                                    if cells:
-                                        rows.append(cells)
-                            else:
-                                # Sinon, chercher les tr qui ne sont PAS dans thead
-                                for tr in table_tag.find_all('tr', recursive=False):
-                                    # Ignorer si ce tr est dans thead
-                                    if thead and tr.find_parent('thead'):
-                                        continue
-                                    cells = [Paragraph(clean_squares(td.get_text(" ", strip=True)), cell_style) for td in tr.find_all(['td', 'th'])]
-                                    if cells:
-                                        rows.append(cells)
-
-                            if rows:
-                                # Calculer la largeur disponible
-                                num_cols = len(rows[0]) if rows else 1
-                                col_widths = [available_width / num_cols] * num_cols
-                                
-                                # Créer le tableau avec largeurs de colonnes
-                                tbl = Table(rows, colWidths=col_widths, hAlign='LEFT', repeatRows=1, splitByRow=True)
-                                # Fond d'en-tête plus clair pour meilleure lisibilité
-                                header_bg = colors.HexColor('#0f5650')  # Version plus claire du vert Enovacom
-                                header_text = colors.white
-                                grid_color = colors.HexColor('#0C4A45')
-                                style_cmds = [
-                                    ('GRID', (0,0), (-1,-1), 0.75, grid_color),
-                                    ('FONTNAME', (0,0), (-1,-1), 'Helvetica'),
-                                    ('FONTSIZE', (0,0), (-1,-1), 9),
-                                    ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
-                                    ('LEFTPADDING', (0,0), (-1,-1), 6),
-                                    ('RIGHTPADDING', (0,0), (-1,-1), 6),
-                                    ('TOPPADDING', (0,0), (-1,-1), 4),
-                                    ('BOTTOMPADDING', (0,0), (-1,-1), 4),
-                                    ('WORDWRAP', (0,0), (-1,-1), True),  # Retour à la ligne automatique
-                                ]
-                                if len(rows) > 0:
-                                    style_cmds += [
-                                        ('BACKGROUND', (0,0), (-1,0), header_bg),
-                                        ('TEXTCOLOR', (0,0), (-1,0), colors.white),  # Blanc pour lisibilité
-                                        ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-                                    ]
-                                for r in range(1, len(rows)):
-                                    if r % 2 == 0:
-                                        style_cmds.append(('BACKGROUND', (0,r), (-1,r), colors.HexColor('#F9FAFB')))
-                                tbl.setStyle(TableStyle(style_cmds))
-                                story.append(tbl)
-                                story.append(Spacer(1, 10))
-
-                        root = soup.body if soup.body else soup
-                        prev_was_heading = False
-                        
-                        for el in getattr(root, 'children', []):
-                            name = getattr(el, 'name', None)
-                            if not name:
-                                text = str(el).strip()
-                                if text:
-                                    add_paragraph(text)
-                                continue
-                            
-                            name = name.lower()
-                            
-                            # Gérer les paragraphes vides (sauts de ligne)
-                            if name in ['p', 'div']:
-                                content = html_to_reportlab(el).strip()
-                                if not content or content == '<br/>':
-                                    # Paragraphe vide = saut de ligne plus marqué
-                                    story.append(Spacer(1, 12))
-                                    continue
-                            
-                            if name == 'h1':
-                                add_paragraph(el, h1_style, add_spacer=False)
-                                prev_was_heading = True
-                            elif name == 'h2':
-                                add_paragraph(el, h2_style, add_spacer=False)
-                                prev_was_heading = True
-                            elif name == 'h3':
-                                add_paragraph(el, h3_style, add_spacer=False)
-                                prev_was_heading = True
-                            elif name == 'h4':
-                                add_paragraph(el, h4_style, add_spacer=False)
-                                prev_was_heading = True
-                            elif name == 'h5':
-                                add_paragraph(el, h5_style, add_spacer=False)
-                                prev_was_heading = True
-                            elif name == 'h6':
-                                add_paragraph(el, h6_style, add_spacer=False)
-                                prev_was_heading = True
-                            elif name in ['p', 'div']:
-                                add_paragraph(el, normal_style)
-                                prev_was_heading = False
-                            elif name == 'ul':
-                                render_list(el, ordered=False)
-                                story.append(Spacer(1, 8))
-                                prev_was_heading = False
-                            elif name == 'ol':
-                                render_list(el, ordered=True)
-                                story.append(Spacer(1, 8))
-                                prev_was_heading = False
-                            elif name == 'table':
-                                render_table(el)
-                                prev_was_heading = False
-                            elif name == 'br':
-                                # Saut de ligne explicite
-                                story.append(Spacer(1, 12))
-                            elif name == 'pre':
-                                # Bloc de code préformaté
-                                code_text = el.get_text()
-                                if code_text.strip():
-                                    story.append(Paragraph(code_text, code_style))
-                                    story.append(Spacer(1, 4))
-                            elif name == 'blockquote':
-                                # Citation
-                                quote_text = html_to_reportlab(el)
-                                if quote_text.strip():
-                                    quote_style = ParagraphStyle(
-                                        'Quote',
-                                        parent=normal_style,
-                                        leftIndent=20,
-                                        rightIndent=20,
-                                        textColor=colors.HexColor('#6B7280'),
-                                        borderColor=colors.HexColor('#0C4A45'),
-                                        borderWidth=2,
-                                        borderPadding=8,
-                                        spaceBefore=6,
-                                        spaceAfter=6
-                                    )
-                                    story.append(Paragraph(quote_text, quote_style))
-                                    story.append(Spacer(1, 4))
-                        
-                    except Exception as parse_e:
-                        print(f"⚠️ Parser HTML échoué: {parse_e}")
-                        story.append(Paragraph(BeautifulSoup(html_input, 'html.parser').get_text('\n'), normal_style))
+                    os.replace(partial, path)
+                    self.stats['uploads'] += 1
+                if not os.path.exists(path + self.MIME_SUFFIX):
+                    self._write_mimetype(digest, PILImage.MIME.get(image_format, 'application/octet-stream'))
+        finally:
+            remove_file(partial)
+        self.evict(keep=digest)
+        return {'asset': digest, 'size': size, 'format': image_format, 'width': width, 'height': height}, None
+
+    def _reject(self, message, status):
+        with self._lock:
+            self.stats['rejected'] += 1
+        return message, status
+
+    def evict(self, keep=None):
+        """Supprime les assets les moins récemment utilisés tant que le volume dépasse la limite"""
+        stale = time.time() - 3600
+        with self._lock:
+            files = []
+            total = 0
+            for entry in os.scandir(self.directory):
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if entry.name.endswith('.part'):
+                    if st.st_mtime < stale:
+                        remove_file(entry.path)  # Envoi interrompu
+                    continue
+                if entry.name.endswith(self.MIME_SUFFIX):
+                    if not os.path.exists(entry.path[:-len(self.MIME_SUFFIX)]):
+                        remove_file(entry.path)  # Asset supprimé hors de l'éviction
+                    continue
+                total += st.st_size
+                if entry.name != keep:
+                    files.append((st.st_mtime, st.st_size, entry.path))
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                remove_file(path)
+                remove_file(path + self.MIME_SUFFIX)
+                self.stats['evicted'] += 1
+                total -= size
+
+    def snapshot(self):
+        with self._lock:
+            data = dict(self.stats)
+        entries = [entry.stat().st_size for entry in os.scandir(self.directory)
+                   if not entry.name.endswith(('.part', self.MIME_SUFFIX))] if os.path.isdir(self.directory) else []
+        data.update(entries=len(entries), bytes=sum(entries))
+        return data
+
+asset_store = AssetStore(ASSET_STORE_DIR, int(ASSET_STORE_MAX_MB * 1024 * 1024), int(ASSET_MAX_MB * 1024 * 1024))
+
+def asset_reference(value):
+    """SHA-256 d'une référence {'asset': '<sha256>'}, ou None pour toute autre valeur"""
+    if isinstance(value, dict) and isinstance(value.get('asset'), str):
+        return value['asset'].lower()
+    return None
+
+def is_image_source(value):
+    """Data URL d'image, ou référence vers le magasin d'assets ou vers une image de projet stocké"""
+    if isinstance(value, str):
+        return value.startswith('data:image/')
+    return asset_reference(value) is not None or blob_reference(value) is not None
+
+def project_image_sources(project):
+    """Sources d'images du projet telles que render_pdf les lit : logo, PNG du diagramme puis images"""
+    sources = [(project.get('pdfConfig') or {}).get('logo'), (project.get('diagram') or {}).get('png')]
+    for img_data in project.get('images') or []:
+        sources.append(image_source(img_data))
+    return [source for source in sources if source]
+
+def image_source(img_data):
+    """Source d'une image du projet : data URL (data/dataUrl) ou référence d'asset (asset, ou data: {'asset': ...})"""
+    if img_data.get('asset'):
+        return {'asset': img_data['asset']}
+    return img_data.get('data', '') or img_data.get('dataUrl', '')
+
+def missing_assets(project):
+    """Références d'assets du projet absentes du magasin (jamais envoyées ou évincées)"""
+    missing = []
+    for source in project_image_sources(project):
+        digest = asset_reference(source)
+        if digest is not None and not asset_store.exists(digest) and digest not in missing:
+            missing.append(digest)
+    return missing
+
+# Projets côté serveur (SQLite) : une ligne JSON par section, images dédupliquées en blobs compressés
+PROJECT_STORE_PATH = os.getenv('PROJECT_STORE_PATH', os.path.join(DATA_DIR, 'projects.sqlite3'))
+PROJECT_PAGE_SIZE = int(os.getenv('PROJECT_PAGE_SIZE', 20))
+PROJECT_PAGE_MAX = 100
+PROJECT_ID_RE = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
+PROJECT_META_KEYS = ('id', 'name', 'version', 'createdAt', 'updatedAt', 'images', 'imageChanges')
+DATA_URL_RE = re.compile(r'^data:([\w.+-]+/[\w.+-]+);base64,')
+BLOB_MIN_CHARS = 256  # Data URLs plus courtes laissées dans le JSON
+
+PROJECT_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS projects (
+    id TEXT PRIMARY KEY, name TEXT NOT NULL DEFAULT '', created TEXT NOT NULL, updated TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1, image_order TEXT NOT NULL DEFAULT '[]');
+CREATE INDEX IF NOT EXISTS idx_projects_updated ON projects(updated);
+CREATE TABLE IF NOT EXISTS sections (
+    project_id TEXT NOT NULL, name TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (project_id, name));
+CREATE TABLE IF NOT EXISTS images (
+    project_id TEXT NOT NULL, image_id TEXT NOT NULL, meta TEXT NOT NULL, PRIMARY KEY (project_id, image_id));
+CREATE TABLE IF NOT EXISTS refs (
+    project_id TEXT NOT NULL, owner TEXT NOT NULL, sha TEXT NOT NULL, PRIMARY KEY (project_id, owner, sha));
+CREATE INDEX IF NOT EXISTS idx_refs_sha ON refs(sha);
+CREATE TABLE IF NOT EXISTS blobs (
+    sha TEXT PRIMARY KEY, mime TEXT NOT NULL, codec TEXT NOT NULL, size INTEGER NOT NULL, data BLOB NOT NULL);
+'''
+
+def blob_reference(value):
+    """SHA-256 d'une référence {'blob': '<sha256>'} du magasin de projets, ou None"""
+    if isinstance(value, dict) and len(value) == 1 and isinstance(value.get('blob'), str):
+        return value['blob']
+    return None
+
+class ProjectStore:
+    """Projets en SQLite : sections (diagram, report, pdfConfig...) et images modifiables séparément.
+
+    Les data URLs (images, logo) sont remplacées à l'écriture par {'blob': sha256} : chaque image
+    n'est stockée qu'une fois, compressée quand zlib y gagne, et n'est pas réécrite aux sauvegardes
+    suivantes. La connexion est ouverte à la première utilisation, y compris dans les workers du pool.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._db = None
+        self._lock = threading.Lock()
+
+    def _conn(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.executescript(PROJECT_SCHEMA)
+            self._db = db
+        return self._db
+
+    # --- Lecture ---
+
+    def list(self, page=1, per_page=PROJECT_PAGE_SIZE):
+        """Page de résumés (sans sections ni images), du plus récemment modifié au plus ancien"""
+        per_page = max(1, min(per_page, PROJECT_PAGE_MAX))
+        page = max(1, page)
+        with self._lock:
+            db = self._conn()
+            total = db.execute('SELECT COUNT(*) FROM projects').fetchone()[0]
+            rows = db.execute(
+                'SELECT id, name, created, updated, version, image_order FROM projects '
+                'ORDER BY updated DESC, id LIMIT ? OFFSET ?', (per_page, (page - 1) * per_page)
+            ).fetchall()
+        return {'projects': [self._summary(row) for row in rows], 'page': page, 'per_page': per_page, 'total': total}
+
+    def load(self, project_id, inline=True):
+        """Projet complet, ou None ; inline=False garde les références {'blob': ...} (rendu PDF)"""
+        with self._lock:
+            db = self._conn()
+            row = db.execute('SELECT id, name, created, updated, version, image_order FROM projects WHERE id = ?',
+                             (project_id,)).fetchone()
+            if row is None:
+                return None
+            sections = db.execute('SELECT name, value FROM sections WHERE project_id = ?', (project_id,)).fetchall()
+            images = dict(db.execute('SELECT image_id, meta FROM images WHERE project_id = ?', (project_id,)).fetchall())
+        project = {name: json.loads(value) for name, value in sections}
+        summary = self._summary(row)
+        project.update(id=summary['id'], name=summary['name'], createdAt=summary['createdAt'],
+                       updatedAt=summary['updatedAt'], version=summary['version'])
+        project['images'] = [json.loads(images[image_id]) for image_id in json.loads(row[5]) if image_id in images]
+        return self._inline(project) if inline else project
+
+    def read_blob(self, sha):
+        """Octets d'une image stockée (FileNotFoundError si elle n'existe plus)"""
+        with self._lock:
+            row = self._conn().execute('SELECT codec, data FROM blobs WHERE sha = ?', (sha,)).fetchone()
+        if row is None:
+            raise FileNotFoundError(f'Blob inconnu: {sha}')
+        codec, data = row
+        return zlib.decompress(data) if codec == 'zlib' else bytes(data)
+
+    def _summary(self, row):
+        project_id, name, created, updated, version, image_order = row
+        return {'id': project_id, 'name': name, 'createdAt': created, 'updatedAt': updated,
+                'version': version, 'images': len(json.loads(image_order))}
+
+    def _inline(self, value):
+        sha = blob_reference(value)
+        if sha is not None:
+            with self._lock:
+                row = self._conn().execute('SELECT mime FROM blobs WHERE sha = ?', (sha,)).fetchone()
+            if row is None:
+                return ''
+            return f'data:{row[0]};base64,' + base64.b64encode(self.read_blob(sha)).decode('ascii')
+        if isinstance(value, dict):
+            return {k: self._inline(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._inline(v) for v in value]
+        return value
+
+    # --- Écriture ---
+
+    def create(self, project, keep_existing=False):
+        """Nouveau projet (identifiant du client conservé s'il est valide et libre) ; retourne (résumé, créé).
+
+        Avec keep_existing=True (import des projets du navigateur, rejouable), un projet dont
+        l'identifiant est déjà enregistré est laissé tel quel au lieu d'être dupliqué.
+        """
+        project_id = str(project.get('id') or '')
+        now = datetime.now().isoformat(timespec='milliseconds')
+        with self._lock:
+            db = self._conn()
+            taken = PROJECT_ID_RE.match(project_id) and db.execute(
+                'SELECT 1 FROM projects WHERE id = ?', (project_id,)).fetchone()
+            if taken and keep_existing:
+                created = False
+            else:
+                if not PROJECT_ID_RE.match(project_id) or taken:
+                    project_id = uuid.uuid4().hex
+                with db:
+                    db.execute('INSERT INTO projects (id, name, created, updated, version) VALUES (?, ?, ?, ?, 0)',
+                               (project_id, '', project.get('createdAt') or now, now))
+                    self._apply(db, project_id, {'images': [], **project})
+                created = True
+        return self.summary(project_id), created
+
+    def patch(self, project_id, changes, version=None):
+        """Applique les sections et images modifiées ; retourne (résumé, None) ou (None, (message, statut))"""
+        with self._lock:
+            db = self._conn()
+            row = db.execute('SELECT version FROM projects WHERE id = ?', (project_id,)).fetchone()
+            if row is None:
+                return None, ('Projet inconnu', 404)
+            if version is not None and version != row[0]:
+                return None, (f'Projet modifié entre-temps (version {row[0]}), rechargez-le', 409)
+            with db:
+                self._apply(db, project_id, changes)
+                self._collect(db)
+        return self.summary(project_id), None
+
+    def delete(self, project_id=None):
+        """Supprime un projet, ou tous si project_id vaut None ; retourne le nombre supprimé"""
+        with self._lock:
+            db = self._conn()
+            with db:
+                if project_id is None:
+                    count = db.execute('DELETE FROM projects').rowcount
+                    for table in ('sections', 'images', 'refs'):
+                        db.execute(f'DELETE FROM {table}')
                 else:
-                    # Fallback sans bs4: texte brut
-                    story.append(Paragraph(re.sub('<[^<]+?>', '', html_input), normal_style))
-                story.append(Spacer(1, 12))
-            elif block == 'images' and images:
-                # Ajouter les images au PDF avec titres comme des vrais titres H2
-                print(f"🖼️ Section Images: {len(images)} image(s) détectée(s)")
-                for i, img_data in enumerate(images):
-                    print(f"  Image {i+1}: {list(img_data.keys())}")
-                    # Debug détaillé des champs
-                    for key in ['title', 'caption', 'name', 'filename']:
-                        if key in img_data:
-                            print(f"    {key}: '{img_data[key]}'")
-                    try:
-                        # Support des deux formats possibles
-                        img_base64 = img_data.get('data', '') or img_data.get('dataUrl', '')
-                        # Priorité au titre personnalisé de l'IHM, puis caption, puis nom de fichier
-                        img_name = img_data.get('title', '') or img_data.get('caption', '') or img_data.get('name', 'Image')
-                        
-                        print(f"    - Base64: {'OUI' if img_base64 else 'NON'} ({len(img_base64) if img_base64 else 0} chars)")
-                        print(f"    - Titre final choisi: '{img_name}'")
-                        
-                        if img_base64 and img_base64.startswith('data:image/'):
-                            # TITRE DE L'IMAGE EN GROS AU-DESSUS (H2)
-                            image_title_style = ParagraphStyle(
-                                'ImageTitle',
-                                parent=h2_style,  # Style H2 pour un gros titre
-                                alignment=TA_LEFT,
-                                spaceBefore=20,
-                                spaceAfter=12,
-                                fontSize=16,
-                                fontName='Helvetica-Bold',
-                                textColor=primary
-                            )
-                            title_paragraph = Paragraph(img_name, image_title_style)
-                            
-                            # Extraire les données base64
-                            img_bytes = base64.b64decode(img_base64.split(',')[1])
-                            img_buffer = io.BytesIO(img_bytes)
-                            
-                            # Calculer la largeur disponible
-                            page_width = A4[0]
-                            left_margin = pdf_config.get('theme', {}).get('margins', {}).get('left', 18) * mm
-                            right_margin = pdf_config.get('theme', {}).get('margins', {}).get('right', 18) * mm
-                            available_width = page_width - left_margin - right_margin
-                            
-                            # Créer l'image avec gestion intelligente de la taille
-                            try:
-                                from reportlab.lib.utils import ImageReader
-                                reader = ImageReader(img_buffer)
-                                iw, ih = reader.getSize()
-                                if iw and ih:
-                                    # Calculer la hauteur pour préserver le ratio
-                                    target_width = float(available_width)
-                                    target_height = target_width * (ih / float(iw))
-                                    
-                                    # LOGIQUE ANTI-GROS-BLANC:
-                                    # Estimer l'espace disponible sur la page (approximatif)
-                                    # Page A4 = 297mm, marges = ~36mm, titre = ~20mm
-                                    available_page_height = 240*mm  # Espace réaliste disponible
-                                    title_height = 30*mm  # Hauteur approximative du titre + espaces
-                                    max_image_height = available_page_height - title_height
-                                    
-                                    # Si l'image est trop haute, la réduire pour éviter le saut de page
-                                    if target_height > max_image_height:
-                                        print(f"⚠️ Image trop haute ({target_height/mm:.0f}mm), réduction pour éviter saut de page")
-                                        target_height = max_image_height
-                                        target_width = target_height * (iw / float(ih))
-                                        print(f"✅ Image réduite à {target_height/mm:.0f}mm de hauteur")
-                                    
-                                    # Limiter aussi à 120mm pour éviter les images géantes
-                                    if target_height > 120*mm:
-                                        target_height = 120*mm
-                                        target_width = target_height * (iw / float(ih))
-                                    
-                                    img_buffer.seek(0)
-                                    img = RLImage(img_buffer, width=target_width, height=target_height)
-                                else:
-                                    img_buffer.seek(0)
-                                    img = RLImage(img_buffer, width=available_width)
-                            except Exception:
-                                img_buffer.seek(0)
-                                img = RLImage(img_buffer, width=available_width)
-                            
-                            img.hAlign = 'LEFT'
-                            
-                            # GARDER TITRE + IMAGE ENSEMBLE sur la même page
-                            image_block = KeepTogether([
-                                title_paragraph,
-                                img,
-                                Spacer(1, 20)  # Espace après l'image
-                            ])
-                            story.append(image_block)
-                            print(f"✅ Image ajoutée avec GROS titre (KeepTogether): {img_name}")
-                    except Exception as e:
-                        print(f"❌ Erreur ajout image {img_data.get('name', 'inconnue')}: {e}")
-                        # Ajouter quand même le titre même si l'image échoue
-                        img_name = img_data.get('title', '') or img_data.get('caption', '') or img_data.get('name', 'Image inconnue')
-                        image_title_style = ParagraphStyle(
-                            'ImageTitle', 
-                            parent=h2_style, 
-                            alignment=TA_LEFT, 
-                            spaceBefore=20, 
-                            spaceAfter=12,
-                            fontSize=16,
-                            fontName='Helvetica-Bold',
-                            textColor=primary
-                        )
-                        # Même en cas d'erreur, garder titre + message ensemble
-                        error_block = KeepTogether([
-                            Paragraph(img_name, image_title_style),
-                            Paragraph(f"[Image non disponible: {img_name}]", normal_style),
-                            Spacer(1, 20)
+                    count = db.execute('DELETE FROM projects WHERE id = ?', (project_id,)).rowcount
+                    for table in ('sections', 'images', 'refs'):
+                        db.execute(f'DELETE FROM {table} WHERE project_id = ?', (project_id,))
+                self._collect(db)
+        return count
+
+    def summary(self, project_id):
+        with self._lock:
+            row = self._conn().execute('SELECT id, name, created, updated, version, image_order FROM projects WHERE id = ?',
+                                       (project_id,)).fetchone()
+        return self._summary(row) if row else None
+
+    def _apply(self, db, project_id, changes):
+        for key, value in changes.items():
+            if key not in PROJECT_META_KEYS:
+                self._write(db, project_id, f'section:{key}', value,
+                            'INSERT OR REPLACE INTO sections (project_id, name, value) VALUES (?, ?, ?)', key)
+        if 'name' in changes:
+            db.execute('UPDATE projects SET name = ? WHERE id = ?', (str(changes['name'] or ''), project_id))
+
+        order = json.loads(db.execute('SELECT image_order FROM projects WHERE id = ?', (project_id,)).fetchone()[0])
+        if isinstance(changes.get('images'), list):
+            # Liste complète : les images absentes sont supprimées
+            upserts = changes['images']
+            kept = {str(img.get('id')) for img in upserts}
+            deletes = [image_id for image_id in order if image_id not in kept]
+            new_order = [str(img.get('id')) for img in upserts]
+        else:
+            # Modifications ciblées : {'upsert': [...], 'delete': [ids], 'order': [ids]}
+            image_changes = changes.get('imageChanges') or {}
+            upserts = image_changes.get('upsert') or []
+            deletes = [str(image_id) for image_id in image_changes.get('delete') or []]
+            new_order = [str(image_id) for image_id in image_changes['order']] if 'order' in image_changes else None
+        for image_id in deletes:
+            db.execute('DELETE FROM images WHERE project_id = ? AND image_id = ?', (project_id, image_id))
+            db.execute('DELETE FROM refs WHERE project_id = ? AND owner = ?', (project_id, f'image:{image_id}'))
+        for img in upserts:
+            image_id = str(img.get('id'))
+            previous = db.execute('SELECT meta FROM images WHERE project_id = ? AND image_id = ?',
+                                  (project_id, image_id)).fetchone()
+            if previous and not any(key in img for key in ('data', 'dataUrl', 'asset')):
+                # Métadonnées seules (titre, légende) : l'image stockée est conservée
+                stored = json.loads(previous[0])
+                img = {**{k: stored[k] for k in ('data', 'dataUrl', 'asset') if k in stored}, **img}
+            self._write(db, project_id, f'image:{image_id}', img,
+                        'INSERT OR REPLACE INTO images (project_id, image_id, meta) VALUES (?, ?, ?)', image_id)
+        if new_order is None:
+            deleted = set(deletes)
+            new_order = [image_id for image_id in order if image_id not in deleted]
+            new_order += [str(img.get('id')) for img in upserts if str(img.get('id')) not in new_order]
+        db.execute('UPDATE projects SET image_order = ?, updated = ?, version = version + 1 WHERE id = ?',
+                   (json.dumps(new_order), datetime.now().isoformat(timespec='milliseconds'), project_id))
+
+    def _write(self, db, project_id, owner, value, sql, key):
+        shas = []
+        stored = self._extract(db, value, shas)
+        db.execute(sql, (project_id, key, json.dumps(stored, ensure_ascii=False)))
+        db.execute('DELETE FROM refs WHERE project_id = ? AND owner = ?', (project_id, owner))
+        db.executemany('INSERT OR IGNORE INTO refs (project_id, owner, sha) VALUES (?, ?, ?)',
+                       [(project_id, owner, sha) for sha in shas])
+
+    def _extract(self, db, value, shas):
+        """Copie de value où les data URLs volumineuses deviennent des références {'blob': sha}"""
+        if isinstance(value, str):
+            match = DATA_URL_RE.match(value) if len(value) >= BLOB_MIN_CHARS else None
+            if match is None:
+                return value
+            sha = self._store_blob(db, match.group(1), base64.b64decode(value[match.end():]))
+            shas.append(sha)
+            return {'blob': sha}
+        if blob_reference(value) is not None:
+            shas.append(value['blob'])  # Image déjà stockée, renvoyée telle quelle par le client
+            return value
+        if isinstance(value, dict):
+            return {k: self._extract(db, v, shas) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._extract(db, v, shas) for v in value]
+        return value
+
+    def _store_blob(self, db, mime, data):
+        sha = hashlib.sha256(data).hexdigest()
+        if db.execute('SELECT 1 FROM blobs WHERE sha = ?', (sha,)).fetchone() is None:
+            # PNG et JPEG sont déjà compressés : zlib n'est gardé que s'il fait gagner 10 %
+            packed = zlib.compress(data, 6)
+            codec = 'zlib' if len(packed) < len(data) * 0.9 else 'raw'
+            db.execute('INSERT INTO blobs (sha, mime, codec, size, data) VALUES (?, ?, ?, ?, ?)',
+                       (sha, mime, codec, len(data), packed if codec == 'zlib' else data))
+        return sha
+
+    def _collect(self, db):
+        # Images qui ne sont plus référencées par aucune section ni image
+        db.execute('DELETE FROM blobs WHERE sha NOT IN (SELECT sha FROM refs)')
+
+    def snapshot(self):
+        with self._lock:
+            db = self._conn()
+            projects = db.execute('SELECT COUNT(*) FROM projects').fetchone()[0]
+            blobs, size, stored = db.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(LENGTH(data)), 0) FROM blobs').fetchone()
+        return {'projects': projects, 'blobs': blobs, 'blob_bytes': size, 'stored_bytes': stored}
+
+project_store = ProjectStore(PROJECT_STORE_PATH)
+
+# Cache des images décodées (logo, images du projet), adressé par le hash de la data URL
+PDF_IMAGE_CACHE_MB = float(os.getenv('PDF_IMAGE_CACHE_MB', 64))
+# Rééchantillonnage des images à leur taille affichée dans le PDF (0 = images d'origine)
+PDF_IMAGE_DPI = int(os.getenv('PDF_IMAGE_DPI', 150))
+PDF_JPEG_QUALITY = int(os.getenv('PDF_JPEG_QUALITY', 85))
+DOWNSAMPLE_THRESHOLD = 1.25  # On ne rééchantillonne qu'au-delà de 125 % de la résolution cible
+PHOTO_MIN_COLORS = 4096  # Au-delà, l'image est traitée comme une photo (JPEG)
+
+class DecodedImage:
+    """Octets et dimensions d'une image, partagés en lecture seule entre exports"""
+    __slots__ = ('digest', 'data', 'width', 'height')
+
+    def __init__(self, digest, data, width, height):
+        self.digest = digest
+        self.data = data
+        self.width = width
+        self.height = height
+
+def is_photo(img, source_format):
+    """Photo (JPEG) ou diagramme/capture à aplats (PNG sans perte) ?"""
+    if source_format == 'JPEG':
+        return True
+    if img.mode in ('RGBA', 'LA', 'PA') and img.getchannel('A').getextrema()[0] < 255:
+        return False  # Transparence : le JPEG ne la conserverait pas
+    return img.convert('RGB').getcolors(PHOTO_MIN_COLORS) is None
+
+def resample_image(entry, key, max_width, max_height):
+    """Image réduite à au plus max_width x max_height pixels, en JPEG pour les photos et PNG sinon"""
+    with PILImage.open(io.BytesIO(entry.data)) as img:
+        source_format = img.format
+        if img.mode == 'P':
+            img = img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+        photo = is_photo(img, source_format)
+
+        scale = min(max_width / entry.width, max_height / entry.height)
+        resize = scale * DOWNSAMPLE_THRESHOLD < 1
+        if not resize and (source_format == 'JPEG' or not photo):
+            return DecodedImage(key, entry.data, entry.width, entry.height)
+
+        if resize:
+            size = (max(1, round(entry.width * scale)), max(1, round(entry.height * scale)))
+            img = img.resize(size, PILImage.LANCZOS)
+        output = io.BytesIO()
+        if photo:
+            img.convert('RGB').save(output, 'JPEG', quality=PDF_JPEG_QUALITY)
+        else:
+            img.save(output, 'PNG')
+        if not resize and output.tell() >= len(entry.data):
+            return DecodedImage(key, entry.data, entry.width, entry.height)
+        return DecodedImage(key, output.getvalue(), img.width, img.height)
+
+class ImageCache:
+    """LRU des images décodées et de leurs versions préparées, borné par le volume d'octets conservés"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # clé -> DecodedImage
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0,
+                      'prepared': 0, 'bytes_before': 0, 'bytes_after': 0, 'prepare_ms': 0.0}
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+            else:
+                self.stats['misses'] += 1
+            return entry
+
+    def _store(self, entry):
+        if len(entry.data) > self.max_bytes:
+            return
+        with self._lock:
+            if entry.digest not in self._entries:
+                self._entries[entry.digest] = entry
+                self._bytes += len(entry.data)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.data)
+                self.stats['evictions'] += 1
+
+    def get(self, data_url):
+        """Image décodée de la data URL (lève une exception si elle est illisible)"""
+        digest = hashlib.sha256(data_url.encode('utf-8')).hexdigest()
+        return self._load(digest, lambda: base64.b64decode(data_url.split(',', 1)[1]))
+
+    def get_asset(self, digest, store):
+        """Image du magasin d'assets (FileNotFoundError si elle n'y est plus)"""
+        return self._load(f'asset:{digest}', lambda: store.read(digest))
+
+    def get_blob(self, sha, store):
+        """Image d'un projet stocké côté serveur"""
+        return self._load(f'blob:{sha}', lambda: store.read_blob(sha))
+
+    def _load(self, key, read):
+        entry = self._lookup(key)
+        if entry is None:
+            with pdf_stage('image_decode'):
+                data = read()
+                width, height = ImageReader(io.BytesIO(data)).getSize()
+            entry = DecodedImage(key, data, width, height)
+            self._store(entry)
+        return entry
+
+    def prepared(self, entry, max_width, max_height):
+        """Version de l'image adaptée à sa taille affichée (en pixels), calculée une fois"""
+        key = f'{entry.digest}@{max_width}x{max_height}'
+        prepared = self._lookup(key)
+        if prepared is None:
+            start = time.perf_counter()
+            with pdf_stage('image_decode'):
+                prepared = resample_image(entry, key, max_width, max_height)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self._store(prepared)
+            with self._lock:
+                self.stats['prepared'] += 1
+                self.stats['bytes_before'] += len(entry.data)
+                self.stats['bytes_after'] += len(prepared.data)
+                self.stats['prepare_ms'] += elapsed_ms
+        return prepared
+
+    def snapshot(self):
+        with self._lock:
+            data = {**self.stats, 'entries': len(self._entries), 'bytes': self._bytes, 'max_bytes': self.max_bytes}
+        data['prepare_ms'] = round(data['prepare_ms'], 1)
+        return data
+
+image_cache = ImageCache(int(PDF_IMAGE_CACHE_MB * 1024 * 1024))
+
+class PdfImageSet:
+    """Images d'un export : un seul lecteur par contenu, donc un seul décodage et un seul XObject"""
+
+    def __init__(self, cache, assets, projects, dpi=PDF_IMAGE_DPI):
+        self.cache = cache
+        self.assets = assets
+        self.projects = projects
+        self.dpi = dpi
+        self._readers = {}
+        self.metrics = {'images': 0, 'bytes_before': 0, 'bytes_after': 0, 'ms': 0.0}
+
+    def load(self, source):
+        """Image d'une data URL ou d'une référence {'asset': ...} / {'blob': ...}"""
+        digest = asset_reference(source)
+        if digest is not None:
+            return self.cache.get_asset(digest, self.assets)
+        sha = blob_reference(source)
+        if sha is not None:
+            return self.cache.get_blob(sha, self.projects)
+        return self.cache.get(source)
+
+    def flowable(self, entry, width=None, height=None, kind='direct'):
+        """Image platypus pour une image chargée, rééchantillonnée pour sa taille affichée"""
+        if kind == 'proportional':
+            factor = min(width / entry.width, height / entry.height)
+            draw_size = (entry.width * factor, entry.height * factor)
+        else:
+            draw_size = (width, height)
+
+        source = entry
+        if self.dpi > 0 and all(draw_size):
+            start = time.perf_counter()
+            source = self.cache.prepared(
+                entry,
+                max(1, round(draw_size[0] / 72.0 * self.dpi)),
+                max(1, round(draw_size[1] / 72.0 * self.dpi))
+            )
+            self.metrics['images'] += 1
+            self.metrics['bytes_before'] += len(entry.data)
+            self.metrics['bytes_after'] += len(source.data)
+            self.metrics['ms'] += (time.perf_counter() - start) * 1000
+            width, height, kind = draw_size[0], draw_size[1], 'direct'
+
+        reader = self._readers.get(source.digest)
+        if reader is None:
+            reader = self._readers[source.digest] = ImageReader(io.BytesIO(source.data))
+        return SharedReaderImage(reader, width=width, height=height, kind=kind)
+
+class SharedReaderImage(RLImage):
+    """Image platypus dessinée à partir d'un ImageReader existant"""
+
+    def __init__(self, reader, width=None, height=None, kind='direct'):
+        self._img = reader
+        super().__init__(reader.fp, width=width, height=height, kind=kind)
+
+# Diagramme vectoriel : SVG rendu par Mermaid converti en Drawing ReportLab (svglib), mis en cache
+DIAGRAM_CACHE_SIZE = int(os.getenv('DIAGRAM_CACHE_SIZE', 16))
+DIAGRAM_MAX_HEIGHT = 200 * mm  # Hauteur de cadre laissant la place au titre sur une page A4
+
+def diagram_svg_text(value):
+    """Texte SVG d'un diagramme : SVG brut, data URL image/svg+xml ou image d'un projet stocké"""
+    sha = blob_reference(value)
+    if sha is not None:
+        return project_store.read_blob(sha).decode('utf-8')
+    if not isinstance(value, str):
+        return ''
+    if value.startswith('data:image/svg+xml'):
+        header, _, payload = value.partition(',')
+        if header.endswith(';base64'):
+            return base64.b64decode(payload).decode('utf-8')
+        return urllib.parse.unquote(payload)
+    return value
+
+class DiagramCache:
+    """LRU des Drawings produits par svg2rlg, adressés par le SHA-256 du SVG.
+
+    Un SVG que svglib ne sait pas rendre est mémorisé comme tel (None) pour ne pas retenter
+    la conversion à chaque export ; le diagramme passe alors par son PNG de repli.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # SHA-256 -> Drawing ou None
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'unsupported': 0, 'evictions': 0, 'convert_ms': 0.0}
+
+    def get(self, svg_text):
+        """Drawing du SVG à sa taille d'origine (partagé : ne pas le modifier), ou None"""
+        key = hashlib.sha256(svg_text.encode('utf-8')).hexdigest()
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return self._entries[key]
+            self.stats['misses'] += 1
+        start = time.perf_counter()
+        drawing = self._convert(svg_text)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.stats['convert_ms'] += elapsed_ms
+            if drawing is None:
+                self.stats['unsupported'] += 1
+            if self.max_entries > 0:
+                self._entries[key] = drawing
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.stats['evictions'] += 1
+        return drawing
+
+    def _convert(self, svg_text):
+        # Libellés HTML (foreignObject) ignorés par svglib : le diagramme perdrait son texte
+        if not SVG_SUPPORT or '<foreignObject' in svg_text:
+            return None
+        try:
+            # Flux en mémoire : svglib refuse alors toute référence vers un fichier externe
+            with pdf_stage('svg_convert'):
+                drawing = svg2rlg(io.BytesIO(svg_text.encode('utf-8')))
+        except Exception as e:
+            pdf_log.warning("⚠️ Conversion SVG impossible: %s", e)
+            return None
+        if drawing is None or not drawing.width or not drawing.height:
+            return None
+        return drawing
+
+    def snapshot(self):
+        with self._lock:
+            data = {**self.stats, 'entries': len(self._entries), 'max_entries': self.max_entries}
+        data['convert_ms'] = round(data['convert_ms'], 1)
+        return data
+
+diagram_cache = DiagramCache(DIAGRAM_CACHE_SIZE)
+
+def scaled_drawing(drawing, max_width, max_height):
+    """Drawing ajusté au cadre (ratio conservé) ; le Drawing en cache est partagé, pas modifié"""
+    scale = min(max_width / drawing.width, max_height / drawing.height)
+    group = Group(*drawing.contents)
+    group.scale(scale, scale)
+    scaled = Drawing(drawing.width * scale, drawing.height * scale)
+    scaled.add(group)
+    return scaled
+
+
+def render_pdf(project, output, progress=None):
+    """Construit le PDF du projet dans le fichier binaire output ; retourne le nom de fichier.
+
+    Fonction autonome (ni requête ni contexte Flask) : exécutée dans un worker du pool de rendu.
+    progress(étape, **infos), si fourni, est appelé une fois le story assemblé puis à chaque page.
+    """
+    assembly_start = time.perf_counter()
+    
+    # Extraire les données du projet
+    diagram = project.get('diagram', {})
+    report_data = project.get('report', {})
+    images = project.get('images', [])
+    pdf_config = project.get('pdfConfig', {})
+    
+    # Styles et mise en page du thème (partagés entre exports)
+    theme = pdf_theme_for(pdf_config)
+    available_width = theme.available_width
+    pdf_images = PdfImageSet(image_cache, asset_store, project_store)
+    
+    # Fonction de pied de page
+    def footer_canvas(canvas, doc):
+        """Ajoute un footer sur chaque page avec mentions légales"""
+        canvas.saveState()
+    
+        # Mentions légales personnalisées ou par défaut
+        footer_text = pdf_config.get('legal', 'ENOVACOM - Tous droits réservés')
+    
+        # Style du footer
+        canvas.setFont('Helvetica', 8)
+        canvas.setFillColor(colors.HexColor('#666666'))  # Gris discret
+    
+        # Position du footer (bas de page avec marge)
+        page_width = A4[0]
+        footer_y = 15*mm  # 15mm du bas de la page
+    
+        # Centrer le footer
+        text_width = canvas.stringWidth(footer_text, 'Helvetica', 8)
+        canvas.drawString((page_width - text_width) / 2, footer_y, footer_text)
+    
+        # Optionnel: Ajouter numéro de page
+        if pdf_config.get('page_numbers', True):  # Par défaut activé
+            page_num = f"Page {doc.page}"
+            canvas.setFont('Helvetica', 8)
+            canvas.setFillColor(colors.HexColor('#999999'))  # Plus clair pour le numéro
+            # Numéro de page en bas à droite
+            canvas.drawRightString(page_width - theme.right_margin, footer_y, page_num)
+    
+        canvas.restoreState()
+    
+    # Créer le document PDF avec pied de page
+    doc = SimpleDocTemplate(
+        output,
+        pagesize=A4,
+        rightMargin=theme.right_margin,
+        leftMargin=theme.left_margin,
+        topMargin=theme.top_margin,
+        bottomMargin=theme.bottom_margin,
+        onFirstPage=footer_canvas,
+        onLaterPages=footer_canvas
+    )
+    
+    # Styles
+    title_style = theme.title
+    heading_style = theme.heading
+    normal_style = theme.normal
+    pre_style = theme.pre
+    
+    # Contenu du PDF
+    story = []
+    
+    # Logo en en-tête (si présent)
+    if pdf_config.get('logo'):
+        try:
+            logo_data = pdf_config.get('logo')
+            if is_image_source(logo_data):
+                # Ajouter le logo au PDF (TOUTE la largeur disponible)
+                logo_img = pdf_images.flowable(pdf_images.load(logo_data), width=available_width, height=60*mm, kind='proportional')
+                story.append(logo_img)
+                story.append(Spacer(1, 20))
+        except Exception as e:
+            pdf_log.warning("⚠️ Erreur ajout logo: %s", e)
+    
+    # En-tête
+    story.append(Paragraph(pdf_config.get('title', 'Document'), title_style))
+    if pdf_config.get('client'):
+        story.append(Paragraph(f"Client: {pdf_config.get('client')}", normal_style))
+    if pdf_config.get('subtitle'):
+        story.append(Paragraph(f"{pdf_config.get('subtitle')}", normal_style))
+    story.append(Spacer(1, 12))
+    
+    # Ordre des blocs
+    order = pdf_config.get('order', ['diagram', 'report', 'images'])
+    
+    for block in order:
+        if block == 'diagram':
+            if diagram.get('include', True) and (diagram.get('svg') or diagram.get('png')):
+                diagram_flowable = None
+                try:
+                    # SVG en vectoriel ; PNG de repli si svglib ne sait pas le rendre
+                    drawing = diagram_cache.get(diagram_svg_text(diagram['svg'])) if diagram.get('svg') else None
+                    if drawing is not None:
+                        diagram_flowable = scaled_drawing(drawing, available_width, DIAGRAM_MAX_HEIGHT)
+                        pdf_log.debug("📊 Diagramme vectoriel (svglib)")
+                    elif is_image_source(diagram.get('png')):
+                        diagram_flowable = pdf_images.flowable(pdf_images.load(diagram['png']), width=available_width,
+                                                               height=DIAGRAM_MAX_HEIGHT, kind='proportional')
+                        pdf_log.debug("📊 Diagramme en PNG (SVG non convertible)")
+                    else:
+                        pdf_log.warning("⚠️ Diagramme ignoré : SVG non convertible et aucun PNG de repli")
+                except Exception as e:
+                    pdf_log.warning("❌ Erreur ajout diagramme: %s", e)
+                if diagram_flowable is not None:
+                    diagram_flowable.hAlign = 'LEFT'
+                    story.append(KeepTogether([
+                        Paragraph(diagram.get('title') or 'Diagramme', theme.image_title),
+                        diagram_flowable,
+                        Spacer(1, 20)
+                    ]))
+    
+        elif block == 'report' and report_data.get('generated'):
+            # Rendu propre du HTML de l'éditeur dans le PDF (recette mise en cache par HTML)
+            recipe = report_recipes.get(report_data.get('generated', ''))
+            story.extend(report_flowables(recipe, theme))
+            story.append(Spacer(1, 12))
+        elif block == 'images' and images:
+            # Ajouter les images au PDF avec titres comme des vrais titres H2
+            # Détail par image : tiré une fois pour tout l'export
+            trace = log_sampled(pdf_log)
+            if trace:
+                pdf_log.debug("🖼️ Section Images: %d image(s) détectée(s)", len(images), extra=SAMPLED)
+            for i, img_data in enumerate(images):
+                if trace:
+                    pdf_log.debug("  Image %d: %s", i + 1, {key: img_data[key] for key in ('title', 'caption', 'name', 'filename')
+                                                          if key in img_data}, extra=SAMPLED)
+                try:
+                    # Data URL (data ou dataUrl) ou référence d'asset envoyé par /api/assets
+                    img_base64 = image_source(img_data)
+                    # Priorité au titre personnalisé de l'IHM, puis caption, puis nom de fichier
+                    img_name = img_data.get('title', '') or img_data.get('caption', '') or img_data.get('name', 'Image')
+    
+                    if trace:
+                        reference = asset_reference(img_base64) or blob_reference(img_base64)
+                        source = f"référence {reference[:12]}" if reference else f"{len(img_base64 or '')} chars"
+                        pdf_log.debug("    - Source: %s, titre: %r", source, img_name, extra=SAMPLED)
+    
+                    if is_image_source(img_base64):
+                        # TITRE DE L'IMAGE EN GROS AU-DESSUS (H2)
+                        image_title_style = theme.image_title
+                        title_paragraph = Paragraph(img_name, image_title_style)
+    
+                        # Image décodée (cache) et dimensions d'origine
+                        decoded = pdf_images.load(img_base64)
+                        iw, ih = decoded.width, decoded.height
+    
+                        # Créer l'image avec gestion intelligente de la taille
+                        if iw and ih:
+                            # Calculer la hauteur pour préserver le ratio
+                            target_width = float(available_width)
+                            target_height = target_width * (ih / float(iw))
+    
+                            # LOGIQUE ANTI-GROS-BLANC:
+                            # Estimer l'espace disponible sur la page (approximatif)
+                            # Page A4 = 297mm, marges = ~36mm, titre = ~20mm
+                            available_page_height = 240*mm  # Espace réaliste disponible
+                            title_height = 30*mm  # Hauteur approximative du titre + espaces
+                            max_image_height = available_page_height - title_height
+    
+                            # Si l'image est trop haute, la réduire pour éviter le saut de page
+                            if target_height > max_image_height:
+                                if trace:
+                                    pdf_log.debug("Image trop haute (%.0fmm), réduite à %.0fmm", target_height / mm,
+                                                  max_image_height / mm, extra=SAMPLED)
+                                target_height = max_image_height
+                                target_width = target_height * (iw / float(ih))
+    
+                            # Limiter aussi à 120mm pour éviter les images géantes
+                            if target_height > 120*mm:
+                                target_height = 120*mm
+                                target_width = target_height * (iw / float(ih))
+    
+                            img = pdf_images.flowable(decoded, width=target_width, height=target_height)
+                        else:
+                            img = pdf_images.flowable(decoded, width=available_width)
+    
+                        img.hAlign = 'LEFT'
+    
+                        # GARDER TITRE + IMAGE ENSEMBLE sur la même page
+                        image_block = KeepTogether([
+                            title_paragraph,
+                            img,
+                            Spacer(1, 20)  # Espace après l'image
                         ])
-                        story.append(error_block)
-        
-        # Les mentions légales sont maintenant gérées par footer_canvas (pied de page sur chaque page)
-        # Plus besoin de les ajouter ici dans le story
+                        story.append(image_block)
+                except Exception as e:
+                    pdf_log.warning("❌ Erreur ajout image %s: %s", img_data.get('name', 'inconnue'), e)
+                    # Ajouter quand même le titre même si l'image échoue
+                    img_name = img_data.get('title', '') or img_data.get('caption', '') or img_data.get('name', 'Image inconnue')
+                    image_title_style = theme.image_title
+                    # Même en cas d'erreur, garder titre + message ensemble
+                    error_block = KeepTogether([
+                        Paragraph(img_name, image_title_style),
+                        Paragraph(f"[Image non disponible: {img_name}]", normal_style),
+                        Spacer(1, 20)
+                    ])
+                    story.append(error_block)
+    
+    # Les mentions légales sont maintenant gérées par footer_canvas (pied de page sur chaque page)
+    # Plus besoin de les ajouter ici dans le story
+    
+    # Watermark (si activé)
+    if pdf_config.get('watermark', False):
+        story.append(Spacer(1, 12))
+        watermark_style = theme.watermark
+        story.append(Paragraph('⚠️ CONFIDENTIEL', watermark_style))
+    
+    # Progression : story assemblé, puis chaque page mise en page
+    if progress:
+        total = len(story)
+        laid_out = [0]
+        progress('story', flowables=total)
         
-        # Watermark (si activé)
-        if pdf_config.get('watermark', False):
-            story.append(Spacer(1, 12))
-            watermark_style = ParagraphStyle(
-                'Watermark',
-                parent=normal_style,
-                fontSize=10,
-                textColor=colors.HexColor('#DC2626'),
-                alignment=TA_CENTER,
-                fontName='Helvetica-Bold'
-            )
-            story.append(Paragraph('⚠️ CONFIDENTIEL', watermark_style))
+        def on_build_progress(kind, value):
+            if kind == 'PROGRESS':
+                laid_out[0] = value
+            elif kind == 'PAGE':
+                progress('layout', page=value, flowables=laid_out[0], total=total)
         
-        # Construire le PDF avec pied de page sur chaque page
+        doc.setProgressCallBack(on_build_progress)
+    
+    # Assemblage du story, hors étapes déjà chronométrées (nettoyage, parsing, images, SVG)
+    stats = getattr(_pdf_stats, 'current', None)
+    if stats is not None:
+        stats['stages']['story'] = time.perf_counter() - assembly_start - sum(stats['stages'].values())
+    
+    # Construire le PDF avec pied de page sur chaque page
+    with pdf_stage('build'):
         doc.build(story, onFirstPage=footer_canvas, onLaterPages=footer_canvas)
+    if stats is not None:
+        stats['pages'] = doc.page
+    
+    if pdf_images.metrics['images']:
+        m = pdf_images.metrics
+        pdf_log.debug("🖼️ Images préparées: %d (%.0f Ko -> %.0f Ko, %.0f ms)",
+                      m['images'], m['bytes_before'] / 1024, m['bytes_after'] / 1024, m['ms'])
+    
+    # Nom du fichier
+    filename = f"{pdf_config.get('title', 'document').replace(' ', '_')}.pdf"
+    
+    pdf_log.info("📄 PDF généré avec ReportLab: %s", filename, extra={'pages': doc.page})
+    return filename
+
+def render_pdf_with_stats(project, output, progress=None):
+    """render_pdf en relevant la durée de chaque étape et le nombre de pages ; retourne (nom de fichier, statistiques)"""
+    stats = {'stages': {}, 'pages': 0}
+    previous = getattr(_pdf_stats, 'current', None)
+    _pdf_stats.current = stats
+    try:
+        filename = render_pdf(project, output, progress)
+    finally:
+        _pdf_stats.current = previous
+    return filename, stats
+
+def render_pdf_to_file(project, path, progress=None):
+    """Rendu écrit sur disque ; retourne (nom de fichier, taille, statistiques de render_pdf_with_stats)"""
+    partial = f'{path}.part'
+    try:
+        with open(partial, 'wb') as f:
+            filename, stats = render_pdf_with_stats(project, f, progress)
+            size = f.tell()
+    except BaseException:
+        remove_file(partial)
+        raise
+    os.replace(partial, path)
+    return filename, size, stats
+
+# Exports synchrones : PDF écrit dans un fichier temporaire puis envoyé au client par blocs
+PDF_SPOOL_MAX_MB = float(os.getenv('PDF_SPOOL_MAX_MB', 8))
+PDF_SPOOL_DIR = os.getenv('PDF_SPOOL_DIR') or None  # None : répertoire temporaire du système
+
+def render_pdf_spooled(project):
+    """Rendu en mémoire jusqu'à PDF_SPOOL_MAX_MB, sur disque au-delà ; retourne (fichier relu depuis le début, nom, taille, statistiques)"""
+    spool = tempfile.SpooledTemporaryFile(max_size=int(PDF_SPOOL_MAX_MB * 1024 * 1024),
+                                          prefix='pathway-', suffix='.pdf', dir=PDF_SPOOL_DIR)
+    try:
+        filename, stats = render_pdf_with_stats(project, spool)
+        size = spool.tell()
+        spool.seek(0)
+    except BaseException:
+        spool.close()
+        raise
+    return spool, filename, size, stats
+
+def pdf_spool_path():
+    """Chemin d'un fichier de spool écrit par un worker du pool (supprimé après envoi)"""
+    directory = PDF_SPOOL_DIR or tempfile.gettempdir()
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(os.path.abspath(directory), f'pathway-{uuid.uuid4().hex}.pdf')
+
+class DeleteOnCloseFile(io.FileIO):
+    """Fichier de spool supprimé à sa fermeture, c'est-à-dire à la fin de l'envoi au client.
+
+    send_file active direct_passthrough : le serveur WSGI ferme le fichier lui-même et les
+    callbacks call_on_close de la réponse ne sont jamais appelés.
+    """
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            remove_file(self.name)
+
+# File de progression vers le processus web (renseignée dans les workers du pool)
+_pdf_progress_queue = None
+
+def warm_pdf_worker(progress_queue=None, workers=1):
+    """Initialisation d'un worker de rendu : part des budgets de cache, styles du thème par défaut et polices chargés.
+
+    Les budgets des caches de rendu sont des totaux pour le pool : chaque worker en reçoit
+    1/workers (arrondi au supérieur pour les nombres d'entrées, qui restent d'au moins 1).
+    """
+    global _pdf_progress_queue
+    _pdf_progress_queue = progress_queue
+    image_cache.max_bytes = int(PDF_IMAGE_CACHE_MB * 1024 * 1024) // workers
+    diagram_cache.max_entries = -(-DIAGRAM_CACHE_SIZE // workers)
+    report_recipes.max_entries = -(-REPORT_RECIPE_CACHE_SIZE // workers)
+    theme = pdf_theme_for({})
+    SimpleDocTemplate(io.BytesIO(), pagesize=A4).build([Paragraph('Pathway', theme.normal)])
+
+def pdf_cache_stats():
+    """Compteurs des caches de rendu de ce processus"""
+    return {'pid': os.getpid(), 'images': image_cache.snapshot(),
+            'diagrams': diagram_cache.snapshot(), 'reports': report_recipes.snapshot()}
+
+def render_pdf_to_file_in_worker(project, path, token):
+    """render_pdf_to_file côté worker : la progression remonte par la file partagée, les compteurs
+    des caches du worker avec le résultat (stats['caches'])"""
+    def progress(stage, **info):
+        _pdf_progress_queue.put((token, stage, info))
+    filename, size, stats = render_pdf_to_file(project, path, progress if _pdf_progress_queue is not None else None)
+    stats['caches'] = pdf_cache_stats()
+    return filename, size, stats
+
+# Rendu PDF dans un pool de processus : doc.build monopolise le GIL pendant de longues secondes
+PDF_WORKERS = int(os.getenv('PDF_WORKERS', min(4, os.cpu_count() or 1)))
+PDF_QUEUE = int(os.getenv('PDF_QUEUE', 8))
+PDF_RENDER_TIMEOUT = int(os.getenv('PDF_RENDER_TIMEOUT', 300))
+
+class PdfRenderPool:
+    """Pool de processus préchauffés exécutant render_pdf, avec file d'attente bornée"""
+
+    def __init__(self, workers, max_queue, timeout):
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._context = multiprocessing.get_context('spawn')
+        self._progress_queue = None
+        self._listeners = {}  # jeton -> callback de progression
+        self._worker_caches = {}  # pid -> derniers compteurs des caches du worker
+        self.stats = {'rendered': 0, 'failed': 0, 'rejected': 0, 'restarts': 0}
+
+    def _get_executor(self):
+        with self._lock:
+            if self._progress_queue is None:
+                self._progress_queue = self._context.SimpleQueue()
+                threading.Thread(target=self._dispatch_progress, name='pdf-progress', daemon=True).start()
+            if self._executor is None:
+                # spawn : pas de fork d'un processus qui a déjà des threads (verrous hérités)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=self._context,
+                    initializer=warm_pdf_worker,
+                    initargs=(self._progress_queue, self.workers)
+                )
+            return self._executor
+
+    def _dispatch_progress(self):
+        while True:
+            token, stage, info = self._progress_queue.get()
+            listener = self._listeners.get(token)
+            if listener:
+                listener(stage, **info)
+
+    def warm(self):
+        """Démarre tous les workers avant la première requête (import de ReportLab, lxml, styles)"""
+        executor = self._get_executor()
+        for future in [executor.submit(pdf_cache_stats) for _ in range(self.workers)]:
+            self._record_caches(future.result())
+        log.info("📄 Pool de rendu PDF prêt: %d processus", self.workers)
+
+    def _restart(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+                self._worker_caches.clear()
+                self.stats['restarts'] += 1
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def render_to_file(self, project, path, progress=None, wait=False):
+        """(nom de fichier, taille, statistiques) du PDF écrit dans path, ou None si la file est pleine.
+
+        wait=True (exports asynchrones, déjà acceptés) : attend une place jusqu'à `timeout` au lieu
+        de renoncer aussitôt.
+        """
+        token = uuid.uuid4().hex
+        if progress:
+            self._listeners[token] = progress
+        try:
+            # Rendu abandonné (timeout) : le fichier que le worker finira par écrire est supprimé
+            result = self._call(render_pdf_to_file_in_worker, project, path, token, wait=wait,
+                                on_abandon=lambda: remove_file(path))
+        finally:
+            self._listeners.pop(token, None)
+        if result is not None:
+            self._record_caches(result[2].pop('caches'))
+        return result
+
+    def _record_caches(self, caches):
+        with self._lock:
+            self._worker_caches[caches['pid']] = caches
+
+    def cache_snapshot(self):
+        """Caches de rendu additionnés sur les workers (d'après leur dernier rendu)"""
+        with self._lock:
+            workers = list(self._worker_caches.values())
+        totals = {}
+        for name in ('images', 'diagrams', 'reports'):
+            total = Counter()
+            for caches in workers:
+                total.update(caches[name])
+            totals[name] = {key: round(value, 1) if isinstance(value, float) else value for key, value in total.items()}
+        return totals
+
+    def _call(self, func, *args, wait=False, on_abandon=None):
+        acquired = self._slots.acquire(timeout=self.timeout) if wait else self._slots.acquire(blocking=False)
+        if not acquired:
+            with self._lock:
+                self.stats['rejected'] += 1
+            return None
+        executor = self._get_executor()
+        try:
+            future = executor.submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # La place est rendue à la fin réelle du rendu, même si la requête a abandonné l'attente
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            result = future.result(timeout=self.timeout)
+        except BrokenProcessPool:
+            # Worker tué (mémoire, signal) : le pool est recréé pour les exports suivants
+            self._restart(executor)
+            with self._lock:
+                self.stats['failed'] += 1
+            raise
+        except TimeoutError:
+            # Le worker poursuit le rendu que plus personne n'attend : on_abandon à sa fin réelle
+            if on_abandon:
+                future.add_done_callback(lambda _: on_abandon())
+            with self._lock:
+                self.stats['failed'] += 1
+            raise
+        except Exception:
+            with self._lock:
+                self.stats['failed'] += 1
+            raise
+        with self._lock:
+            self.stats['rendered'] += 1
+        return result
+
+    def shutdown(self):
+        """Arrête les workers après les rendus en cours (arrêt du serveur)"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def snapshot(self):
+        with self._lock:
+            return {**self.stats, 'workers': self.workers, 'caches': list(self._worker_caches.values())}
+
+pdf_pool = PdfRenderPool(PDF_WORKERS, PDF_QUEUE, PDF_RENDER_TIMEOUT) if PDF_WORKERS > 0 else None
+
+# Exports PDF asynchrones : fichiers sur disque, supprimés après TTL ou au-delà d'un volume total
+PDF_JOB_WORKERS = int(os.getenv('PDF_JOB_WORKERS', max(PDF_WORKERS, 1)))
+PDF_RESULT_TTL = int(os.getenv('PDF_RESULT_TTL', 3600))
+PDF_RESULT_MAX_MB = float(os.getenv('PDF_RESULT_MAX_MB', 500))
+PDF_RESULT_DIR = os.getenv('PDF_RESULT_DIR', os.path.join(DATA_DIR, 'pdf'))
+PDF_RESULT_SWEEP = int(os.getenv('PDF_RESULT_SWEEP', 60))
+
+class PdfResultStore:
+    """Répertoire des PDF générés en asynchrone, borné en âge et en taille totale"""
+
+    def __init__(self, directory, ttl, max_bytes, sweep_interval):
+        self.directory = os.path.abspath(directory)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self._last_sweep = float('-inf')
+        self._sweeper = None
+        self.stats = {'expired': 0, 'evicted': 0}
+
+    def path(self, job_id):
+        return os.path.join(self.directory, f'{job_id}.pdf')
+
+    def evict(self):
+        """Supprime les fichiers expirés, puis les plus anciens tant que le volume dépasse la limite"""
+        limit = time.time() - self.ttl
+        with self._lock:
+            self._last_sweep = time.monotonic()
+            os.makedirs(self.directory, exist_ok=True)
+            files = []
+            for entry in os.scandir(self.directory):
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if st.st_mtime < limit:
+                    self._remove(entry.path, 'expired')
+                elif entry.name.endswith('.pdf'):
+                    files.append((st.st_mtime, st.st_size, entry.path))
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                self._remove(path, 'evicted')
+                total -= size
+
+    def evict_due(self):
+        """evict() si la dernière purge date de plus de sweep_interval secondes (appelé à chaque consultation)"""
+        with self._lock:
+            due = time.monotonic() - self._last_sweep >= self.sweep_interval
+        if due:
+            self.evict()
+
+    def start_sweeper(self):
+        """Purge périodique en arrière-plan : les exports expirés disparaissent aussi d'un serveur inactif"""
+        def sweep():
+            while True:
+                time.sleep(self.sweep_interval)
+                try:
+                    self.evict()
+                except OSError as e:
+                    pdf_log.warning("⚠️ Purge des exports PDF échouée: %s", e)
+
+        with self._lock:
+            if self._sweeper is None and self.sweep_interval > 0:
+                self._sweeper = threading.Thread(target=sweep, name='pdf-results-sweep', daemon=True)
+                self._sweeper.start()
+
+    def _remove(self, path, reason):
+        try:
+            os.remove(path)
+            self.stats[reason] += 1
+        except FileNotFoundError:
+            pass
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats)
+
+pdf_results = PdfResultStore(PDF_RESULT_DIR, PDF_RESULT_TTL, int(PDF_RESULT_MAX_MB * 1024 * 1024), PDF_RESULT_SWEEP)
+pdf_jobs = JobManager(PDF_JOB_WORKERS, PDF_QUEUE, PDF_RESULT_TTL, name='pdf-job')
+
+def run_pdf_job(project, job_id, progress):
+    """Export PDF asynchrone : rendu écrit dans le répertoire des résultats"""
+    pdf_results.evict()
+    path = pdf_results.path(job_id)
+    try:
+        if pdf_pool:
+            # Job déjà accepté (202) : il attend une place du pool plutôt que d'échouer
+            result = pdf_pool.render_to_file(project, path, progress, wait=True)
+            if result is None:
+                PDF_EXPORTS.inc('async', 'rejected')
+                return {'error': 'Pool de rendu PDF saturé trop longtemps, réessayez dans quelques instants'}, 503
+        else:
+            result = render_pdf_to_file(project, path, progress)
+    except Exception as e:
+        PDF_EXPORTS.inc('async', 'error')
+        pdf_log.exception("❌ Erreur génération PDF (job %s): %s", job_id, e)
+        return {'error': f'Erreur lors de la génération du PDF: {str(e)}'}, 500
+    filename, size, stats = result
+    observe_pdf_export('async', size, stats)
+    progress('done', page=stats['pages'])
+    return {'filename': filename, 'size': size, 'pages': stats['pages'], 'download': f'/api/pdf/{job_id}'}, 200
+
+@app.route('/api/assets', methods=['POST'])
+def upload_assets():
+    """Envoi multipart d'images (un ou plusieurs fichiers) ; retourne leur SHA-256 pour {'asset': ...}"""
+    files = [f for _, f in request.files.items(multi=True) if f.filename or f.mimetype]
+    if not files:
+        return jsonify({'error': 'Aucun fichier (envoi multipart/form-data attendu)'}), 400
+    assets = []
+    for f in files:
+        asset, error = asset_store.save(f.stream)
+        if error:
+            message, status = error
+            return jsonify({'error': f'{f.filename or "fichier"}: {message}', 'assets': assets}), status
+        assets.append({**asset, 'name': f.filename})
+    return jsonify({'assets': assets}), 201
+
+@app.route('/api/assets/<digest>')
+def get_asset(digest):
+    """Image stockée (HEAD permet au client de vérifier sa présence avant de la renvoyer)"""
+    try:
+        f, mimetype = asset_store.open(digest)
+    except OSError:
+        # Inconnu, ou évincé entre-temps par un autre envoi
+        return jsonify({'error': 'Asset inconnu ou évincé'}), 404
+    # Contenu immuable : adressé par son hash
+    return send_file(f, mimetype=mimetype, max_age=31536000, etag=digest,
+                     last_modified=os.fstat(f.fileno()).st_mtime)
+
+@app.route('/api/projects', methods=['GET'])
+def list_projects():
+    """Résumés paginés des projets (?page=1&per_page=20)"""
+    try:
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', PROJECT_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'Paramètres de pagination invalides'}), 400
+    return jsonify(project_store.list(page, per_page))
+
+@app.route('/api/projects', methods=['POST'])
+def create_project():
+    """Enregistre un nouveau projet complet ; retourne son résumé (id, version).
+
+    ?keep_existing=1 : un projet de même identifiant déjà enregistré est conservé (200) au lieu
+    d'être recréé sous un nouvel identifiant (import rejouable des projets du navigateur).
+    """
+    project = request.get_json(cache=False)
+    if not isinstance(project, dict):
+        return jsonify({'error': 'Projet JSON attendu'}), 400
+    keep_existing = request.args.get('keep_existing', '').lower() in ('1', 'true')
+    summary, created = project_store.create(project, keep_existing)
+    return jsonify(summary), 201 if created else 200
+
+@app.route('/api/projects', methods=['DELETE'])
+def clear_projects():
+    return jsonify({'deleted': project_store.delete()})
+
+@app.route('/api/projects/<project_id>', methods=['GET'])
+def get_project(project_id):
+    project = project_store.load(project_id)
+    if project is None:
+        return jsonify({'error': 'Projet inconnu'}), 404
+    return jsonify(project)
+
+@app.route('/api/projects/<project_id>', methods=['PATCH'])
+def patch_project(project_id):
+    """Met à jour les seules sections envoyées ; images via "imageChanges" (upsert, delete, order)"""
+    changes = request.get_json(cache=False)
+    if not isinstance(changes, dict):
+        return jsonify({'error': 'Modifications JSON attendues'}), 400
+    summary, error = project_store.patch(project_id, changes, changes.get('version'))
+    if error:
+        message, status = error
+        return jsonify({'error': message}), status
+    return jsonify(summary)
+
+@app.route('/api/projects/<project_id>', methods=['DELETE'])
+def delete_project(project_id):
+    if not project_store.delete(project_id):
+        return jsonify({'error': 'Projet inconnu'}), 404
+    return jsonify({'deleted': 1})
+
+@app.route('/api/generate-pdf', methods=['POST'])
+def generate_pdf():
+    """Génère un PDF professionnel à partir du projet complet avec ReportLab"""
+    try:
+        # Corps de requête non mis en cache : libéré dès que le projet n'est plus utilisé
+        data = request.get_json(cache=False)
+        if data.get('project_id'):
+            # Projet stocké côté serveur : images lues dans le magasin au moment du rendu
+            project = project_store.load(str(data['project_id']), inline=False)
+            if project is None:
+                return jsonify({'error': 'Projet inconnu'}), 404
+        else:
+            project = data.get('project', {})
         
-        pdf_buffer.seek(0)
+        # Images référencées par hash : le client renvoie celles que le magasin n'a pas (ou plus)
+        missing = missing_assets(project)
+        if missing:
+            return jsonify({'error': 'Assets inconnus, renvoyez-les via /api/assets', 'missing_assets': missing}), 409
         
-        # Nom du fichier
-        filename = f"{pdf_config.get('title', 'document').replace(' ', '_')}.pdf"
+        # Mode asynchrone : identifiant du job tout de suite, fichier servi par /api/pdf/<id>
+        if data.get('async') or request.args.get('async', '').lower() in ('1', 'true'):
+            job = pdf_jobs.submit('pdf', run_pdf_job, project, track=True)
+            if job is None:
+                PDF_EXPORTS.inc('async', 'rejected')
+                return jsonify({'error': 'Trop d\'exports PDF en attente, réessayez dans quelques instants'}), 503
+            return jsonify({**job, 'poll': f"/api/pdf/{job['id']}"}), 202
         
-        print(f"📄 PDF généré avec ReportLab: {filename}")
+        if not pdf_pool:
+            spool, filename, size, stats = render_pdf_spooled(project)
+            observe_pdf_export('sync', size, stats)
+            # Le JSON (images en base64) n'est plus référencé pendant l'envoi du PDF
+            del data, project
+            response = send_file(spool, mimetype='application/pdf', as_attachment=True, download_name=filename)
+            response.content_length = size
+            return response
         
-        return send_file(
-            pdf_buffer,
-            mimetype='application/pdf',
-            as_attachment=True,
-            download_name=filename
-        )
+        # Le worker écrit le PDF sur disque : seul le chemin revient par le pipe du pool
+        path = pdf_spool_path()
+        try:
+            result = pdf_pool.render_to_file(project, path)
+        except BaseException:
+            remove_file(path)
+            raise
+        if result is None:
+            PDF_EXPORTS.inc('sync', 'rejected')
+            return jsonify({'error': 'Trop d\'exports PDF en cours, réessayez dans quelques instants'}), 503
+        del data, project
+        filename, size, stats = result
+        observe_pdf_export('sync', size, stats)
+        response = send_file(DeleteOnCloseFile(path), mimetype='application/pdf', as_attachment=True, download_name=filename)
+        response.content_length = size
+        return response
         
     except Exception as e:
-        print(f"❌ Erreur génération PDF: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        PDF_EXPORTS.inc('sync', 'error')
+        pdf_log.exception("❌ Erreur génération PDF: %s", e)
         return jsonify({'error': f'Erreur lors de la génération du PDF: {str(e)}'}), 500
 
+@app.route('/api/pdf/<job_id>')
+def get_pdf(job_id):
+    """Export asynchrone : état et progression (202) tant qu'il n'est pas prêt, puis le PDF ; ?wait=N long-poll"""
+    try:
+        wait = min(float(request.args.get('wait', 0)), LLM_JOB_MAX_WAIT)
+    except ValueError:
+        return jsonify({'error': 'Paramètre wait invalide'}), 400
+    pdf_results.evict_due()
+    job = pdf_jobs.get(job_id, wait=wait)
+    if job is None:
+        return jsonify({'error': 'Export inconnu ou expiré'}), 404
+    if job['status'] == 'failed':
+        return jsonify(job), job['http_status'] or 500
+    if job['status'] != 'done':
+        return jsonify(job), 202
+    
+    path = pdf_results.path(job_id)
+    if not os.path.exists(path):
+        return jsonify({'error': 'PDF expiré, relancez l\'export'}), 410
+    return send_file(
+        path,
+        mimetype='application/pdf',
+        as_attachment=True,
+        download_name=job['result']['filename']
+    )
+
 def update_env_file(updates):
     """Met à jour le fichier .env avec les nouvelles valeurs"""
     env_path = os.path.join(os.path.dirname(__file__), '.env')
@@ -1254,7 +4144,91 @@ def update_env_file(updates):
         for key, value in env_vars.items():
             f.write(f'{key}={value}\n')
     
-    print(f'✅ Fichier .env mis à jour : {list(updates.keys())}')
+    log.info('✅ Fichier .env mis à jour : %s', list(updates.keys()))
+
+def waitress_drained(server):
+    """Plus aucune requête en file, en cours de traitement ou de réponse sur les connexions waitress.
+
+    Seul endroit qui lit les internes de waitress (file du dispatcher, table des connexions) :
+    None s'ils ont changé de forme, l'arrêt attend alors SHUTDOWN_TIMEOUT en entier.
+    """
+    try:
+        dispatcher = server.task_dispatcher
+        if dispatcher.queue or dispatcher.active_count:
+            return False
+        channels = list(server._map.values())
+    except (AttributeError, TypeError):
+        return None
+    return not any(getattr(channel, 'requests', None) or getattr(channel, 'total_outbufs_len', 0)
+                   for channel in channels)
+
+def serve(host, port):
+    """Sert l'application avec waitress (mode production) jusqu'à SIGTERM/SIGINT.
+
+    Au premier signal, le serveur cesse d'accepter des connexions et laisse les requêtes en cours
+    (flux compris) se terminer pendant SHUTDOWN_TIMEOUT secondes au plus ; un second signal force l'arrêt.
+    """
+    import _thread
+    import signal
+    from waitress import create_server
+
+    options = {
+        'threads': WAITRESS_THREADS,
+        'connection_limit': WAITRESS_CONNECTION_LIMIT,
+        'backlog': WAITRESS_BACKLOG,
+        'channel_timeout': WAITRESS_CHANNEL_TIMEOUT,
+        'ident': 'Pathway',
+    }
+    if app.config['MAX_CONTENT_LENGTH']:
+        options['max_request_body_size'] = app.config['MAX_CONTENT_LENGTH']
+    # Avertissements de waitress (file d'attente, limite de connexions) dans le journal de l'application
+    waitress_log = logging.getLogger('waitress')
+    waitress_log.handlers[:] = log.handlers
+    waitress_log.propagate = False
+    server = create_server(app, host=host, port=port, **options)
+    stopping = threading.Event()
+
+    def stop_accepting():
+        # Exécuté dans la boucle de waitress : la socket d'écoute n'est plus surveillée puis fermée
+        server.accepting = False
+        server.del_channel()
+        server.socket.close()
+
+    def drain():
+        deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+        drained = waitress_drained(server)
+        if drained is None:
+            log.warning("État des requêtes waitress illisible : attente de %gs avant l'arrêt", SHUTDOWN_TIMEOUT)
+        while not drained and time.monotonic() < deadline:
+            time.sleep(0.1)
+            drained = waitress_drained(server)
+        if drained is False:
+            log.warning("Arrêt après %gs : requêtes en cours interrompues", SHUTDOWN_TIMEOUT)
+        _thread.interrupt_main()
+
+    def handle_signal(signum, frame):
+        if stopping.is_set():
+            raise KeyboardInterrupt  # second signal, ou vidange terminée
+        stopping.set()
+        log.info("Arrêt demandé (signal %d) : fin des requêtes en cours", signum)
+        server.trigger.pull_trigger(stop_accepting)
+        threading.Thread(target=drain, name='shutdown', daemon=True).start()
+
+    for name in ('SIGINT', 'SIGTERM', 'SIGBREAK'):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), handle_signal)
+
+    log.info("Pathway (production) sur http://%s:%s : %d threads, %d connexions max",
+             server.effective_host, server.effective_port, WAITRESS_THREADS, WAITRESS_CONNECTION_LIMIT)
+    server.run()
+
+    llm_jobs.shutdown()
+    pdf_jobs.shutdown()
+    for executor in batch_executors.values():
+        executor.shutdown(wait=False, cancel_futures=True)
+    if pdf_pool:
+        pdf_pool.shutdown()
+    log.info("Serveur arrêté")
 
 if __name__ == '__main__':
     import webbrowser
@@ -1265,13 +4239,22 @@ if __name__ == '__main__':
     debug = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
     url = f"http://{host}:{port}"
     
-    print(f" Mermaid Flask AI démarré sur {url}")
+    # Précharger les listes de modèles et démarrer les workers PDF pendant le démarrage
+    warm_model_cache()
+    if pdf_pool:
+        pdf_pool.warm()
+    pdf_results.start_sweeper()
     
-    # Ouvrir le navigateur automatiquement après 1.5 secondes
-    def open_browser():
-        import time
-        time.sleep(1.5)
-        webbrowser.open(url)
-    
-    threading.Thread(target=open_browser, daemon=True).start()
-    app.run(host=host, port=port, debug=debug)
\ No newline at end of file
+    if PRODUCTION:
+        serve(host, port)
+    else:
+        log.info("Mermaid Flask AI démarré sur %s", url)
+        
+        # Ouvrir le navigateur automatiquement après 1.5 secondes
+        def open_browser():
+            import time
+            time.sleep(1.5)
+            webbrowser.open(url)
+        
+        threading.Thread(target=open_browser, daemon=True).start()
+        app.run(host=host, port=port, debug=debug)
@@ -0,0 +1,86 @@
+"""Benchmark de la conversion SVG -> Drawing ReportLab (svglib) et de son cache.
+
+Génère des flowcharts proches de la sortie Mermaid (feuille de style CSS, nœuds rect + texte,
+arêtes en chemins) et mesure svg2rlg à froid, l'accès au cache, puis un export PDF complet
+du diagramme avec le cache vide et avec le cache chaud.
+
+Usage : python benchmarks/bench_diagram_cache.py [--repeat 3]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+import app  # noqa: E402
+
+NODE_COUNTS = [50, 200, 800]
+
+
+def flowchart(nodes):
+    """Flowchart vertical de nodes étapes, libellés en <text> comme avec htmlLabels: false"""
+    height = nodes * 60 + 20
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" id="mermaid-pdf" viewBox="0 0 260 {height}" width="260" height="{height}">',
+        '<style>#mermaid-pdf .node rect{fill:#ECF8F6;stroke:#0C4A45;stroke-width:1px}'
+        '#mermaid-pdf .edgePath path{stroke:#0C4A45;stroke-width:1.5px;fill:none}'
+        '#mermaid-pdf text{fill:#333;font-family:Helvetica;font-size:14px}</style>',
+    ]
+    for i in range(nodes):
+        y = i * 60 + 10
+        parts.append(f'<g class="node"><rect x="40" y="{y}" width="180" height="40" rx="5"/>'
+                     f'<text x="130" y="{y + 25}" text-anchor="middle">Étape {i} : interfaçage DPI</text></g>')
+        if i:
+            parts.append(f'<g class="edgePath"><path d="M130,{y - 20} L130,{y}"/></g>')
+    parts.append('</svg>')
+    return ''.join(parts)
+
+
+def timed(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def export(svg):
+    project = {'diagram': {'svg': svg}, 'pdfConfig': {'order': ['diagram']}}
+    app.render_pdf(project, io.BytesIO())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3, help='Répétitions par mesure (meilleur temps retenu)')
+    args = parser.parse_args()
+
+    print(f"{'Nœuds':>6} | {'SVG':>7} | {'svg2rlg (ms)':>12} | {'Cache (ms)':>10} | "
+          f"{'Export froid (ms)':>17} | {'Export chaud (ms)':>17}")
+    print('-' * 84)
+    for nodes in NODE_COUNTS:
+        svg = flowchart(nodes)
+
+        def cold_get():
+            app.DiagramCache(1).get(svg)
+
+        warm = app.DiagramCache(1)
+        warm.get(svg)
+
+        def cold_export():
+            app.diagram_cache = app.DiagramCache(app.DIAGRAM_CACHE_SIZE)
+            export(svg)
+
+        convert = timed(cold_get, args.repeat)
+        hit = timed(lambda: warm.get(svg), args.repeat)
+        cold = timed(cold_export, args.repeat)
+        hot = timed(lambda: export(svg), args.repeat)
+        print(f"{nodes:>6} | {len(svg) // 1024:>5}Ko | {convert * 1000:>12.1f} | {hit * 1000:>10.3f} | "
+              f"{cold * 1000:>17.1f} | {hot * 1000:>17.1f}")
+
+
+if __name__ == '__main__':
+    main()
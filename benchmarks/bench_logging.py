@@ -0,0 +1,93 @@
+"""Coût de la journalisation pendant les exports PDF, selon le niveau et l'échantillonnage.
+
+Chaque configuration est mesurée dans un processus neuf dont la sortie standard est un fichier
+(comme un collecteur de logs) : LOG_LEVEL=DEBUG reproduit l'ancien volume de print() (extraits du
+HTML, détail de chaque image), INFO est le défaut, et DEBUG échantillonné ne garde qu'une partie
+des exports détaillés. Le cache des recettes est désactivé pour que chaque export reconvertisse
+le compte rendu.
+
+Usage : python benchmarks/bench_logging.py [--exports 50] [--images 40] [--sections 20]
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CONFIGS = (
+    ('DEBUG', {'LOG_LEVEL': 'DEBUG'}),
+    ('DEBUG pdf=0.05', {'LOG_LEVEL': 'DEBUG', 'LOG_SAMPLE': 'pdf=0.05'}),
+    ('INFO', {'LOG_LEVEL': 'INFO'}),
+    ('WARNING', {'LOG_LEVEL': 'WARNING'}),
+)
+
+
+def project(images, sections):
+    """Compte rendu long (titres, listes imbriquées, tableaux) et petites images distinctes"""
+    from PIL import Image
+    blocks = []
+    for i in range(sections):
+        blocks.append(f'<h2>Section {i}</h2><p>Décision <em>validée</em> en comité ■.</p>'
+                      f'<ol><li>Point {i}<ul><li>Détail</li><li>Suite</li></ul></li><li>Autre point</li></ol>'
+                      '<table><tr><th>Action</th><th>Porteur</th></tr><tr><td>Recette</td><td>MOA</td></tr></table>')
+    data = []
+    for i in range(images):
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 48), (i * 5 % 256, 80, 160)).save(buffer, 'PNG')
+        data.append({'data': 'data:image/png;base64,' + base64.b64encode(buffer.getvalue()).decode(),
+                     'title': f'Capture {i}', 'name': f'capture-{i}.png'})
+    return {'report': {'generated': ''.join(blocks)}, 'images': data,
+            'pdfConfig': {'title': 'Benchmark', 'order': ['report', 'images']}}
+
+
+def run(exports, images, sections):
+    """Mesure dans le processus courant (configuré par l'environnement) ; imprime une ligne JSON sur stderr"""
+    import app
+    proj = project(images, sections)
+    app.render_pdf(proj, io.BytesIO())  # préchauffage
+    times = []
+    for _ in range(exports):
+        start = time.perf_counter()
+        app.render_pdf(proj, io.BytesIO())
+        times.append(time.perf_counter() - start)
+    sys.stdout.flush()
+    print(json.dumps({'median': statistics.median(times) * 1000, 'best': min(times) * 1000}), file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--exports', type=int, default=50, help='Exports mesurés par configuration')
+    parser.add_argument('--images', type=int, default=40, help='Images par projet')
+    parser.add_argument('--sections', type=int, default=20, help='Sections du compte rendu')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run(args.exports, args.images, args.sections)
+        return
+
+    print(f"{args.exports} exports, {args.sections} sections, {args.images} images")
+    print(f"{'Configuration':>16} | {'Médiane (ms)':>12} | {'Meilleur (ms)':>13} | {'Logs / export':>13}")
+    print('-' * 64)
+    for label, settings in CONFIGS:
+        env = dict(os.environ, PDF_WORKERS='0', REPORT_RECIPE_CACHE_SIZE='0', **settings)
+        with tempfile.TemporaryFile() as logs:
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child',
+                                     '--exports', str(args.exports), '--images', str(args.images),
+                                     '--sections', str(args.sections)],
+                                    env=env, cwd=ROOT, check=True, stdout=logs, stderr=subprocess.PIPE, text=True).stderr
+            size = logs.tell()
+        m = json.loads(output.strip().splitlines()[-1])
+        print(f"{label:>16} | {m['median']:>12.1f} | {m['best']:>13.1f} | {size / (args.exports + 1) / 1024:>10.1f} Ko")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Coût d'enregistrement des métriques : fragments par thread vs registre protégé par un verrou.
+
+Chaque thread enregistre N incréments de compteur et N observations d'histogramme (labels d'une
+route HTTP) ; le temps moyen par opération est rapporté pour 1 et plusieurs threads, puis le coût
+d'une requête Flask complète avec et sans le middleware de métriques.
+
+Usage : python benchmarks/bench_metrics.py [--ops 200000] [--threads 4]
+"""
+import argparse
+import bisect
+import contextlib
+import io
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import app  # noqa: E402
+
+
+class LockedRegistry:
+    """Référence : un seul dict partagé, chaque enregistrement sous le même verrou"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *labels):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + 1
+
+    def observe(self, value, *labels):
+        with self.lock:
+            counts = self.values.get(('h',) + labels)
+            if counts is None:
+                counts = self.values[('h',) + labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+
+def run(threads, ops, inc, observe):
+    def work():
+        for i in range(ops):
+            inc('/api/generate', 'POST', '200')
+            observe((i % 100) / 1000, '/api/generate', 'POST')
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return (time.perf_counter() - start) / (threads * ops * 2) * 1e9
+
+
+def request_cost(wsgi_app, requests):
+    client = app.app.test_client()
+    original = app.app.wsgi_app
+    app.app.wsgi_app = wsgi_app
+    try:
+        start = time.perf_counter()
+        for _ in range(requests):
+            client.get('/api/settings').close()
+        return (time.perf_counter() - start) / requests * 1e6
+    finally:
+        app.app.wsgi_app = original
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--ops', type=int, default=200000, help='Opérations par thread')
+    parser.add_argument('--threads', type=int, default=4, help='Threads concurrents')
+    parser.add_argument('--requests', type=int, default=3000, help='Requêtes Flask mesurées')
+    args = parser.parse_args()
+
+    registry = app.MetricsRegistry()
+    counter = registry.counter('bench_total', 'Bench', ('route', 'method', 'status'))
+    histogram = registry.histogram('bench_seconds', 'Bench', ('route', 'method'))
+    locked = LockedRegistry(app.LATENCY_BUCKETS)
+
+    print(f"{'Registre':>10} | {'Threads':>7} | {'ns / opération':>14}")
+    print('-' * 38)
+    for threads in (1, args.threads):
+        print(f"{'fragments':>10} | {threads:>7} | {run(threads, args.ops, counter.inc, histogram.observe):>14.0f}")
+        print(f"{'verrou':>10} | {threads:>7} | {run(threads, args.ops, locked.inc, locked.observe):>14.0f}")
+    start = time.perf_counter()
+    registry.render()
+    print(f"Rendu de /metrics : {(time.perf_counter() - start) * 1000:.2f} ms")
+
+    bare = app.app.wsgi_app.wsgi_app
+    request_cost(app.app.wsgi_app, 200)  # préchauffage
+    print(f"Requête /api/settings : {request_cost(bare, args.requests):.0f} µs sans middleware, "
+          f"{request_cost(app.app.wsgi_app, args.requests):.0f} µs avec")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Pic de mémoire (RSS) des exports PDF synchrones : PDF en mémoire vs fichier de spool.
+
+Reproduit l'ancien export (JSON de la requête en cache, PDF construit dans un io.BytesIO, copié par
+getvalue() puis renvoyé depuis un second BytesIO) et le compare à /api/generate-pdf, qui écrit le PDF
+dans un fichier temporaire (sur disque au-delà de PDF_SPOOL_MAX_MB) et l'envoie au client par blocs.
+Chaque mode est mesuré dans un processus neuf (PDF_WORKERS=0) : le pic de RSS après préchauffage
+sert de référence, et l'écart avec le pic atteint pendant les exports est rapporté.
+
+Usage : python benchmarks/bench_pdf_memory.py [--exports 3] [--images 10] [--image-mb 2]
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MODES = ('bytesio', 'spool')
+
+
+def project(images, image_mb):
+    """Projet synthétique : images PNG de bruit (incompressibles) et un compte rendu court"""
+    from PIL import Image
+    side = int((image_mb * 1024 * 1024 / 3) ** 0.5)
+    data_urls = []
+    for i in range(images):
+        buffer = io.BytesIO()
+        Image.effect_noise((side, side), 40 + i).convert('RGB').save(buffer, 'PNG')
+        data_urls.append({'data': 'data:image/png;base64,' + base64.b64encode(buffer.getvalue()).decode(),
+                          'title': f'Capture {i + 1}'})
+    report = ''.join(f'<h2>Section {i}</h2><p>Décision <em>validée</em> en comité.</p>' for i in range(50))
+    return {'report': {'generated': report}, 'images': data_urls,
+            'pdfConfig': {'title': 'Benchmark', 'order': ['report', 'images']}}
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Ko sous Linux
+
+
+def run(mode, exports, images, image_mb):
+    """Mesure dans le processus courant ; imprime une ligne JSON"""
+    stdout_fd = os.dup(1)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    import app
+    from flask import request, send_file
+
+    @app.app.route('/bench/bytesio-pdf', methods=['POST'])
+    def bytesio_pdf():
+        # Ancien chemin de generate_pdf
+        project = request.json.get('project', {})
+        pdf_buffer = io.BytesIO()
+        filename = app.render_pdf(project, pdf_buffer)
+        pdf_bytes = pdf_buffer.getvalue()
+        return send_file(io.BytesIO(pdf_bytes), mimetype='application/pdf', as_attachment=True, download_name=filename)
+
+    body = json.dumps({'project': project(images, image_mb)}).encode()
+    url = '/bench/bytesio-pdf' if mode == 'bytesio' else '/api/generate-pdf'
+
+    def export(results, i, payload=body):
+        # Réponse consommée par blocs, comme un client réel, sans la conserver
+        response = app.app.test_client().post(url, data=payload, content_type='application/json', buffered=False)
+        results[i] = sum(len(chunk) for chunk in response.response)
+        response.close()
+
+    # Préchauffage sur un petit projet : polices, styles, imports paresseux de ReportLab et de Pillow
+    export([None], 0, json.dumps({'project': project(1, 0.01)}).encode())
+    baseline = peak_rss_mb()
+
+    results = [None] * exports
+    threads = [threading.Thread(target=export, args=(results, i)) for i in range(exports)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    sys.stdout.flush()
+    os.dup2(stdout_fd, 1)
+    print(json.dumps({'baseline': baseline, 'peak': peak_rss_mb(), 'pdf': results[0], 'request': len(body)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--exports', type=int, default=3, help='Exports PDF simultanés')
+    parser.add_argument('--images', type=int, default=10, help='Images par projet')
+    parser.add_argument('--image-mb', type=float, default=2, help='Taille de chaque image PNG (Mo)')
+    parser.add_argument('--spool-mb', type=float, default=8, help='PDF_SPOOL_MAX_MB du mode spool')
+    parser.add_argument('--child', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run(args.child, args.exports, args.images, args.image_mb)
+        return
+
+    print(f"{args.exports} exports simultanés, {args.images} images de {args.image_mb:g} Mo, "
+          f"PDF_SPOOL_MAX_MB={args.spool_mb:g}")
+    print(f"{'Mode':>8} | {'Requête':>8} | {'PDF':>8} | {'Réf. (Mo)':>9} | {'Pic (Mo)':>8} | {'Par export':>10}")
+    print('-' * 68)
+    for mode in MODES:
+        env = dict(os.environ, PDF_WORKERS='0', PDF_SPOOL_MAX_MB=str(args.spool_mb), PDF_IMAGE_CACHE_MB='0')
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', mode,
+                                 '--exports', str(args.exports), '--images', str(args.images),
+                                 '--image-mb', str(args.image_mb)],
+                                env=env, cwd=ROOT, check=True, capture_output=True, text=True).stdout
+        m = json.loads(output.strip().splitlines()[-1])
+        delta = m['peak'] - m['baseline']
+        print(f"{mode:>8} | {m['request'] / 1048576:>6.1f}Mo | {m['pdf'] / 1048576:>6.1f}Mo | "
+              f"{m['baseline']:>9.0f} | {m['peak']:>8.0f} | {delta / args.exports:>8.1f}Mo")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Benchmark du rendu PDF : threads de requête vs pool de processus.
+
+Lance N exports PDF simultanés (compte rendu volumineux + images) pendant qu'un client interroge
+/api/settings en continu, et mesure le temps total des exports et la latence de /api/settings.
+Avec PDF_WORKERS=0, doc.build s'exécute dans les threads de requête et monopolise le GIL ;
+avec le pool, le processus web reste disponible et les exports profitent des autres cœurs.
+
+Usage : python benchmarks/bench_pdf_pool.py [--exports 4] [--workers 4] [--items 3000]
+"""
+import argparse
+import base64
+import io
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def project(items):
+    """Projet synthétique : listes imbriquées, tableaux et deux images"""
+    from PIL import Image
+    blocks = []
+    for i in range(0, items, 50):
+        lis = ''.join(f'<li>Point <b>{j}</b> : interfaçage DPI et GAM<ul><li>Détail {j}</li></ul></li>'
+                      for j in range(i, min(i + 50, items)))
+        blocks.append(f'<h2>Section {i // 50}</h2><p>Décision <em>validée</em> en comité.</p><ol>{lis}</ol>'
+                      '<table><thead><tr><th>Action</th><th>Porteur</th></tr></thead>'
+                      '<tbody><tr><td>Recette</td><td>MOA</td></tr></tbody></table>')
+    images = []
+    for size in ((1600, 1000), (900, 1400)):
+        buffer = io.BytesIO()
+        Image.effect_noise(size, 40).convert('RGB').save(buffer, 'PNG')
+        images.append({'data': 'data:image/png;base64,' + base64.b64encode(buffer.getvalue()).decode(), 'title': 'Capture'})
+    return {'report': {'generated': ''.join(blocks)}, 'images': images,
+            'pdfConfig': {'title': 'Benchmark', 'order': ['report', 'images']}}
+
+
+def run(exports, items):
+    """Mesure dans le processus courant (configuré par l'environnement)"""
+    # Impressions de l'application et des workers (qui héritent du descripteur 1) écartées
+    stdout_fd = os.dup(1)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    import app
+    if app.pdf_pool:
+        app.pdf_pool.warm()
+    payload = {'project': project(items)}
+    latencies = []
+    done = threading.Event()
+
+    def poll_settings():
+        client = app.app.test_client()
+        while not done.is_set():
+            start = time.perf_counter()
+            client.get('/api/settings')
+            latencies.append(time.perf_counter() - start)
+            time.sleep(0.01)
+
+    def export(results, i):
+        response = app.app.test_client().post('/api/generate-pdf', json=payload)
+        results[i] = (response.status_code, len(response.get_data()))
+
+    poller = threading.Thread(target=poll_settings)
+    poller.start()
+    results = [None] * exports
+    threads = [threading.Thread(target=export, args=(results, i)) for i in range(exports)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    poller.join()
+
+    sys.stdout.flush()
+    os.dup2(stdout_fd, 1)
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if len(latencies) >= 20 else latencies[-1]
+    statuses = sorted({status for status, _ in results})
+    print(f"{elapsed:8.2f} s | settings p50 {statistics.median(latencies) * 1000:7.1f} ms | "
+          f"p95 {p95 * 1000:7.1f} ms | max {latencies[-1] * 1000:7.1f} ms | statuts {statuses}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--exports', type=int, default=4, help='Exports PDF simultanés')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Taille du pool mesuré')
+    parser.add_argument('--items', type=int, default=3000, help='Items de liste du compte rendu')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run(args.exports, args.items)
+        return
+
+    print(f"{args.exports} exports simultanés, {args.items} items de liste, {os.cpu_count()} cœur(s)")
+    # Un processus par configuration : PDF_WORKERS est lu à l'import de l'application
+    for label, workers in (('threads (PDF_WORKERS=0)', 0), (f'pool (PDF_WORKERS={args.workers})', args.workers)):
+        env = dict(os.environ, PDF_WORKERS=str(workers), PDF_QUEUE=str(args.exports))
+        print(f"{label:>24} | ", end='', flush=True)
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--child',
+                        '--exports', str(args.exports), '--items', str(args.items)],
+                       env=env, cwd=ROOT, check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,366 @@
+"""Suite de benchmarks du rendu PDF sur des projets synthétiques, résultats en JSON comparables.
+
+Chaque scénario décrit un projet : compte rendu de N sections (titre, paragraphes, listes
+imbriquées, tableaux), K images d'une résolution donnée (photos JPEG ou captures à aplats),
+logo, filigrane et diagramme SVG optionnels. Le projet passe par le pipeline de rendu dans le
+processus (render_pdf_with_stats, sans HTTP ni pool) ; chaque exécution relève le temps total, le
+pic de RSS au-dessus du niveau de départ, la taille du PDF, le nombre de pages et la durée des
+étapes (nettoyage, parsing, images, story, doc.build). Les caches (images, recettes, SVG) sont
+vidés avant chaque exécution, sauf avec --warm. La mémoire libérée par un scénario n'est pas
+toujours rendue au système : --isolate lance chaque scénario dans un processus neuf pour un pic
+de RSS exact.
+
+Usage :
+  python benchmarks/bench_pdf_suite.py                       # scénarios par défaut
+  python benchmarks/bench_pdf_suite.py --only report,images --repeat 5 --isolate
+  python benchmarks/bench_pdf_suite.py --scenario "big:sections=300,tables=40,table_rows=100"
+  python benchmarks/bench_pdf_suite.py --compare data/benchmarks/pdf-20250101-120000.json
+"""
+import argparse
+import base64
+import datetime
+import gc
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('PDF_WORKERS', '0')
+
+import app  # noqa: E402
+from bench_diagram_cache import flowchart  # noqa: E402
+from PIL import Image  # noqa: E402
+
+DEFAULTS = {
+    'sections': 10,        # titres H2, chacun suivi de son contenu
+    'paragraphs': 2,       # paragraphes par section
+    'lists': 1,            # listes par section
+    'list_items': 5,       # items par niveau de liste
+    'list_depth': 2,       # niveaux d'imbrication
+    'tables': 0,           # tableaux au total, répartis entre les sections
+    'table_rows': 10,
+    'table_cols': 4,
+    'images': 0,
+    'image_size': '1600x1200',
+    'image_kind': 'photo',  # photo (JPEG de bruit) ou flat (PNG à aplats)
+    'logo': False,
+    'watermark': False,
+    'diagram_nodes': 0,    # 0 : pas de diagramme
+}
+
+SCENARIOS = {
+    'minimal': {'sections': 1, 'paragraphs': 1, 'lists': 0},
+    'report': {'sections': 60, 'paragraphs': 3, 'lists': 2, 'list_items': 6, 'list_depth': 3, 'tables': 10},
+    'tables': {'sections': 10, 'lists': 0, 'tables': 10, 'table_rows': 100, 'table_cols': 6},
+    'images': {'sections': 2, 'images': 12, 'image_size': '2400x1600', 'logo': True},
+    'screenshots': {'sections': 2, 'images': 20, 'image_size': '1920x1080', 'image_kind': 'flat'},
+    'full': {'sections': 40, 'paragraphs': 3, 'lists': 2, 'list_depth': 3, 'tables': 8, 'table_rows': 40,
+             'images': 6, 'logo': True, 'watermark': True, 'diagram_nodes': 60},
+}
+
+WORDS = ('interfaçage', 'DPI', 'GAM', 'recette', 'flux', 'HL7', 'patient', 'séjour', 'validation',
+         'comité', 'planning', 'migration', 'référentiel', 'identité', 'mouvement', 'facturation')
+
+
+def parse_scenario(spec):
+    """'nom:clé=valeur,...' -> (nom, paramètres) ; les clés inconnues sont refusées"""
+    name, _, options = spec.partition(':')
+    params = dict(SCENARIOS.get(name, {}))
+    for item in filter(None, options.split(',')):
+        key, _, value = item.partition('=')
+        if key not in DEFAULTS:
+            raise SystemExit(f"Paramètre inconnu '{key}' (attendus : {', '.join(DEFAULTS)})")
+        default = DEFAULTS[key]
+        if isinstance(default, bool):
+            params[key] = value.lower() in ('1', 'true', 'yes', 'oui')
+        elif isinstance(default, int):
+            params[key] = int(value)
+        else:
+            params[key] = value
+    return name, params
+
+
+def sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def nested_list(rng, items, depth, ordered):
+    tag = 'ol' if ordered else 'ul'
+    parts = [f'<{tag}>']
+    for i in range(items):
+        child = nested_list(rng, max(2, items // 2), depth - 1, not ordered) if depth > 1 and i == 0 else ''
+        parts.append(f'<li>{sentence(rng, 6)} <b>{rng.choice(WORDS)}</b>{child}</li>')
+    parts.append(f'</{tag}>')
+    return ''.join(parts)
+
+
+def table(rng, rows, cols):
+    head = ''.join(f'<th>Colonne {c + 1}</th>' for c in range(cols))
+    body = ''.join('<tr>' + ''.join(f'<td>{sentence(rng, 3)}</td>' for _ in range(cols)) + '</tr>'
+                   for _ in range(rows))
+    return f'<table><thead><tr>{head}</tr></thead><tbody>{body}</tbody></table>'
+
+
+def report_html(p, rng):
+    tables_per_section = [p['tables'] // p['sections'] + (1 if i < p['tables'] % p['sections'] else 0)
+                          for i in range(p['sections'])] if p['sections'] else []
+    blocks = []
+    for i in range(p['sections']):
+        blocks.append(f'<h2>Section {i + 1} : {rng.choice(WORDS)}</h2>')
+        blocks.extend(f'<p>{sentence(rng, 25)} <em>{rng.choice(WORDS)}</em> {sentence(rng, 15)}</p>'
+                      for _ in range(p['paragraphs']))
+        blocks.extend(nested_list(rng, p['list_items'], p['list_depth'], ordered=j % 2 == 0)
+                      for j in range(p['lists']))
+        blocks.extend(table(rng, p['table_rows'], p['table_cols']) for _ in range(tables_per_section[i]))
+    return ''.join(blocks)
+
+
+def image_data_url(width, height, kind, seed):
+    """Image déterministe : bruit en JPEG (photo, peu compressible) ou bandes de couleur en PNG"""
+    rng = random.Random(seed)
+    if kind == 'photo':
+        img = Image.frombytes('RGB', (width, height), rng.randbytes(width * height * 3))
+        fmt, mime = 'JPEG', 'jpeg'
+    else:
+        img = Image.new('RGB', (width, height), (255, 255, 255))
+        for y in range(0, height, 40):
+            img.paste((rng.randrange(256), rng.randrange(256), rng.randrange(256)), (0, y, width // 2, y + 20))
+        fmt, mime = 'PNG', 'png'
+    buffer = io.BytesIO()
+    img.save(buffer, fmt)
+    return f'data:image/{mime};base64,' + base64.b64encode(buffer.getvalue()).decode()
+
+
+def build_project(name, params):
+    p = {**DEFAULTS, **params}
+    rng = random.Random(name)
+    width, height = (int(v) for v in p['image_size'].lower().split('x'))
+    pdf_config = {'title': f'Benchmark {name}', 'client': 'CHU', 'watermark': p['watermark'],
+                  'order': ['diagram', 'report', 'images']}
+    if p['logo']:
+        pdf_config['logo'] = image_data_url(600, 150, 'flat', 'logo')
+    project = {
+        'report': {'generated': report_html(p, rng)},
+        'images': [{'data': image_data_url(width, height, p['image_kind'], f'{name}-{i}'), 'title': f'Capture {i + 1}'}
+                   for i in range(p['images'])],
+        'pdfConfig': pdf_config,
+    }
+    if p['diagram_nodes']:
+        project['diagram'] = {'svg': flowchart(p['diagram_nodes']), 'title': 'Processus'}
+    return p, project
+
+
+def rss_bytes():
+    """RSS courant (Linux : /proc/self/statm), None ailleurs"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+class PeakRss:
+    """Échantillonne le RSS dans un thread pendant un rendu et retient le pic"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.baseline = rss_bytes()
+        self.peak = self.baseline
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._done.wait(self.interval):
+            self.peak = max(self.peak, rss_bytes())
+
+    def __enter__(self):
+        if self.baseline is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._done.set()
+        if self.baseline is not None:
+            self._thread.join()
+            self.peak = max(self.peak, rss_bytes())
+
+    @property
+    def delta_mb(self):
+        return None if self.baseline is None else (self.peak - self.baseline) / 1048576
+
+
+def reset_caches():
+    app.image_cache = app.ImageCache(app.image_cache.max_bytes)
+    app.report_recipes = app.ReportRecipeCache(app.report_recipes.max_entries)
+    app.diagram_cache = app.DiagramCache(app.diagram_cache.max_entries)
+
+
+def run_once(project, warm):
+    if not warm:
+        reset_caches()
+    gc.collect()
+    with tempfile.TemporaryFile() as output, PeakRss() as memory:
+        start = time.perf_counter()
+        _, stats = app.render_pdf_with_stats(project, output)
+        wall = time.perf_counter() - start
+        size = output.tell()
+    return {'wall_ms': round(wall * 1000, 2), 'peak_rss_mb': None if memory.delta_mb is None else round(memory.delta_mb, 1),
+            'bytes': size, 'pages': stats['pages'],
+            'stages_ms': {stage: round(seconds * 1000, 2) for stage, seconds in sorted(stats['stages'].items())}}
+
+
+def summarize(name, params, project, runs):
+    walls = [run['wall_ms'] for run in runs]
+    peaks = [run['peak_rss_mb'] for run in runs if run['peak_rss_mb'] is not None]
+    stages = sorted({stage for run in runs for stage in run['stages_ms']})
+    return {
+        'name': name,
+        'params': params,
+        'project_bytes': len(json.dumps(project)),
+        'wall_ms': {'median': round(statistics.median(walls), 2), 'min': min(walls), 'max': max(walls)},
+        'peak_rss_mb': max(peaks) if peaks else None,
+        'bytes': runs[-1]['bytes'],
+        'pages': runs[-1]['pages'],
+        'stages_ms': {stage: round(statistics.median(run['stages_ms'].get(stage, 0) for run in runs), 2)
+                      for stage in stages},
+        'runs': runs,
+    }
+
+
+def warm_up():
+    """Polices, styles et imports paresseux de ReportLab, Pillow et svglib chargés hors mesure"""
+    project = build_project('warmup', {'images': 1, 'image_size': '64x48', 'diagram_nodes': 2})[1]
+    app.render_pdf_with_stats(project, io.BytesIO())
+
+
+def measure(name, params, repeat, warm):
+    full_params, project = build_project(name, params)
+    runs = [run_once(project, warm) for _ in range(repeat)]
+    return summarize(name, full_params, project, runs)
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous_path, results, threshold):
+    """Écarts avec un fichier de résultats précédent ; retourne le nombre de régressions"""
+    with open(previous_path, encoding='utf-8') as f:
+        previous = {s['name']: s for s in json.load(f)['scenarios']}
+    print(f"\nComparaison avec {previous_path} (seuil {threshold:g} %)")
+    print(f"{'Scénario':>12} | {'Médiane (ms)':>21} | {'Écart':>7} | {'Octets':>8} | {'Pages':>7} | {'RSS':>8}")
+    print('-' * 80)
+    regressions = 0
+    for scenario in results:
+        old = previous.get(scenario['name'])
+        if old is None:
+            print(f"{scenario['name']:>12} | absent du fichier précédent")
+            continue
+        if old['params'] != scenario['params']:
+            print(f"{scenario['name']:>12} | paramètres différents, comparaison ignorée")
+            continue
+        before, after = old['wall_ms']['median'], scenario['wall_ms']['median']
+        change = (after - before) / before * 100 if before else 0.0
+        flag = ''
+        if change > threshold:
+            flag = '  << régression'
+            regressions += 1
+        size = (scenario['bytes'] - old['bytes']) / old['bytes'] * 100 if old['bytes'] else 0.0
+        rss = ('' if scenario['peak_rss_mb'] is None or old['peak_rss_mb'] is None
+               else f"{scenario['peak_rss_mb'] - old['peak_rss_mb']:+.1f}Mo")
+        print(f"{scenario['name']:>12} | {before:>9.1f} -> {after:>8.1f} | {change:>+6.1f}% | {size:>+7.1f}% | "
+              f"{scenario['pages'] - old['pages']:>+7d} | {rss:>8}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     epilog='Paramètres de scénario : ' + ', '.join(f'{k}={v}' for k, v in DEFAULTS.items()))
+    parser.add_argument('--only', help='Scénarios prédéfinis à lancer, séparés par des virgules '
+                                       f'({", ".join(SCENARIOS)})')
+    parser.add_argument('--scenario', action='append', default=[],
+                        help="Scénario personnalisé 'nom:clé=valeur,...' (base : le scénario prédéfini du même nom)")
+    parser.add_argument('--repeat', type=int, default=3, help='Exécutions mesurées par scénario')
+    parser.add_argument('--warm', action='store_true', help='Conserver les caches entre exécutions')
+    parser.add_argument('--isolate', action='store_true', help='Un processus neuf par scénario (pic de RSS exact)')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--output', help='Fichier JSON des résultats (défaut : data/benchmarks/pdf-<date>.json)')
+    parser.add_argument('--compare', help='Résultats précédents à comparer')
+    parser.add_argument('--threshold', type=float, default=10, help='Hausse de la médiane signalée comme régression (%%)')
+    args = parser.parse_args()
+
+    if args.child:
+        name, params = json.loads(args.child)
+        warm_up()
+        print(json.dumps(measure(name, params, args.repeat, args.warm)))
+        return
+
+    if args.scenario:
+        selected = [parse_scenario(spec) for spec in args.scenario]
+    else:
+        names = args.only.split(',') if args.only else list(SCENARIOS)
+        unknown = [name for name in names if name not in SCENARIOS]
+        if unknown:
+            raise SystemExit(f"Scénario inconnu : {', '.join(unknown)}")
+        selected = [(name, dict(SCENARIOS[name])) for name in names]
+
+    if not args.isolate:
+        warm_up()
+
+    print(f"{'Scénario':>12} | {'Projet':>8} | {'Médiane (ms)':>12} | {'Min (ms)':>9} | {'RSS (Mo)':>8} | "
+          f"{'PDF':>9} | {'Pages':>5} | Étapes (ms)")
+    print('-' * 120)
+    results = []
+    for name, params in selected:
+        if args.isolate:
+            command = [sys.executable, os.path.abspath(__file__), '--child', json.dumps([name, params]),
+                       '--repeat', str(args.repeat)] + (['--warm'] if args.warm else [])
+            output = subprocess.run(command, cwd=ROOT, check=True, capture_output=True, text=True).stdout
+            scenario = json.loads(output.strip().splitlines()[-1])
+        else:
+            scenario = measure(name, params, args.repeat, args.warm)
+        results.append(scenario)
+        rss = '-' if scenario['peak_rss_mb'] is None else f"{scenario['peak_rss_mb']:.1f}"
+        stages = ' '.join(f'{stage}={ms:.0f}' for stage, ms in scenario['stages_ms'].items())
+        print(f"{name:>12} | {scenario['project_bytes'] / 1048576:>6.1f}Mo | {scenario['wall_ms']['median']:>12.1f} | "
+              f"{scenario['wall_ms']['min']:>9.1f} | {rss:>8} | {scenario['bytes'] / 1024:>7.0f}Ko | "
+              f"{scenario['pages']:>5} | {stages}")
+
+    created = datetime.datetime.now()
+    output = args.output or os.path.join(app.DATA_DIR, 'benchmarks', f"pdf-{created:%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'created': created.isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'repeat': args.repeat,
+            'warm': args.warm,
+            'isolate': args.isolate,
+            'scenarios': results,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"\nRésultats : {output}")
+
+    if args.compare and compare(args.compare, results, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
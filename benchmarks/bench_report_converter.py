@@ -0,0 +1,87 @@
+"""Non-régression et benchmark de la conversion HTML du compte rendu -> recette PDF.
+
+Compare le convertisseur lxml en une passe (ReportHtmlConverter) à l'ancien rendu BeautifulSoup
+(html.parser, copie de sous-arbres par item de liste, concaténations récursives) : les recettes
+produites doivent être identiques sur un corpus de cas limites et de comptes rendus Quill.
+Mesure ensuite les deux convertisseurs sur des comptes rendus de plusieurs milliers d'items.
+
+Usage : python benchmarks/bench_report_converter.py [--repeat 3] [--check-only] [fichier.html ...]
+La même non-régression tourne dans la suite de tests (tests/test_report_converter.py).
+Prérequis : pip install -r requirements-dev.txt (BeautifulSoup4 pour l'ancien convertisseur)
+Code de sortie 1 si une recette diffère.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lxml import html as lxml_html  # noqa: E402
+
+from app import ReportHtmlConverter, sanitize_report_html  # noqa: E402
+from tests.report_converter_reference import EDGE_CASES, legacy_report_recipe, quill_report  # noqa: E402
+
+LIST_SIZES = [1000, 5000, 20000]
+
+
+def lxml_report_recipe(html_input):
+    return ReportHtmlConverter().convert(lxml_html.document_fromstring(html_input).body)
+
+
+def check(corpus):
+    failures = 0
+    for label, html_input in corpus:
+        html_input = sanitize_report_html(html_input)
+        expected = legacy_report_recipe(html_input)
+        actual = lxml_report_recipe(html_input)
+        if expected != actual:
+            failures += 1
+            print(f"❌ {label}")
+            for i, (old, new) in enumerate(zip(expected, actual)):
+                if old != new:
+                    print(f"   op {i}:\n     ancien : {old!r}\n     lxml   : {new!r}")
+                    break
+            else:
+                print(f"   longueurs : ancien {len(expected)} ops, lxml {len(actual)} ops")
+    print(f"Non-régression : {len(corpus) - failures}/{len(corpus)} recettes identiques")
+    return failures
+
+
+def timed(func, arg, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(arg)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3, help='Répétitions par mesure (meilleur temps retenu)')
+    parser.add_argument('--check-only', action='store_true', help='Non-régression seulement, sans benchmark')
+    parser.add_argument('files', nargs='*', help='Comptes rendus HTML supplémentaires à comparer')
+    args = parser.parse_args()
+
+    corpus = [(f'cas {i + 1}: {html_input[:50]!r}', html_input) for i, html_input in enumerate(EDGE_CASES)]
+    corpus += [(f'quill {n} items', quill_report(n)) for n in (10, 200)]
+    for path in args.files:
+        with open(path, encoding='utf-8') as f:
+            corpus.append((path, f.read()))
+    failures = check(corpus)
+    if failures or args.check_only:
+        sys.exit(1 if failures else 0)
+
+    print(f"\n{'Items':>7} | {'Taille':>8} | {'Ancien (ms)':>11} | {'lxml (ms)':>9} | {'Gain':>6}")
+    print('-' * 54)
+    for n in LIST_SIZES:
+        html_input = sanitize_report_html(quill_report(n))
+        legacy_time = timed(legacy_report_recipe, html_input, args.repeat)
+        new_time = timed(lxml_report_recipe, html_input, args.repeat)
+        print(f"{n:>7} | {len(html_input) // 1024:>6}Ko | {legacy_time * 1000:>11.0f} | "
+              f"{new_time * 1000:>9.0f} | {legacy_time / new_time:>5.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""Benchmark du nettoyage du HTML de compte rendu avant export PDF.
+
+Compare l'ancienne chaîne de nettoyage (str.replace successifs, comptages, regex non compilées)
+à l'étape unique sanitize_report_html, sur des comptes rendus Quill de 100 Ko à 2 Mo,
+ainsi que l'ancien et le nouveau clean_squares appliqués aux nœuds texte.
+
+Usage : python benchmarks/bench_sanitizer.py [--repeat 5]
+L'équivalence des deux nettoyages est vérifiée par la suite de tests (tests/test_sanitizer.py).
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import clean_squares, sanitize_report_html  # noqa: E402
+from tests.sanitizer_reference import SQUARE_CHARS, legacy_clean_squares, legacy_sanitize, quill_report  # noqa: E402
+
+SIZES_KB = [100, 500, 1000, 2000]
+
+
+def timed(func, arg, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(arg)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help='Répétitions par mesure (meilleur temps retenu)')
+    args = parser.parse_args()
+
+    print(f"{'Taille':>8} | {'Ancien (ms)':>11} | {'Nouveau (ms)':>12} | {'Gain':>6} | Carrés restants")
+    print('-' * 65)
+    for size_kb in SIZES_KB:
+        html_input = quill_report(size_kb)
+        legacy_time, _ = timed(legacy_sanitize, html_input, args.repeat)
+        new_time, cleaned = timed(sanitize_report_html, html_input, args.repeat)
+        remaining = sum(cleaned.count(char) for char in SQUARE_CHARS) + cleaned.count('data-list')
+        print(f"{size_kb:>6}Ko | {legacy_time * 1000:>11.1f} | {new_time * 1000:>12.1f} | "
+              f"{legacy_time / new_time:>5.1f}x | {remaining}")
+
+    # clean_squares est appelé sur chaque nœud texte du rendu
+    nodes = ['Planning ▪ de recette\u200b validé\u00a0 ', 'Texte simple sans carré'] * 50000
+    legacy_time, _ = timed(lambda items: [legacy_clean_squares(t) for t in items], nodes, args.repeat)
+    new_time, _ = timed(lambda items: [clean_squares(t) for t in items], nodes, args.repeat)
+    print(f"\nclean_squares sur {len(nodes)} nœuds texte : {legacy_time * 1000:.1f} ms -> "
+          f"{new_time * 1000:.1f} ms ({legacy_time / new_time:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
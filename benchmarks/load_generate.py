@@ -0,0 +1,268 @@
+"""Test de charge des routes de génération, servies par waitress, contre le LLM factice.
+
+Démarre benchmarks/stub_llm.py (sauf --stub-url), puis pour chaque nombre de threads waitress
+lance l'application en mode production (PATHWAY_ENV=production WAITRESS_THREADS=N python app.py)
+pointée sur le stub, la charge avec --concurrency clients pendant --duration secondes et rapporte
+le débit, les percentiles p50/p95/p99 de la latence complète (flux lus jusqu'au bout), le délai du
+premier octet des flux, la répartition des statuts et la profondeur maximale de la file d'attente
+de waitress (requêtes acceptées en attente d'un thread). Chaque requête porte un prompt unique :
+ni le cache LLM ni la mutualisation des demandes identiques ne faussent la mesure.
+
+Usage :
+  python benchmarks/load_generate.py --threads 4,8,16 --concurrency 32 --duration 30
+  python benchmarks/load_generate.py --mix diagram-stream=3,report=1 --latency lognormal:800,0.5 --error-429 0.02
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import requests
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(ROOT)
+
+ENDPOINTS = {
+    # nom : (route, flux)
+    'diagram': ('/api/generate', False),
+    'diagram-stream': ('/api/generate/stream', True),
+    'report': ('/api/generate-report', False),
+    'report-stream': ('/api/generate-report/stream', True),
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(url, process, timeout=30):
+    """Attend qu'une URL réponde ; échoue si le processus s'est arrêté entre-temps"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f'Processus arrêté (code {process.returncode}) avant de répondre sur {url}')
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f'Pas de réponse de {url} après {timeout}s')
+
+
+def stop(process):
+    process.terminate()
+    try:
+        process.wait(10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def start_stub(args):
+    port = free_port()
+    command = [sys.executable, os.path.join(ROOT, 'stub_llm.py'), '--port', str(port),
+               '--latency', args.latency, '--token-ms', str(args.token_ms),
+               '--error-429', str(args.error_429), '--error-5xx', str(args.error_5xx)]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{port}'
+    wait_ready(f'{url}/api/tags', process)
+    return process, url
+
+
+def start_app(threads, stub_url, data_dir, args):
+    port = free_port()
+    env = dict(os.environ, PATHWAY_ENV='production', HOST='127.0.0.1', PORT=str(port),
+               WAITRESS_THREADS=str(threads), WAITRESS_CONNECTION_LIMIT=str(max(100, args.concurrency * 2)),
+               MISTRAL_BASE_URL=stub_url, OLLAMA_BASE_URL=stub_url, MISTRAL_API_KEY='stub',
+               LLM_CACHE_ENABLED='false', PDF_WORKERS='0', LOG_LEVEL='WARNING', PATHWAY_DATA_DIR=data_dir)
+    # Journal de l'application (avertissements de waitress compris) conservé pour relever la file d'attente
+    journal = tempfile.TemporaryFile(mode='w+', encoding='utf-8')
+    process = subprocess.Popen([sys.executable, 'app.py'], cwd=APP_DIR, env=env, stdout=journal, stderr=subprocess.STDOUT)
+    url = f'http://127.0.0.1:{port}'
+    try:
+        wait_ready(f'{url}/api/settings', process)
+    except RuntimeError:
+        stop(process)
+        journal.seek(0)
+        sys.stderr.write(journal.read())
+        raise
+    return process, url, journal
+
+
+def max_queue_depth(journal):
+    """Profondeur maximale de la file de tâches signalée par waitress (0 : jamais saturé)"""
+    journal.seek(0)
+    depths = [int(d) for d in re.findall(r'Task queue depth is (\d+)', journal.read())]
+    journal.close()
+    return max(depths, default=0)
+
+
+def parse_mix(value):
+    """'diagram=3,report-stream=1' -> liste pondérée de noms d'endpoints"""
+    weighted = []
+    for item in value.split(','):
+        name, _, weight = item.strip().partition('=')
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"Endpoint inconnu : {name} ({', '.join(ENDPOINTS)})")
+        weighted.extend([name] * int(weight or 1))
+    return weighted
+
+
+def payload(name, serial, engine):
+    if name.startswith('diagram'):
+        return {'prompt': f'Flux ADT entre la GAM et le DPI, variante {serial}', 'engine': engine,
+                'model': 'mistral-small-latest' if engine == 'mistral' else 'mistral:latest'}
+    return {'notes': f'Réunion {serial} : recette des flux HL7 validée, bascule planifiée, formation à organiser.',
+            'template': 'client_formel', 'meta': {'client': 'CH de test', 'date': '2026-10-18'}}
+
+
+def call(session, base_url, name, serial, engine):
+    """Exécute une requête ; retourne (statut, durée, délai du premier octet ou None)"""
+    route, stream = ENDPOINTS[name]
+    start = time.perf_counter()
+    try:
+        response = session.post(base_url + route, json=payload(name, serial, engine), stream=stream, timeout=120)
+        if not stream:
+            response.content
+            return str(response.status_code), time.perf_counter() - start, None
+        first = None
+        status = str(response.status_code)
+        for line in response.iter_lines(decode_unicode=True):
+            if first is None:
+                first = time.perf_counter() - start
+            if line == 'event: error':
+                status = 'sse-error'  # erreur amont signalée dans un flux ouvert en 200
+        return status, time.perf_counter() - start, first
+    except requests.RequestException as e:
+        return type(e).__name__, time.perf_counter() - start, None
+
+
+def percentile(values, q):
+    """Percentile au rang le plus proche (valeurs triées)"""
+    if not values:
+        return float('nan')
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+def run_load(base_url, args):
+    serials = itertools.count()
+    lock = threading.Lock()
+    samples = []  # (fin, endpoint, statut, durée, premier octet)
+    warm_until = time.monotonic() + args.warmup
+    stop_at = warm_until + args.duration
+
+    def client():
+        session = requests.Session()
+        rng = random.Random()
+        while time.monotonic() < stop_at:
+            name = rng.choice(args.mix)
+            with lock:
+                serial = next(serials)
+            status, elapsed, first = call(session, base_url, name, serial, args.engine)
+            end = time.monotonic()
+            if end >= warm_until:
+                with lock:
+                    samples.append((end, name, status, elapsed, first))
+
+    clients = [threading.Thread(target=client, daemon=True) for _ in range(args.concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    # Seules les requêtes terminées dans la fenêtre de mesure comptent pour le débit
+    measured = [s for s in samples if s[0] <= stop_at]
+    return measured, samples
+
+
+def summarize(threads, measured, samples, duration):
+    latencies = sorted(s[3] for s in samples)
+    ok = sorted(s[3] for s in samples if s[2] == '200')
+    ttfb = sorted(s[4] for s in samples if s[4] is not None)
+    return {
+        'threads': threads,
+        'requests': len(samples),
+        'throughput': len(measured) / duration,
+        'ok_throughput': sum(1 for s in measured if s[2] == '200') / duration,
+        'latency_ms': {f'p{q}': percentile(latencies, q) * 1000 for q in (50, 95, 99)}
+                      | {'max': latencies[-1] * 1000 if latencies else float('nan')},
+        'ok_latency_ms': {f'p{q}': percentile(ok, q) * 1000 for q in (50, 95, 99)},
+        'ttfb_ms': {f'p{q}': percentile(ttfb, q) * 1000 for q in (50, 95, 99)} if ttfb else None,
+        'statuses': dict(Counter(s[2] for s in samples)),
+        'endpoints': dict(Counter(s[1] for s in samples)),
+    }
+
+
+def print_table(results):
+    print(f"{'Threads':>7} | {'Req/s':>6} | {'OK/s':>6} | {'p50 (ms)':>8} | {'p95 (ms)':>8} | {'p99 (ms)':>8} | "
+          f"{'max (ms)':>8} | {'TTFB p95':>8} | {'File':>4} | Statuts")
+    print('-' * 107)
+    for r in results:
+        latency = r['latency_ms']
+        ttfb = f"{r['ttfb_ms']['p95']:>8.0f}" if r['ttfb_ms'] else f"{'-':>8}"
+        statuses = ' '.join(f'{k}:{v}' for k, v in sorted(r['statuses'].items()))
+        print(f"{r['threads']:>7} | {r['throughput']:>6.1f} | {r['ok_throughput']:>6.1f} | {latency['p50']:>8.0f} | "
+              f"{latency['p95']:>8.0f} | {latency['p99']:>8.0f} | {latency['max']:>8.0f} | {ttfb} | {r['max_queue_depth']:>4} | {statuses}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+    parser.add_argument('--threads', default='4,8,16', help='Nombres de threads waitress à comparer (défaut 4,8,16)')
+    parser.add_argument('--concurrency', type=int, default=32, help='Clients simultanés')
+    parser.add_argument('--duration', type=float, default=30, help='Durée de mesure par configuration (s)')
+    parser.add_argument('--warmup', type=float, default=3, help='Préchauffage non mesuré (s)')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('diagram-stream=2,diagram=1,report-stream=1,report=1'),
+                        help=f"Endpoints pondérés, ex. diagram=3,report-stream=1 ({', '.join(ENDPOINTS)})")
+    parser.add_argument('--engine', choices=('mistral', 'ollama'), default='mistral', help='Moteur des diagrammes')
+    parser.add_argument('--stub-url', help='LLM factice déjà lancé (sinon démarré avec les options ci-dessous)')
+    parser.add_argument('--latency', default='lognormal:800,0.4', help='Loi de latence du stub (voir stub_llm.py)')
+    parser.add_argument('--token-ms', type=float, default=15, help='Délai par fragment du stub (ms)')
+    parser.add_argument('--error-429', type=float, default=0.0, help='Part de 429 renvoyés par le stub')
+    parser.add_argument('--error-5xx', type=float, default=0.0, help='Part de 5xx renvoyés par le stub')
+    parser.add_argument('--json', help='Écrit les résultats détaillés dans ce fichier')
+    args = parser.parse_args()
+
+    stub = None
+    stub_url = args.stub_url
+    if not stub_url:
+        stub, stub_url = start_stub(args)
+    results = []
+    try:
+        with tempfile.TemporaryDirectory(prefix='pathway-load-') as data_dir:
+            for threads in [int(t) for t in args.threads.split(',')]:
+                server, base_url, journal = start_app(threads, stub_url, data_dir, args)
+                try:
+                    measured, samples = run_load(base_url, args)
+                finally:
+                    stop(server)
+                result = summarize(threads, measured, samples, args.duration)
+                result['max_queue_depth'] = max_queue_depth(journal)
+                results.append(result)
+    finally:
+        if stub:
+            stop(stub)
+
+    print(f"Stub : {stub_url}  latence {args.latency}, {args.token_ms:g} ms/fragment, "
+          f"429 {args.error_429:.0%}, 5xx {args.error_5xx:.0%} ; {args.concurrency} clients, {args.duration:g}s")
+    print_table(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            settings = {k: v for k, v in vars(args).items() if k != 'mix'}
+            settings['mix'] = dict(Counter(args.mix))
+            json.dump({'args': settings, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
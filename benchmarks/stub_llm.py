@@ -0,0 +1,287 @@
+"""Serveur LLM factice (API Mistral et Ollama) pour les tests de charge sans consommer de quota.
+
+Routes imitées :
+  POST /v1/chat/completions   Mistral, réponse JSON ou SSE ("stream": true), clé Bearer exigée
+  GET  /v1/models             Mistral, liste des modèles
+  POST /api/generate          Ollama, réponse JSON ou NDJSON ("stream": true)
+  GET  /api/tags              Ollama, liste des modèles
+  GET  /stub/stats            Compteurs du serveur factice (requêtes par route et statut)
+
+Le contenu renvoyé est un diagramme Mermaid quand le prompt système parle de Mermaid (et pour
+Ollama), un compte rendu Markdown sinon. La latence avant la première réponse suit la loi
+choisie (--latency), chaque fragment de texte ajoute --token-ms ; une fraction des requêtes
+échoue en 429 ou 5xx.
+
+Usage :
+  python benchmarks/stub_llm.py --port 8089 --latency lognormal:800,0.5 --token-ms 15 --error-429 0.02
+  MISTRAL_BASE_URL=http://127.0.0.1:8089 OLLAMA_BASE_URL=http://127.0.0.1:8089 MISTRAL_API_KEY=stub python app.py
+
+Lois de latence (millisecondes) : fixed:M, uniform:A,B, normal:MOY,ECART, lognormal:MEDIANE,SIGMA, exp:MOY
+"""
+import argparse
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MODELS = ('mistral-small-latest', 'mistral-medium-latest', 'mistral-large-latest')
+OLLAMA_MODELS = ('mistral:latest', 'llama3:8b')
+
+MERMAID_OUTPUTS = (
+    """```mermaid
+flowchart TD
+    A[Admission patient] --> B{Identité connue ?}
+    B -->|Oui| C[Mise à jour du dossier]
+    B -->|Non| D[Création de l'identité]
+    C --> E[Envoi ADT vers le DPI]
+    D --> E
+    E --> F[Accusé de réception]
+```""",
+    """sequenceDiagram
+    participant GAM
+    participant EAI
+    participant DPI
+    GAM->>EAI: ADT^A01 (admission)
+    EAI->>DPI: Message transformé
+    DPI-->>EAI: ACK
+    EAI-->>GAM: ACK""",
+)
+
+REPORT_OUTPUT = """## Compte rendu de réunion
+
+### Participants
+- Équipe projet ENOVACOM
+- Direction des systèmes d'information
+
+### Points abordés
+1. **Interfaçage DPI / GAM** : les flux ADT sont validés en recette.
+2. **Planning** : la mise en production est confirmée.
+   - Bascule prévue un week-end
+   - Astreinte renforcée la semaine suivante
+
+### Décisions
+| Sujet | Décision | Porteur |
+|-------|----------|---------|
+| Flux HL7 | Validés | MOA |
+| Formation | Planifiée | ENOVACOM |
+
+### Prochaines étapes
+- Envoyer le plan de bascule
+- Organiser la réunion de lancement"""
+
+TOKEN_RE = re.compile(r'\s*\S+|\s+')
+
+
+def latency_sampler(spec):
+    """Fonction sans argument tirant une latence en secondes selon 'loi:paramètres' (ms)"""
+    kind, _, params = spec.partition(':')
+    values = [float(v) for v in params.split(',') if v]
+    if kind == 'fixed':
+        return lambda: values[0] / 1000
+    if kind == 'uniform':
+        return lambda: random.uniform(values[0], values[1]) / 1000
+    if kind == 'normal':
+        return lambda: max(0.0, random.gauss(values[0], values[1])) / 1000
+    if kind == 'lognormal':
+        return lambda: random.lognormvariate(math.log(values[0]), values[1]) / 1000
+    if kind == 'exp':
+        return lambda: random.expovariate(1 / values[0]) / 1000
+    raise argparse.ArgumentTypeError(f'Loi de latence inconnue : {spec}')
+
+
+class StubLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, address, latency, token_ms, error_429, error_5xx):
+        super().__init__(address, StubHandler)
+        self.latency = latency
+        self.token_delay = token_ms / 1000
+        self.error_429 = error_429
+        self.error_5xx = error_5xx
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+    def handle_error(self, request, client_address):
+        # Connexions keep-alive fermées par le client : normal en fin de test, pas de trace
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+    def count(self, path, status):
+        with self._lock:
+            self.stats[f'{path} {status}'] += 1
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, comme l'API réelle
+    server_version = 'StubLLM/1.0'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == '/v1/models':
+            if self.check_auth():
+                self.send_json(200, {'object': 'list', 'data': [{'id': m, 'object': 'model'} for m in MODELS]})
+        elif self.path == '/api/tags':
+            self.send_json(200, {'models': [{'name': m} for m in OLLAMA_MODELS]})
+        elif self.path == '/stub/stats':
+            self.send_json(200, dict(self.server.stats), count=False)
+        else:
+            self.send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self.send_json(400, {'error': 'invalid JSON'})
+            return
+        if self.path == '/v1/chat/completions':
+            if self.check_auth():
+                self.mistral(body)
+        elif self.path == '/api/generate':
+            self.ollama(body)
+        else:
+            self.send_json(404, {'error': 'not found'})
+
+    def check_auth(self):
+        if not self.headers.get('Authorization', '').startswith('Bearer '):
+            self.send_json(401, {'object': 'error', 'message': 'Unauthorized', 'type': 'invalid_request_error'})
+            return False
+        return True
+
+    def injected_error(self):
+        """Statut d'erreur tiré selon les taux configurés, ou None"""
+        draw = random.random()
+        if draw < self.server.error_429:
+            return 429
+        if draw < self.server.error_429 + self.server.error_5xx:
+            return random.choice((500, 502, 503))
+        return None
+
+    def mistral(self, body):
+        time.sleep(self.server.latency())
+        status = self.injected_error()
+        if status:
+            self.send_json(status, {'object': 'error', 'message': 'Rate limit exceeded' if status == 429 else 'Upstream error',
+                                    'type': 'rate_limited' if status == 429 else 'server_error'})
+            return
+        messages = body.get('messages') or [{}]
+        system = messages[0].get('content', '') if messages[0].get('role') == 'system' else ''
+        text = random.choice(MERMAID_OUTPUTS) if 'Mermaid' in system else REPORT_OUTPUT
+        model = body.get('model', MODELS[0])
+        completion_id = f'cmpl-{uuid.uuid4().hex[:24]}'
+        tokens = TOKEN_RE.findall(text)
+        if not body.get('stream'):
+            time.sleep(self.server.token_delay * len(tokens))
+            self.send_json(200, {
+                'id': completion_id, 'object': 'chat.completion', 'created': int(time.time()), 'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text}, 'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': length_in_tokens(messages), 'completion_tokens': len(tokens),
+                          'total_tokens': length_in_tokens(messages) + len(tokens)},
+            })
+            return
+        self.start_stream('text/event-stream')
+        for token in tokens:
+            chunk = {'id': completion_id, 'object': 'chat.completion.chunk', 'model': model,
+                     'choices': [{'index': 0, 'delta': {'content': token}, 'finish_reason': None}]}
+            if not self.write_chunk(f'data: {json.dumps(chunk, ensure_ascii=False)}\n\n'):
+                return
+            time.sleep(self.server.token_delay)
+        self.write_chunk('data: [DONE]\n\n')
+        self.end_stream()
+
+    def ollama(self, body):
+        time.sleep(self.server.latency())
+        status = self.injected_error()
+        if status:
+            self.send_json(status, {'error': 'model is overloaded' if status == 429 else 'internal error'})
+            return
+        text = random.choice(MERMAID_OUTPUTS)
+        model = body.get('model', OLLAMA_MODELS[0])
+        tokens = TOKEN_RE.findall(text)
+        if not body.get('stream', True):
+            time.sleep(self.server.token_delay * len(tokens))
+            self.send_json(200, {'model': model, 'response': text, 'done': True, 'eval_count': len(tokens)})
+            return
+        self.start_stream('application/x-ndjson')
+        for token in tokens:
+            if not self.write_chunk(json.dumps({'model': model, 'response': token, 'done': False}) + '\n'):
+                return
+            time.sleep(self.server.token_delay)
+        self.write_chunk(json.dumps({'model': model, 'response': '', 'done': True, 'eval_count': len(tokens)}) + '\n')
+        self.end_stream()
+
+    def send_json(self, status, data, count=True):
+        payload = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+        if count:
+            self.server.count(self.path, status)
+
+    def start_stream(self, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        self.server.count(self.path, 200)
+
+    def write_chunk(self, text):
+        """Fragment HTTP chunked ; False si le client a fermé la connexion (génération abandonnée)"""
+        data = text.encode('utf-8')
+        try:
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+            self.wfile.flush()
+            return True
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+            return False
+
+    def end_stream(self):
+        try:
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+
+def length_in_tokens(messages):
+    return sum(len(TOKEN_RE.findall(m.get('content', ''))) for m in messages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=latency_sampler, default='lognormal:800,0.4',
+                        help='Loi de la latence avant la première réponse (ms), défaut lognormal:800,0.4')
+    parser.add_argument('--token-ms', type=float, default=15, help='Délai par fragment de texte (ms)')
+    parser.add_argument('--error-429', type=float, default=0.0, help='Part des requêtes en 429')
+    parser.add_argument('--error-5xx', type=float, default=0.0, help='Part des requêtes en 500/502/503')
+    parser.add_argument('--seed', type=int, help='Graine du générateur aléatoire (tirages reproductibles)')
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    server = StubLLMServer((args.host, args.port), args.latency, args.token_ms, args.error_429, args.error_5xx)
+    print(f"LLM factice sur http://{args.host}:{server.server_port} (Mistral et Ollama)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
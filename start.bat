@@ -41,7 +41,7 @@ python -m pip install --upgrade pip --quiet
 
 REM Installer les dépendances
 echo Installation/Verification des dependances...
-echo (Flask, ReportLab, svglib, BeautifulSoup4, etc.)
+echo (Flask, ReportLab, svglib, lxml, etc.)
 pip install -r requirements.txt
 if errorlevel 1 (
     echo.
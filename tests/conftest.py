@@ -0,0 +1,9 @@
+"""Configuration des tests : application importée avec des données temporaires et sans pool PDF"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('PATHWAY_DATA_DIR', tempfile.mkdtemp(prefix='pathway-tests-'))
+os.environ.setdefault('PDF_WORKERS', '0')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
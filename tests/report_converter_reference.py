@@ -0,0 +1,172 @@
+"""Convertisseur de référence du compte rendu : l'ancien rendu BeautifulSoup de generate_pdf.
+
+Les recettes du convertisseur lxml (ReportHtmlConverter) doivent lui rester identiques ; partagé
+par tests/test_report_converter.py et benchmarks/bench_report_converter.py avec son corpus.
+Le convertisseur nécessite BeautifulSoup4 (requirements-dev.txt), importé à l'appel.
+"""
+from app import clean_squares
+
+
+def legacy_report_recipe(html_input):
+    """Ancien convertisseur BeautifulSoup de generate_pdf (hors impressions de debug)"""
+    from bs4 import BeautifulSoup
+    ops = []
+    soup = BeautifulSoup(html_input, 'html.parser')
+
+    def html_to_reportlab(element, preserve_spaces=False):
+        if isinstance(element, str):
+            return clean_squares(str(element))
+        text = ''
+        for child in element.children:
+            if child.name == 'strong' or child.name == 'b':
+                text += f'<b>{html_to_reportlab(child, preserve_spaces)}</b>'
+            elif child.name == 'em' or child.name == 'i':
+                text += f'<i>{html_to_reportlab(child, preserve_spaces)}</i>'
+            elif child.name == 'u':
+                text += f'<u>{html_to_reportlab(child, preserve_spaces)}</u>'
+            elif child.name == 'code':
+                text += f'<font name="Courier" size="9" color="#1F2937">{html_to_reportlab(child, True)}</font>'
+            elif child.name == 'br':
+                text += '<br/>'
+            elif child.name == 'p':
+                inner = html_to_reportlab(child, preserve_spaces)
+                if inner.strip():
+                    text += inner + '<br/><br/>'
+            elif child.name == 'a':
+                href = child.get('href', '')
+                text += f'<a href="{href}">{html_to_reportlab(child, preserve_spaces)}</a>'
+            elif child.name is None:
+                text += str(child)
+            else:
+                text += html_to_reportlab(child, preserve_spaces)
+        return clean_squares(text)
+
+    def add_paragraph(element, style='normal', add_spacer=True):
+        if isinstance(element, str):
+            t = clean_squares(element.strip())
+        else:
+            t = clean_squares(html_to_reportlab(element).strip())
+        if t:
+            ops.append(('paragraph', t, style))
+            if add_spacer and style == 'normal':
+                ops.append(('spacer', 6))
+
+    def render_list(list_tag, ordered=False, indent_level=0):
+        counter = 1
+        for li in list_tag.find_all('li', recursive=False):
+            li_copy = li.__copy__()
+            for sub_list in li_copy.find_all(['ul', 'ol']):
+                sub_list.decompose()
+            text = clean_squares(html_to_reportlab(li_copy).strip())
+            if text:
+                if ordered:
+                    bullet = f'{counter}. '
+                    counter += 1
+                else:
+                    bullet = '-'
+                ops.append(('paragraph', f'{bullet} {text}', ('list', indent_level)))
+            for sub_list in li.find_all(['ul', 'ol'], recursive=False):
+                render_list(sub_list, ordered=sub_list.name == 'ol', indent_level=indent_level + 1)
+
+    def render_table(table_tag):
+        rows = []
+        thead = table_tag.find('thead')
+        if thead:
+            for tr in thead.find_all('tr'):
+                head_row = tuple(f'<font color="white"><b>{clean_squares(th.get_text(" ", strip=True))}</b></font>' for th in tr.find_all(['th', 'td']))
+                if head_row:
+                    rows.append(('table_header_cell', head_row))
+        tbody = table_tag.find('tbody')
+        if tbody:
+            trs = tbody.find_all('tr')
+        else:
+            trs = table_tag.find_all('tr', recursive=False)
+        for tr in trs:
+            cells = tuple(clean_squares(td.get_text(" ", strip=True)) for td in tr.find_all(['td', 'th']))
+            if cells:
+                rows.append(('table_cell', cells))
+        if rows:
+            ops.append(('table', tuple(rows)))
+            ops.append(('spacer', 10))
+
+    root = soup.body if soup.body else soup
+    for el in getattr(root, 'children', []):
+        name = getattr(el, 'name', None)
+        if not name:
+            text = str(el).strip()
+            if text:
+                add_paragraph(text)
+            continue
+        name = name.lower()
+        if name in ['p', 'div']:
+            content = html_to_reportlab(el).strip()
+            if not content or content == '<br/>':
+                ops.append(('spacer', 12))
+                continue
+        if name in ('h1', 'h2', 'h3', 'h4', 'h5', 'h6'):
+            add_paragraph(el, name, add_spacer=False)
+        elif name in ['p', 'div']:
+            add_paragraph(el, 'normal')
+        elif name == 'ul':
+            render_list(el, ordered=False)
+            ops.append(('spacer', 8))
+        elif name == 'ol':
+            render_list(el, ordered=True)
+            ops.append(('spacer', 8))
+        elif name == 'table':
+            render_table(el)
+        elif name == 'br':
+            ops.append(('spacer', 12))
+        elif name == 'pre':
+            code_text = el.get_text()
+            if code_text.strip():
+                ops.append(('paragraph', code_text, 'code'))
+                ops.append(('spacer', 4))
+        elif name == 'blockquote':
+            quote_text = html_to_reportlab(el)
+            if quote_text.strip():
+                ops.append(('paragraph', quote_text, 'quote'))
+                ops.append(('spacer', 4))
+    return tuple(ops)
+
+
+# Cas limites : espaces en bord d'éléments, balises imbriquées, listes profondes, tableaux, carrés
+EDGE_CASES = [
+    '<p>Hello <b> world </b>!</p>',
+    '<p>  a  <span>  </span>  b  </p>',
+    '<p>a<span> x </span>b</p>',
+    '<p><b></b></p><p><br></p><p></p><div> </div>',
+    '<h1> Titre <em>important</em> </h1><h3>Sous-titre</h3><h6>petit</h6>',
+    '<p>Ligne 1<br>Ligne 2<br/> <br>Ligne 3</p>',
+    '<p>Voir <a href="https://example.org/a?b=1&amp;c=2"> le lien </a>, puis <code> x = 1 </code>.</p>',
+    '<div>Bloc <p>imbriqué</p> et <p> </p> suite</div>',
+    '<p>Puces ■ parasites ▪ et\u200b espaces insécables</p>',
+    '<ul><li>un</li><li> <strong>deux</strong> </li><li></li><li>trois<ul><li>3.1<ol><li>3.1.1</li><li>3.1.2</li></ol></li></ul> après</li></ul>',
+    '<ol><li data-list="ordered">A</li><li>B<span><ul><li>caché</li></ul></span> fin</li><li>C</li></ol>',
+    '<ul><li>a<ul><li>b<ul><li>c<ul><li>d<ul><li>e</li></ul></li></ul></li></ul></li></ul></li></ul>',
+    '<table><thead><tr><th> Col <b>1</b> </th><th>Col 2</th></tr></thead><tbody><tr><td>a</td><td> b  c </td></tr><tr><td>■</td><td></td></tr></tbody></table>',
+    '<table><tr><td>sans</td><td>tbody</td></tr><tr><td>x</td></tr></table>',
+    '<table><thead><tr><th>H</th></tr></thead><tr><td>hors tbody</td></tr></table>',
+    '<pre>  code\n    indenté  </pre><pre>   </pre>',
+    '<blockquote> Une <i>citation</i> </blockquote><blockquote> </blockquote>',
+    'Texte libre <p>puis paragraphe</p> et texte final',
+    '<p>Entités &lt;b&gt; &amp; &quot;guillemets&quot;</p>',
+    '<p>Multi\n ligne\t\ttabulée</p>',
+    '<p><u>souligné <b>gras <i>italique</i></b></u></p>',
+]
+
+
+def quill_report(list_items, depth=3):
+    """Compte rendu Quill synthétique dominé par des listes imbriquées"""
+    parts = ['<h1>Compte rendu</h1><p>Le client&nbsp;a validé la <strong>migration</strong> ■ vers FHIR.</p>']
+    per_list = 50
+    for start in range(0, list_items, per_list):
+        items = []
+        for i in range(start, min(start + per_list, list_items)):
+            nested = f'<ul><li>Détail <em>{i}</em><ul><li>Sous-détail {i}</li></ul></li></ul>' if depth > 1 and i % 5 == 0 else ''
+            items.append(f'<li data-list="bullet"><span class="ql-ui" contenteditable="false"></span>'
+                         f'Point <b>{i}</b> : interfaçage\u200b DPI et GAM{nested}</li>')
+        parts.append('<h2>Section</h2><ol>' + ''.join(items) + '</ol>')
+        parts.append('<table><thead><tr><th>Action</th><th>Porteur</th></tr></thead>'
+                     '<tbody><tr><td>Recette</td><td>MOA</td></tr></tbody></table>')
+    return ''.join(parts)
@@ -0,0 +1,53 @@
+"""Nettoyage de référence du compte rendu : l'ancienne chaîne de generate_pdf et l'ancien clean_squares.
+
+sanitize_report_html suivi de clean_squares doit produire le même texte ; partagé par
+tests/test_sanitizer.py et benchmarks/bench_sanitizer.py avec le générateur de comptes rendus.
+"""
+import re
+
+SQUARE_CHARS = ['■', '▪', '◼', '◾', '▮', '◆', '⬛', '▫', '□', '▢', '⬜']
+
+
+def legacy_sanitize(html_input):
+    """Reproduction de l'ancien nettoyage de generate_pdf (hors impressions)"""
+    carres_detectes = []
+    if '■' in html_input:
+        carres_detectes.append(html_input.count('■'))
+    if '▪' in html_input:
+        carres_detectes.append(html_input.count('▪'))
+    for char in ['◼', '◾', '▮', '◆', '⬛', '▫', '□', '▢', '⬜']:
+        if char in html_input:
+            carres_detectes.append(html_input.count(char))
+    for char in SQUARE_CHARS:
+        html_input = html_input.replace(char, '')
+    for entity in ['&#9632;', '&#x25A0;', '&#9642;', '&#x25AA;', '&#9724;', '&nbsp;■']:
+        html_input = html_input.replace(entity, '')
+    html_input = re.sub(r'[■▪◼◾▮◆⬛▫□▢⬜]', '', html_input)
+    html_input = re.sub(r'<li[^>]*data-list=["\']bullet["\'][^>]*>', '<li>', html_input)
+    html_input = re.sub(r'<li[^>]*data-list=["\']ordered["\'][^>]*>', '<li>', html_input)
+    return html_input
+
+
+def legacy_clean_squares(text):
+    """Ancienne version de clean_squares (regex recompilées à chaque appel)"""
+    if not text:
+        return text
+    text = re.sub(r'[\u25A0-\u25FF\u2B00-\u2BFF\u2580-\u259F]', '', text)
+    text = re.sub(r'[\u200B\u200C\u200D\u2060\u00A0]', ' ', text)
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip()
+
+
+def quill_report(size_kb):
+    """Compte rendu Quill synthétique : titres, paragraphes, listes data-list, carrés et entités"""
+    block = (
+        '<h2>Points clés discutés</h2>'
+        '<p>Le client&nbsp;a validé la <strong>migration</strong> du connecteur HL7 ■ vers FHIR.</p>'
+        '<ol><li data-list="bullet"><span class="ql-ui" contenteditable="false"></span>'
+        '&#9632; Interfaçage DPI\u200b et GAM</li>'
+        '<li data-list="ordered">Planning ▪ de recette &#x25AA; validé</li>'
+        '<li data-list="bullet">Hébergement HDS&nbsp;: décision reportée</li></ol>'
+        '<p>Prochaine réunion le 12/03 — ordre du jour à confirmer.</p>'
+    )
+    repeat = max(1, size_kb * 1024 // len(block.encode('utf-8')))
+    return block * repeat
@@ -0,0 +1,110 @@
+"""Assets images adressés par SHA-256 : envoi, lecture sans décodage, éviction concurrente"""
+import hashlib
+import io
+import os
+
+import pytest
+from PIL import Image
+
+import app
+
+
+def png_bytes(color='red', size=(8, 8)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    store = app.AssetStore(str(tmp_path / 'assets'), 10 ** 7, 10 ** 6)
+    monkeypatch.setattr(app, 'asset_store', store)
+    return store
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+
+def upload(client, *payloads):
+    data = {'files': [(io.BytesIO(payload), f'image{i}.png') for i, payload in enumerate(payloads)]}
+    return client.post('/api/assets', data=data, content_type='multipart/form-data')
+
+
+def test_get_serves_the_mimetype_recorded_at_upload_without_decoding(store, client, monkeypatch):
+    digest = upload(client, png_bytes()).get_json()['assets'][0]['asset']
+
+    def no_decoding(*args, **kwargs):
+        raise AssertionError("l'image ne doit pas être relue pour être servie")
+    monkeypatch.setattr(app.PILImage, 'open', no_decoding)
+    response = client.get(f'/api/assets/{digest}')
+    assert response.status_code == 200
+    assert response.mimetype == 'image/png'
+    assert response.data == png_bytes()
+    assert client.head(f'/api/assets/{digest}').status_code == 200
+
+
+def test_evicted_asset_is_a_json_404(store, client):
+    digest = upload(client, png_bytes()).get_json()['assets'][0]['asset']
+    os.remove(store.path(digest))  # évincé par un autre envoi, type MIME encore présent
+    response = client.get(f'/api/assets/{digest}')
+    assert response.status_code == 404
+    assert response.get_json() == {'error': 'Asset inconnu ou évincé'}
+
+
+def test_asset_without_mimetype_file_is_sniffed_once(store, client):
+    digest = upload(client, png_bytes()).get_json()['assets'][0]['asset']
+    os.remove(store.path(digest) + store.MIME_SUFFIX)  # asset enregistré par une version antérieure
+    assert client.get(f'/api/assets/{digest}').mimetype == 'image/png'
+    with open(store.path(digest) + store.MIME_SUFFIX) as meta:
+        assert meta.read() == 'image/png'
+
+
+def test_eviction_removes_the_mimetype_file_with_the_asset(tmp_path):
+    store = app.AssetStore(str(tmp_path / 'assets'), 1, 10 ** 6)  # tout asset dépasse la limite
+    first, _ = store.save(io.BytesIO(png_bytes('red')))
+    store.save(io.BytesIO(png_bytes('blue')))
+    assert not os.path.exists(store.path(first['asset']))
+    assert not os.path.exists(store.path(first['asset']) + store.MIME_SUFFIX)
+    assert store.snapshot()['entries'] == 1
+
+
+def test_upload_returns_digest_and_header_information(store, client):
+    response = upload(client, png_bytes(size=(12, 8)), png_bytes(size=(12, 8)))
+    assert response.status_code == 201
+    first, second = response.get_json()['assets']
+    assert first['asset'] == hashlib.sha256(png_bytes(size=(12, 8))).hexdigest()
+    assert (first['format'], first['width'], first['height']) == ('PNG', 12, 8)
+    assert second['asset'] == first['asset']  # même contenu : stocké une fois
+    assert store.snapshot()['uploads'] == 1 and store.snapshot()['duplicates'] == 1
+
+
+@pytest.mark.parametrize('payload, status', [(b'pas une image', 400), (b'\x89PNG' + b'0' * 2 * 10 ** 6, 413)])
+def test_rejected_uploads_leave_nothing_behind(store, client, payload, status):
+    response = upload(client, payload)
+    assert response.status_code == status
+    assert 'error' in response.get_json()
+    assert store.snapshot()['entries'] == 0
+
+
+def test_upload_without_file_is_rejected(store, client):
+    assert client.post('/api/assets', data={}, content_type='multipart/form-data').status_code == 400
+
+
+def test_export_referencing_unknown_assets_asks_for_them(store, client):
+    digest = upload(client, png_bytes()).get_json()['assets'][0]['asset']
+    unknown = 'ab' * 32
+    project = {'images': [{'asset': digest, 'title': 'Envoyée'}, {'asset': unknown}, {'data': {'asset': unknown}}],
+               'pdfConfig': {}}
+    response = client.post('/api/generate-pdf', json={'project': project})
+    assert response.status_code == 409
+    assert response.get_json()['missing_assets'] == [unknown]
+
+
+def test_export_with_uploaded_assets_renders(store, client):
+    digest = upload(client, png_bytes(size=(64, 48))).get_json()['assets'][0]['asset']
+    project = {'images': [{'asset': digest, 'title': 'Schéma'}], 'pdfConfig': {'order': ['images']}}
+    response = client.post('/api/generate-pdf', json={'project': project})
+    assert response.status_code == 200
+    assert response.data.startswith(b'%PDF')
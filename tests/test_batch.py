@@ -0,0 +1,74 @@
+"""Génération par lots : NDJSON dans l'ordre de fin, un pool par moteur"""
+import json
+import threading
+
+import pytest
+from flask import jsonify
+
+import app
+
+
+@pytest.fixture
+def ollama_release(monkeypatch):
+    """Diagrammes factices ; ceux d'Ollama sont retenus jusqu'à ce que le test libère l'événement"""
+    event = threading.Event()
+
+    def fake_run_diagram(prompt, engine, model):
+        if engine == 'ollama':
+            event.wait(5)
+        if prompt == 'invalide':
+            return jsonify({'error': 'Réponse invalide: pas de code Mermaid détecté'}), 422
+        return jsonify({'mermaid': f'flowchart TD\n  A[{prompt}] --> B', 'engine': engine})
+    monkeypatch.setattr(app, 'run_diagram', fake_run_diagram)
+    yield event
+    event.set()
+
+
+def post_batch(body):
+    response = app.app.test_client().post('/api/generate/batch', json=body)
+    return response, [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_results_stream_as_ndjson_with_a_summary(ollama_release):
+    ollama_release.set()
+    response, lines = post_batch({'engine': 'mistral', 'items': [
+        'Admission', {'id': 'sortie', 'prompt': 'Sortie'}, {'prompt': 'invalide'}, {'prompt': ''},
+        {'prompt': 'Bloc', 'engine': 'inconnu'},
+    ]})
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    results = {line['index']: line for line in lines[:-1]}
+    assert sorted(results) == [0, 1, 2, 3, 4]
+    assert results[0]['status'] == 200 and results[0]['mermaid'].startswith('flowchart TD')
+    assert results[1]['id'] == 'sortie'
+    assert results[2]['status'] == 422
+    assert results[3] == {'index': 3, 'status': 400, 'error': 'Prompt requis'}
+    assert results[4] == {'index': 4, 'status': 400, 'error': 'Moteur non supporté'}
+    assert lines[-1] == {'done': True, 'total': 5, 'succeeded': 2, 'failed': 3}
+
+
+def test_items_of_a_busy_engine_do_not_hold_back_the_others(ollama_release):
+    received = []
+
+    def read():
+        with app.app.test_client().post('/api/generate/batch', json={'items': [
+            {'prompt': 'lent', 'engine': 'ollama'}, {'prompt': 'rapide', 'engine': 'mistral'},
+        ]}) as response:
+            for line in response.response:
+                received.append(json.loads(line))
+                if len(received) == 1:
+                    ollama_release.set()  # Mistral a répondu pendant qu'Ollama était retenu
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    reader.join(10)
+    assert [line.get('index') for line in received] == [1, 0, None]
+    assert received[-1]['succeeded'] == 2
+
+
+@pytest.mark.parametrize('body', [{}, {'items': []}, {'items': 'Admission'},
+                                  {'items': ['x'] * (app.BATCH_MAX_ITEMS + 1)}])
+def test_invalid_batches_are_rejected(body):
+    response = app.app.test_client().post('/api/generate/batch', json=body)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
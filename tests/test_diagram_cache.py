@@ -0,0 +1,91 @@
+"""Diagramme vectoriel (svglib) : conversion mise en cache, PNG de repli si le SVG n'est pas convertible"""
+import base64
+import io
+import logging
+import urllib.parse
+
+import pytest
+from PIL import Image
+
+import app
+
+SVG = ('<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 200 100" width="200" height="100">'
+       '<rect x="10" y="10" width="80" height="40" fill="#ECF8F6" stroke="#0C4A45"/>'
+       '<text x="50" y="35" text-anchor="middle">Admission</text></svg>')
+# Libellés HTML de Mermaid (htmlLabels) : svglib les ignorerait, le diagramme perdrait son texte
+HTML_LABELS_SVG = SVG.replace('<text x="50" y="35" text-anchor="middle">Admission</text>',
+                              '<foreignObject width="80" height="40"><div>Admission</div></foreignObject>')
+
+pytestmark = pytest.mark.skipif(not app.SVG_SUPPORT, reason='svglib non installé')
+
+
+def png_data_url():
+    buffer = io.BytesIO()
+    Image.new('RGB', (400, 200), 'white').save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def test_svg_is_converted_once():
+    cache = app.DiagramCache(4)
+    drawing = cache.get(SVG)
+    assert (drawing.width, drawing.height) == (150, 75)  # 200 x 100 px en points
+    assert cache.get(SVG) is drawing
+    assert cache.snapshot()['hits'] == 1 and cache.snapshot()['misses'] == 1
+
+
+def test_unsupported_svg_is_remembered():
+    cache = app.DiagramCache(4)
+    assert cache.get(HTML_LABELS_SVG) is None
+    assert cache.get(HTML_LABELS_SVG) is None
+    assert cache.get('<svg pas du svg') is None
+    snapshot = cache.snapshot()
+    assert (snapshot['hits'], snapshot['unsupported']) == (1, 2)
+
+
+def test_cache_is_bounded():
+    cache = app.DiagramCache(1)
+    cache.get(SVG)
+    cache.get(SVG.replace('Admission', 'Sortie'))
+    assert cache.snapshot()['entries'] == 1 and cache.snapshot()['evictions'] == 1
+
+
+def test_svg_data_urls_are_decoded():
+    encoded = 'data:image/svg+xml;base64,' + base64.b64encode(SVG.encode('utf-8')).decode('ascii')
+    assert app.diagram_svg_text(encoded) == SVG
+    assert app.diagram_svg_text('data:image/svg+xml,' + urllib.parse.quote(SVG)) == SVG
+    assert app.diagram_svg_text(SVG) == SVG
+
+
+def test_scaled_drawing_fits_the_frame_without_changing_the_cached_one():
+    drawing = app.DiagramCache(1).get(SVG)
+    scaled = app.scaled_drawing(drawing, 100, 100)
+    assert (scaled.width, scaled.height) == (100, 50)
+    assert (drawing.width, drawing.height) == (150, 75)
+
+
+@pytest.fixture
+def caches(monkeypatch):
+    monkeypatch.setattr(app, 'diagram_cache', app.DiagramCache(4))
+    monkeypatch.setattr(app, 'image_cache', app.ImageCache(10 ** 7))
+
+
+def export(diagram):
+    app.render_pdf({'diagram': diagram, 'pdfConfig': {'order': ['diagram']}}, io.BytesIO())
+
+
+def test_export_draws_the_vector_diagram(caches):
+    export({'svg': SVG, 'png': png_data_url()})
+    assert app.diagram_cache.snapshot()['misses'] == 1
+    assert app.image_cache.snapshot()['misses'] == 0  # PNG de repli inutile
+
+
+def test_export_falls_back_to_the_png(caches):
+    export({'svg': HTML_LABELS_SVG, 'png': png_data_url()})
+    assert app.diagram_cache.snapshot()['unsupported'] == 1
+    assert app.image_cache.snapshot()['misses'] > 0
+
+
+def test_export_skips_an_unsupported_diagram_without_png(caches, caplog):
+    with caplog.at_level(logging.WARNING, logger='pathway.pdf'):
+        export({'svg': HTML_LABELS_SVG})
+    assert 'aucun PNG de repli' in caplog.text
@@ -0,0 +1,67 @@
+"""Cache des images décodées : une image partagée entre exports est lue et décodée une seule fois"""
+import base64
+import io
+
+import pytest
+from PIL import Image
+
+import app
+
+
+def data_url(color='red', size=(40, 30)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def test_same_data_url_is_decoded_once():
+    cache = app.ImageCache(10 ** 6)
+    first = cache.get(data_url())
+    assert (first.width, first.height) == (40, 30)
+    assert cache.get(data_url()) is first
+    assert cache.get(data_url('blue')) is not first
+    assert cache.snapshot()['hits'] == 1
+    assert cache.snapshot()['misses'] == 2
+
+
+def test_least_recently_used_images_are_evicted_beyond_the_byte_budget():
+    red, blue, green = data_url('red'), data_url('blue'), data_url('green')
+    sizes = [len(app.ImageCache(10 ** 6).get(url).data) for url in (red, blue, green)]
+    cache = app.ImageCache(sum(sizes) - 1)  # les trois ne tiennent pas ensemble
+    cache.get(red)
+    cache.get(blue)
+    cache.get(red)  # bleu devient le moins récemment utilisé
+    cache.get(green)
+    assert cache.snapshot()['evictions'] == 1
+    hits = cache.snapshot()['hits']
+    cache.get(red)
+    cache.get(blue)
+    assert cache.snapshot()['hits'] == hits + 1  # rouge conservé, bleu évincé
+
+
+def test_image_larger_than_the_cache_is_not_kept():
+    cache = app.ImageCache(10)
+    cache.get(data_url())
+    assert cache.snapshot()['entries'] == 0
+
+
+def test_unreadable_data_url_raises():
+    with pytest.raises(Exception):
+        app.ImageCache(10 ** 6).get('data:image/png;base64,AAAA')
+
+
+def test_assets_are_cached_by_digest(tmp_path):
+    store = app.AssetStore(str(tmp_path / 'assets'), 10 ** 7, 10 ** 6)
+    buffer = io.BytesIO(base64.b64decode(data_url().split(',', 1)[1]))
+    digest = store.save(buffer)[0]['asset']
+    cache = app.ImageCache(10 ** 6)
+    assert cache.get_asset(digest, store) is cache.get_asset(digest, store)
+    with pytest.raises(FileNotFoundError):
+        cache.get_asset('0' * 64, store)
+
+
+def test_repeated_image_in_an_export_shares_one_reader():
+    images = app.PdfImageSet(app.ImageCache(10 ** 6), None, None, dpi=0)
+    first = images.flowable(images.load(data_url()), 100, 75)
+    second = images.flowable(images.load(data_url()), 50, 40)
+    assert first._img is second._img
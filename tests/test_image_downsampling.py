@@ -0,0 +1,78 @@
+"""Images rééchantillonnées à leur taille affichée : JPEG pour les photos, PNG sans perte pour les aplats"""
+import io
+
+from PIL import Image
+
+import app
+
+
+def decoded(img, fmt='PNG', **options):
+    buffer = io.BytesIO()
+    img.save(buffer, fmt, **options)
+    return app.DecodedImage('source', buffer.getvalue(), img.width, img.height)
+
+
+def photo(size=(800, 600)):
+    """Bruit coloré : bien plus de couleurs distinctes qu'un aplat (traité comme une photo)"""
+    return Image.merge('RGB', [Image.effect_noise(size, sigma) for sigma in (60, 80, 100)])
+
+
+def opened(entry):
+    img = Image.open(io.BytesIO(entry.data))
+    return img.format, img.size
+
+
+def test_large_photo_is_reduced_to_its_placed_size_as_jpeg():
+    entry = decoded(photo())
+    prepared = app.resample_image(entry, 'k', 200, 150)
+    assert opened(prepared) == ('JPEG', (200, 150))
+    assert (prepared.width, prepared.height) == (200, 150)
+    assert len(prepared.data) < len(entry.data)
+
+
+def test_flat_diagram_stays_lossless_png():
+    entry = decoded(Image.new('RGB', (1600, 800), 'white'))
+    assert opened(app.resample_image(entry, 'k', 400, 400)) == ('PNG', (400, 200))
+
+
+def test_transparent_image_keeps_its_alpha_channel():
+    img = photo((400, 400)).convert('RGBA')
+    img.putpixel((0, 0), (0, 0, 0, 0))
+    prepared = app.resample_image(decoded(img), 'k', 200, 200)
+    assert opened(prepared) == ('PNG', (200, 200))
+    assert Image.open(io.BytesIO(prepared.data)).mode == 'RGBA'
+
+
+def test_image_close_to_its_target_size_is_kept_as_is():
+    entry = decoded(photo((400, 300)), 'JPEG', quality=90)
+    # Moins de 125 % de la résolution cible : ni agrandissement ni recompression du JPEG
+    assert app.resample_image(entry, 'k', 350, 300).data == entry.data
+    assert app.resample_image(entry, 'k', 2000, 2000).data == entry.data
+
+
+def test_prepared_versions_are_cached_per_target_size():
+    cache = app.ImageCache(10 ** 8)
+    entry = decoded(photo())
+    first = cache.prepared(entry, 200, 150)
+    assert cache.prepared(entry, 200, 150) is first
+    assert cache.prepared(entry, 150, 110) is not first
+    snapshot = cache.snapshot()
+    assert snapshot['prepared'] == 2
+    assert snapshot['bytes_after'] < snapshot['bytes_before']
+
+
+def test_placed_size_and_dpi_set_the_target_resolution():
+    cache = app.ImageCache(10 ** 8)
+    entry = decoded(photo())
+    images = app.PdfImageSet(cache, None, None, dpi=144)
+    flowable = images.flowable(entry, 72, 72, kind='proportional')  # 1 pouce de large à 144 dpi
+    assert (flowable.drawWidth, flowable.drawHeight) == (72, 54)
+    assert opened(images.cache.prepared(entry, 144, 108)) == ('JPEG', (144, 108))
+
+
+def test_zero_dpi_embeds_the_original_image():
+    entry = decoded(photo())
+    images = app.PdfImageSet(app.ImageCache(10 ** 8), None, None, dpi=0)
+    images.flowable(entry, 72, 54)
+    assert images.metrics['images'] == 0
+    assert images.cache.snapshot()['prepared'] == 0
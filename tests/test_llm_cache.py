@@ -0,0 +1,41 @@
+"""Cache des sorties LLM : clé liée au serveur interrogé, dates d'accès écrites par lots"""
+import time
+
+import app
+
+
+def test_cache_key_depends_on_the_upstream_server(monkeypatch):
+    monkeypatch.setitem(app.config, 'ollama_base_url', 'http://gpu-1:11434')
+    before = app.llm_cache_key('ollama', 'mistral', app.llm_base_url('ollama'), app.SYSTEM_PROMPT, None, 'ADT')
+    monkeypatch.setitem(app.config, 'ollama_base_url', 'http://gpu-2:11434')
+    after = app.llm_cache_key('ollama', 'mistral', app.llm_base_url('ollama'), app.SYSTEM_PROMPT, None, 'ADT')
+    assert before != after
+
+
+def test_changing_the_server_bypasses_cached_diagrams(monkeypatch, tmp_path):
+    cache = app.ResponseCache(str(tmp_path / 'llm.sqlite3'), 16, 10 ** 6, 3600)
+    monkeypatch.setattr(app, 'response_cache', cache)
+    monkeypatch.setitem(app.config, 'ollama_base_url', 'http://ancien:11434')
+    cache.set(app.llm_cache_key('ollama', 'mistral', app.llm_base_url('ollama'), app.SYSTEM_PROMPT, None, 'ADT'),
+              'flowchart TD\n  A-->B')
+    with app.app.app_context():
+        assert app.generate_ollama('ADT', 'mistral').get_json() == {'mermaid': 'flowchart TD\n  A-->B'}
+        monkeypatch.setitem(app.config, 'ollama_base_url', 'http://127.0.0.1:9')  # nouveau serveur, injoignable
+        response, status = app.generate_ollama('ADT', 'mistral')
+    assert status == 503
+
+
+def test_disk_hits_do_not_write_but_still_order_eviction(tmp_path):
+    cache = app.ResponseCache(str(tmp_path / 'llm.sqlite3'), 1, 250, 3600)  # 1 entrée en mémoire : lectures sur disque
+    cache.set('a', 'x' * 100)
+    time.sleep(0.01)
+    cache.set('b', 'y' * 100)
+    time.sleep(0.01)
+    writes = cache._db.total_changes
+    assert cache.get('a') == 'x' * 100
+    assert cache._db.total_changes == writes  # aucune écriture SQLite sur le chemin de lecture
+    time.sleep(0.01)
+    cache.set('c', 'z' * 100)  # dépasse la limite : 'b', le moins récemment lu, part en premier
+    cache._memory.clear()
+    assert cache.get('a') == 'x' * 100
+    assert cache.get('b') is None
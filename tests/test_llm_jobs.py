@@ -0,0 +1,84 @@
+"""API de jobs LLM asynchrones : 202 immédiat, 503 file pleine, long-poll ?wait"""
+import threading
+
+import pytest
+from flask import jsonify
+
+import app
+
+
+@pytest.fixture
+def jobs(monkeypatch):
+    manager = app.JobManager(1, 1, 60, name='test-job')
+    monkeypatch.setattr(app, 'llm_jobs', manager)
+    yield manager
+    manager.shutdown()
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+
+@pytest.fixture
+def release(monkeypatch):
+    """Diagrammes factices retenus jusqu'à ce que le test libère l'événement"""
+    event = threading.Event()
+
+    def fake_run_diagram(prompt, engine, model):
+        event.wait(5)
+        if prompt == 'invalide':
+            return jsonify({'error': 'Réponse invalide: pas de code Mermaid détecté'}), 422
+        return jsonify({'mermaid': f'flowchart TD\n  A[{prompt}] --> B'})
+    monkeypatch.setattr(app, 'run_diagram', fake_run_diagram)
+    yield event
+    event.set()
+
+
+def submit(client, prompt='Admission'):
+    return client.post('/api/jobs', json={'type': 'diagram', 'prompt': prompt})
+
+
+def test_job_is_accepted_immediately_then_long_polled(jobs, client, release):
+    response = submit(client)
+    assert response.status_code == 202
+    job = response.get_json()
+    assert job['status'] in ('queued', 'running')
+    assert job['poll'] == f"/api/jobs/{job['id']}"
+
+    assert client.get(job['poll']).get_json()['status'] in ('queued', 'running')
+    release.set()
+    done = client.get(job['poll'] + '?wait=5').get_json()
+    assert done['status'] == 'done'
+    assert done['http_status'] == 200
+    assert done['result'] == {'mermaid': 'flowchart TD\n  A[Admission] --> B'}
+
+
+def test_full_queue_is_rejected_with_503(jobs, client, release):
+    # 1 worker + 1 place en file : la troisième demande est refusée sans être planifiée
+    assert submit(client, 'un').status_code == 202
+    assert submit(client, 'deux').status_code == 202
+    response = submit(client, 'trois')
+    assert response.status_code == 503
+    assert 'error' in response.get_json()
+
+
+def test_failed_generation_is_reported_on_the_job(jobs, client, release):
+    release.set()
+    job = submit(client, 'invalide').get_json()
+    failed = client.get(f"/api/jobs/{job['id']}?wait=5").get_json()
+    assert failed['status'] == 'failed'
+    assert failed['http_status'] == 422
+    assert failed['error'] == 'Réponse invalide: pas de code Mermaid détecté'
+
+
+@pytest.mark.parametrize('url, body, status', [
+    ('/api/jobs/inconnu', None, 404),
+    ('/api/jobs/inconnu?wait=abc', None, 400),
+    ('/api/jobs', {'type': 'video'}, 400),
+    ('/api/jobs', {'type': 'diagram', 'prompt': '  '}, 400),
+])
+def test_invalid_job_requests(jobs, client, url, body, status):
+    response = client.post(url, json=body) if body else client.get(url)
+    assert response.status_code == status
+    assert 'error' in response.get_json()
@@ -0,0 +1,83 @@
+"""Journalisation : niveaux et échantillonnage par catégorie, champs structurés, diagnostics PDF tirés une fois"""
+import io
+import json
+import logging
+import sys
+
+import pytest
+
+import app
+
+
+def record(level=logging.INFO, **extra):
+    entry = logging.makeLogRecord({'name': 'pathway.pdf', 'levelno': level, 'levelname': logging.getLevelName(level),
+                                   'msg': 'Export %s', 'args': ('CR.pdf',)})
+    entry.__dict__.update(extra)
+    return entry
+
+
+def test_category_settings_ignore_invalid_entries():
+    settings = app.parse_category_settings('pdf=DEBUG, models=warning,llm=BAVARD,=INFO,cache', app.log_level)
+    assert settings == {'pdf': logging.DEBUG, 'models': logging.WARNING}
+    assert app.parse_category_settings('pdf=0.05,llm=3,cache=x', app.sample_rate) == {'pdf': 0.05, 'llm': 1.0}
+
+
+def test_sampling_keeps_warnings_and_series_already_drawn():
+    never = app.SamplingFilter(0.0)
+    assert not never.filter(record(logging.INFO))
+    assert never.filter(record(logging.WARNING))
+    assert never.filter(record(logging.DEBUG, sampled=True))
+    assert app.SamplingFilter(1.0).filter(record(logging.DEBUG))
+
+
+def test_text_format_appends_extra_fields():
+    text = app.StructuredFormatter(False).format(record(pages=3, engine='mistral'))
+    assert text.endswith('INFO pathway.pdf: Export CR.pdf pages=3 engine=mistral')
+
+
+def test_json_format_is_one_object_per_line():
+    try:
+        raise ValueError('boom')
+    except ValueError:
+        entry = record(logging.ERROR, pages=3)
+        entry.exc_info = sys.exc_info()
+    line = app.StructuredFormatter(True).format(entry)
+    assert '\n' not in line
+    data = json.loads(line)
+    assert data['level'] == 'ERROR' and data['logger'] == 'pathway.pdf'
+    assert data['msg'] == 'Export CR.pdf' and data['pages'] == 3
+    assert 'ValueError: boom' in data['exc']
+
+
+@pytest.mark.parametrize('level, rates, expected', [
+    (logging.WARNING, {}, False),          # DEBUG désactivé : rien à construire
+    (logging.DEBUG, {}, True),
+    (logging.DEBUG, {'pdf': 0.0}, False),
+    (logging.DEBUG, {'pdf': 1.0}, True),
+])
+def test_log_sampled(monkeypatch, caplog, level, rates, expected):
+    monkeypatch.setattr(app, 'LOG_SAMPLE_RATES', rates)
+    caplog.set_level(level, logger='pathway.pdf')
+    assert app.log_sampled(app.pdf_log) is expected
+
+
+def test_pdf_export_emits_no_debug_output_at_the_default_level(caplog):
+    project = {'report': {'generated': '<h2>Décisions</h2><p>Recette</p>'},
+               'images': [{'data': 'data:image/png;base64,AAAA', 'title': 'cassée'}], 'pdfConfig': {}}
+    with caplog.at_level(logging.INFO, logger='pathway.pdf'):
+        app.render_pdf(project, io.BytesIO())
+    assert not [r for r in caplog.records if r.levelno < logging.INFO]
+    assert any(r.levelno == logging.WARNING for r in caplog.records)  # image illisible signalée
+
+
+def test_pdf_diagnostics_follow_the_sample_draw(monkeypatch, caplog):
+    report = '<p>Recette ■ validée</p>'
+    monkeypatch.setattr(app, 'LOG_SAMPLE_RATES', {'pdf': 0.0})
+    with caplog.at_level(logging.DEBUG, logger='pathway.pdf'):
+        app.build_report_recipe(report)
+    assert not [r for r in caplog.records if r.levelno == logging.DEBUG]
+    monkeypatch.setattr(app, 'LOG_SAMPLE_RATES', {'pdf': 1.0})
+    with caplog.at_level(logging.DEBUG, logger='pathway.pdf'):
+        app.build_report_recipe(report)
+    debug = [r for r in caplog.records if r.levelno == logging.DEBUG]
+    assert debug and all(getattr(r, 'sampled', False) for r in debug)
@@ -0,0 +1,57 @@
+"""Génération de diagrammes : le flux (MermaidStreamGuard) et l'appel bloquant extraient le même code"""
+import re
+
+import pytest
+
+import app
+
+TOKEN_RE = re.compile(r'\s*\S+|\s+')
+
+CASES = [
+    # (réponse du modèle, code attendu ; None : réponse rejetée)
+    ('```mermaid\nflowchart TD\n  A-->B\n```', 'flowchart TD\n  A-->B'),
+    ('Voici le diagramme :\n```mermaid\nflowchart TD\n  A-->B\n```\n', 'flowchart TD\n  A-->B'),
+    ('Voici un diagramme gantt :\n```\ngantt\n  title Plan\n```\nBonne lecture', 'gantt\n  title Plan'),
+    ('flowchart LR\n  A-->B', 'flowchart LR\n  A-->B'),
+    ('sequenceDiagram\n  A->>B: ADT\n```', 'sequenceDiagram\n  A->>B: ADT'),
+    ('---\ntitle: Flux\n---\nflowchart TD\n  A-->B', '---\ntitle: Flux\n---\nflowchart TD\n  A-->B'),
+    ('```mermaid\nflowchart TD\n  A-->B', 'flowchart TD\n  A-->B'),
+    ('Je ne peux pas produire ce diagramme.', None),
+]
+
+
+def stream(pieces):
+    """Rejoue le relais de /api/generate/stream : (code émis en deltas, code final ou None)"""
+    guard = app.MermaidStreamGuard()
+    deltas = []
+    for piece in pieces:
+        text = guard.feed(piece)
+        if guard.valid is False:
+            return ''.join(deltas), None
+        deltas.append(text)
+    code = guard.finish()
+    if code is not None and not guard.emitted:
+        deltas.append(code)
+    return ''.join(deltas), code
+
+
+@pytest.mark.parametrize('raw, expected', CASES)
+def test_blocking_extraction(raw, expected):
+    code = app.strip_mermaid_fences(raw).strip()
+    assert (code if app.is_valid_mermaid(code) else None) == expected
+
+
+@pytest.mark.parametrize('split', [TOKEN_RE.findall, list], ids=['tokens', 'chars'])
+@pytest.mark.parametrize('raw, expected', CASES)
+def test_stream_matches_blocking(raw, expected, split):
+    deltas, code = stream(split(raw))
+    assert code == expected
+    if expected is not None:
+        assert deltas.strip() == expected
+
+
+def test_prose_is_never_emitted_as_code():
+    guard = app.MermaidStreamGuard()
+    assert guard.feed('Voici le diagramme flowchart TD demandé :\n') == ''
+    assert guard.feed('```mermaid\n') == ''
+    assert guard.feed('flowchart TD\n') == 'flowchart TD\n'
@@ -0,0 +1,86 @@
+"""Métriques Prometheus : format texte, agrégation entre threads, requêtes par route et étapes PDF"""
+import threading
+
+import app
+
+
+def parse(text):
+    """Échantillons {ligne sans valeur: valeur} de l'exposition texte"""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            name, _, value = line.rpartition(' ')
+            samples[name] = float(value)
+    return samples
+
+
+def test_counters_gauges_and_histograms_are_rendered():
+    registry = app.MetricsRegistry()
+    calls = registry.counter('t_calls_total', 'Appels', ('route',))
+    idle = registry.gauge('t_idle', 'Jauge sans label')
+    latency = registry.histogram('t_seconds', 'Durées', buckets=(0.1, 1))
+    calls.inc('/a"b')
+    calls.inc('/a"b')
+    for value in (0.05, 0.5, 3):
+        latency.observe(value)
+
+    text = registry.render()
+    assert '# TYPE t_calls_total counter' in text
+    assert '# HELP t_seconds Durées' in text
+    samples = parse(text)
+    assert samples['t_calls_total{route="/a\\"b"}'] == 2
+    assert samples['t_idle'] == 0
+    assert samples['t_seconds_bucket{le="0.1"}'] == 1
+    assert samples['t_seconds_bucket{le="1.0"}'] == 2  # comptes cumulés
+    assert samples['t_seconds_bucket{le="+Inf"}'] == 3
+    assert samples['t_seconds_count'] == 3
+    assert samples['t_seconds_sum'] == 3.55
+
+
+def test_values_recorded_by_finished_threads_are_kept():
+    registry = app.MetricsRegistry()
+    calls = registry.counter('t_calls_total', 'Appels')
+
+    def work():
+        for _ in range(100):
+            calls.inc()
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert parse(registry.render())['t_calls_total'] == 400
+    calls.inc()
+    assert parse(registry.render())['t_calls_total'] == 401
+
+
+def test_requests_are_labelled_by_route_rule_and_error_class():
+    client = app.app.test_client()
+    before = parse(client.get('/metrics').get_data(as_text=True))
+    for project_id in ('inconnu-1', 'inconnu-2'):
+        # Enregistrée à la fermeture de la réponse, c'est-à-dire à la fin de l'envoi du corps
+        client.get(f'/api/projects/{project_id}').close()
+    response = client.get('/metrics')
+    assert response.content_type == 'text/plain; version=0.0.4; charset=utf-8'
+    after = parse(response.get_data(as_text=True))
+    key = 'pathway_http_requests_total{route="/api/projects/<project_id>",method="GET",status="404"}'
+    assert after[key] - before.get(key, 0) == 2
+    errors = 'pathway_http_errors_total{route="/api/projects/<project_id>",class="4xx"}'
+    assert after[errors] - before.get(errors, 0) == 2
+    assert not any('inconnu' in name for name in after)
+
+
+def test_pdf_export_records_its_stages():
+    client = app.app.test_client()
+    project = {'report': {'generated': '<h2>Décisions</h2><p>Recette validée</p>'}, 'pdfConfig': {}}
+    assert client.post('/api/generate-pdf', json={'project': project}).status_code == 200
+    samples = parse(client.get('/metrics').get_data(as_text=True))
+    assert samples['pathway_pdf_exports_total{mode="sync",outcome="ok"}'] >= 1
+    assert samples['pathway_pdf_stage_seconds_count{stage="build"}'] >= 1
+    assert samples['pathway_pdf_pages_count'] >= 1
+
+
+def test_model_labels_are_capped(monkeypatch):
+    monkeypatch.setattr(app, '_llm_model_labels', set())
+    monkeypatch.setattr(app, 'METRICS_MAX_MODELS', 2)
+    assert [app.llm_model_label('ollama', model) for model in ('a', 'b', 'c', 'a')] == ['a', 'b', 'other', 'a']
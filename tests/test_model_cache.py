@@ -0,0 +1,99 @@
+"""Listes de modèles en cache : servies périmées pendant leur rafraîchissement en arrière-plan"""
+import threading
+import time
+
+import pytest
+
+import app
+
+
+class Fetcher:
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.calls = 0
+        self.done = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        try:
+            answer = self.answers.pop(0)
+            if isinstance(answer, Exception):
+                raise answer
+            return answer
+        finally:
+            self.done.set()
+
+
+def wait_refreshed(cache, fetch):
+    """Attend la fin du rafraîchissement en arrière-plan (appel amont puis mise à jour de l'entrée)"""
+    assert fetch.done.wait(5)
+    deadline = time.monotonic() + 5
+    while cache._refreshing and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_first_read_fetches_then_fresh_reads_are_cached():
+    cache = app.ModelListCache(ttl=60)
+    fetch = Fetcher(['mistral'], ['llama3'])
+    key = cache.key('ollama', 'http://gpu:11434')
+    assert cache.get(key, fetch) == ['mistral']
+    assert cache.get(key, fetch) == ['mistral']
+    assert fetch.calls == 1
+
+
+def test_stale_list_is_served_while_refreshing_in_background():
+    cache = app.ModelListCache(ttl=0)
+    key = cache.key('ollama', 'http://gpu:11434')
+    cache.refresh(key, lambda: ['mistral'])
+    fetch = Fetcher(['mistral', 'llama3'])
+    assert cache.get(key, fetch) == ['mistral']  # ancienne liste, sans attendre le serveur
+    wait_refreshed(cache, fetch)
+    cache.ttl = 60
+    assert cache.get(key, fetch) == ['mistral', 'llama3']
+
+
+def test_failed_refresh_keeps_the_previous_list():
+    cache = app.ModelListCache(ttl=0)
+    key = cache.key('ollama', 'http://gpu:11434')
+    cache.refresh(key, lambda: ['mistral'])
+    fetch = Fetcher(ConnectionError('injoignable'))
+    assert cache.get(key, fetch) == ['mistral']
+    wait_refreshed(cache, fetch)
+    cache.ttl = 60
+    assert cache.get(key, fetch) == ['mistral']
+
+
+def test_entries_are_keyed_by_server_and_api_key_and_can_be_invalidated():
+    cache = app.ModelListCache(ttl=60)
+    first = cache.key('mistral', 'https://api.mistral.ai', 'cle-1')
+    second = cache.key('mistral', 'https://api.mistral.ai', 'cle-2')
+    assert first != second
+    assert 'cle-1' not in repr(first)  # seule une empreinte de la clé est conservée
+    cache.refresh(first, lambda: ['mistral-large'])
+    cache.invalidate('mistral')
+    fetch = Fetcher(['mistral-small'])
+    assert cache.get(first, fetch) == ['mistral-small']
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app, 'model_cache', app.ModelListCache(ttl=60))
+    monkeypatch.setitem(app.config, 'ollama_base_url', 'http://gpu:11434')
+    return app.app.test_client()
+
+
+def test_ollama_models_route_hits_the_server_once(client, monkeypatch):
+    fetch = Fetcher(['mistral'])
+    monkeypatch.setattr(app, 'fetch_ollama_models', lambda base_url: fetch())
+    for _ in range(3):
+        assert client.get('/api/ollama/models').get_json() == {'models': ['mistral']}
+    assert fetch.calls == 1
+
+
+def test_ollama_models_route_reports_an_unreachable_server(client, monkeypatch):
+    def unreachable(base_url):
+        raise app.requests.exceptions.ConnectionError('refusé')
+    monkeypatch.setattr(app, 'fetch_ollama_models', unreachable)
+    response = client.get('/api/ollama/models')
+    assert response.status_code == 503
+    assert response.get_json() == {'error': 'Ollama non disponible'}
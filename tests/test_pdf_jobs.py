@@ -0,0 +1,120 @@
+"""Exports PDF asynchrones : 202 puis téléchargement, attente d'une place du pool, purge des résultats"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import app
+
+PROJECT = {'report': {'generated': '<h2>Décisions</h2><p>Recette validée</p>'},
+           'pdfConfig': {'title': 'Compte rendu'}}
+
+
+@pytest.fixture
+def pdf_jobs(monkeypatch, tmp_path):
+    jobs = app.JobManager(1, 1, 60, name='test-pdf-job')
+    monkeypatch.setattr(app, 'pdf_jobs', jobs)
+    monkeypatch.setattr(app, 'pdf_results', app.PdfResultStore(str(tmp_path), 60, 10 ** 8, 60))
+    yield jobs
+    jobs.shutdown()
+
+
+def test_async_export_is_accepted_then_downloaded(pdf_jobs):
+    client = app.app.test_client()
+    response = client.post('/api/generate-pdf?async=1', json={'project': PROJECT})
+    assert response.status_code == 202
+    job = response.get_json()
+    assert job['poll'] == f"/api/pdf/{job['id']}"
+
+    pdf = client.get(job['poll'] + '?wait=10')
+    assert pdf.status_code == 200
+    assert pdf.mimetype == 'application/pdf'
+    assert pdf.data.startswith(b'%PDF')
+    assert 'attachment' in pdf.headers['Content-Disposition']
+    done = pdf_jobs.get(job['id'])
+    assert done['result']['download'] == job['poll']
+    assert done['progress']['stage'] == 'done'
+
+
+def test_async_export_accepted_when_the_queue_is_full_is_refused(pdf_jobs, monkeypatch):
+    release = threading.Event()
+    render = app.render_pdf_to_file
+    monkeypatch.setattr(app, 'render_pdf_to_file', lambda *args: release.wait(5) and render(*args))
+    client = app.app.test_client()
+    try:
+        # 1 export en cours + 1 en file : le suivant est refusé
+        assert client.post('/api/generate-pdf', json={'project': PROJECT, 'async': True}).status_code == 202
+        assert client.post('/api/generate-pdf', json={'project': PROJECT, 'async': True}).status_code == 202
+        response = client.post('/api/generate-pdf', json={'project': PROJECT, 'async': True})
+        assert response.status_code == 503
+        assert 'error' in response.get_json()
+    finally:
+        release.set()
+
+
+def test_pending_unknown_and_expired_exports(pdf_jobs, monkeypatch):
+    release = threading.Event()
+    render = app.render_pdf_to_file
+    monkeypatch.setattr(app, 'render_pdf_to_file', lambda *args: release.wait(5) and render(*args))
+    client = app.app.test_client()
+    job = client.post('/api/generate-pdf?async=1', json={'project': PROJECT}).get_json()
+    assert client.get(job['poll']).status_code == 202  # pas encore prêt
+    release.set()
+    assert client.get(job['poll'] + '?wait=10').status_code == 200
+
+    os.remove(app.pdf_results.path(job['id']))  # purgé après son TTL
+    assert client.get(job['poll']).status_code == 410
+    assert client.get('/api/pdf/inconnu').status_code == 404
+    assert client.get(job['poll'] + '?wait=abc').status_code == 400
+
+
+def thread_pool(monkeypatch, workers, queue, timeout):
+    """Pool de rendu dont les workers sont des threads (pas de processus à démarrer dans les tests)"""
+    pool = app.PdfRenderPool(workers, queue, timeout)
+    executor = ThreadPoolExecutor(max_workers=workers)
+    monkeypatch.setattr(pool, '_get_executor', lambda: executor)
+    return pool
+
+
+def test_waiting_call_gets_the_next_free_slot(monkeypatch):
+    pool = thread_pool(monkeypatch, 1, 0, 5)
+    release = threading.Event()
+    busy = threading.Thread(target=pool._call, args=(release.wait,))
+    busy.start()
+    time.sleep(0.05)
+
+    assert pool._call(sum, [1, 2]) is None  # export synchrone : refusé aussitôt
+    threading.Timer(0.1, release.set).start()
+    assert pool._call(sum, [1, 2], wait=True) == 3  # job asynchrone : attend la place
+    busy.join(5)
+    assert pool.snapshot()['rejected'] == 1
+
+
+def test_waiting_call_gives_up_after_the_timeout(monkeypatch):
+    pool = thread_pool(monkeypatch, 1, 0, 0.1)
+    pool._slots.acquire()  # place occupée par un rendu qui ne finit pas
+    try:
+        assert pool._call(sum, [1], wait=True) is None
+    finally:
+        pool._slots.release()
+
+
+def test_expired_results_are_purged_at_most_once_per_interval(tmp_path):
+    store = app.PdfResultStore(str(tmp_path), ttl=60, max_bytes=10 ** 6, sweep_interval=3600)
+    fresh, old = store.path('frais'), store.path('ancien')
+    for path in (fresh, old):
+        with open(path, 'wb') as f:
+            f.write(b'%PDF')
+    os.utime(old, (time.time() - 120, time.time() - 120))
+
+    store.evict_due()
+    assert os.path.exists(fresh) and not os.path.exists(old)
+
+    with open(old, 'wb') as f:
+        f.write(b'%PDF')
+    os.utime(old, (time.time() - 120, time.time() - 120))
+    store.evict_due()  # purge récente : rien à faire avant sweep_interval
+    assert os.path.exists(old)
+    assert store.snapshot() == {'expired': 1, 'evicted': 0}
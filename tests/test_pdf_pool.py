@@ -0,0 +1,39 @@
+"""Pool de rendu PDF : rendus abandonnés sur timeout et workers sans effets de bord du serveur"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import app
+
+
+def write_later(path, delay):
+    time.sleep(delay)
+    with open(path, 'wb') as f:
+        f.write(b'%PDF')
+
+
+def test_output_of_an_abandoned_render_is_removed(monkeypatch, tmp_path):
+    pool = app.PdfRenderPool(1, 0, 0.05)
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(pool, '_get_executor', lambda: executor)
+    path = str(tmp_path / 'export.pdf')
+
+    with pytest.raises(TimeoutError):
+        pool._call(write_later, path, 0.3, on_abandon=lambda: app.remove_file(path))
+    executor.shutdown(wait=True)  # le « worker » a fini et écrit son fichier...
+
+    assert not os.path.exists(path)  # ... aussitôt supprimé
+    assert pool.snapshot()['failed'] == 1
+
+
+def test_spawned_worker_skips_server_side_effects():
+    pool = app.PdfRenderPool(1, 0, 60)
+    try:
+        executor = pool._get_executor()
+        checks = "(__import__('app').PDF_WORKER_PROCESS, __import__('app').response_cache is None)"
+        assert executor.submit(eval, checks).result(60) == (True, True)
+    finally:
+        pool.shutdown()
+    assert app.PDF_WORKER_PROCESS is False
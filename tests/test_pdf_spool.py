@@ -0,0 +1,56 @@
+"""Exports PDF synchrones : rendu dans un fichier de spool envoyé par blocs puis supprimé"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import app
+
+PROJECT = {'report': {'generated': '<h2>Décisions</h2><p>Recette validée</p>'},
+           'pdfConfig': {'title': 'Compte rendu'}}
+
+
+def test_sync_export_is_streamed_with_its_length():
+    with app.app.test_client().post('/api/generate-pdf', json={'project': PROJECT}) as response:
+        assert response.status_code == 200
+        assert response.mimetype == 'application/pdf'
+        assert response.data.startswith(b'%PDF')
+        assert response.content_length == len(response.data)
+        assert 'attachment' in response.headers['Content-Disposition']
+
+
+def test_large_pdf_spills_from_memory_to_disk(monkeypatch):
+    monkeypatch.setattr(app, 'PDF_SPOOL_MAX_MB', 0.0001)  # ~100 octets
+    spool, filename, size, stats = app.render_pdf_spooled(PROJECT)
+    try:
+        assert spool._rolled
+        assert spool.read(4) == b'%PDF'
+        assert size > 100 and stats['pages'] == 1
+        assert filename.endswith('.pdf')
+    finally:
+        spool.close()
+
+
+def test_failed_render_leaves_no_partial_file(tmp_path, monkeypatch):
+    def broken(project, output, progress=None):
+        output.write(b'%PDF-incomplet')
+        raise RuntimeError('rendu interrompu')
+    monkeypatch.setattr(app, 'render_pdf', broken)
+    with pytest.raises(RuntimeError):
+        app.render_pdf_to_file(PROJECT, str(tmp_path / 'export.pdf'))
+    assert os.listdir(tmp_path) == []
+
+
+def test_spool_file_is_deleted_once_sent(tmp_path, monkeypatch):
+    # Pool dont les workers sont des threads : le PDF est écrit dans un fichier de spool
+    pool = app.PdfRenderPool(1, 0, 30)
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(pool, '_get_executor', lambda: executor)
+    monkeypatch.setattr(app, 'pdf_pool', pool)
+    monkeypatch.setattr(app, 'PDF_SPOOL_DIR', str(tmp_path))
+    with app.app.test_client().post('/api/generate-pdf', json={'project': PROJECT}) as response:
+        assert len(os.listdir(tmp_path)) == 1
+        assert response.data.startswith(b'%PDF')
+        assert response.content_length == len(response.data)
+    assert os.listdir(tmp_path) == []
+    executor.shutdown()
@@ -0,0 +1,43 @@
+"""Styles PDF par thème : construits une fois puis partagés par les exports de même thème"""
+import io
+
+import pytest
+
+import app
+
+
+def test_same_theme_reuses_the_same_styles():
+    config = {'theme': {'primary': '#123456', 'margins': {'left': 20, 'right': 15}}}
+    theme = app.pdf_theme_for(config)
+    assert app.pdf_theme_for({'theme': {'primary': '#123456', 'margins': {'left': 20, 'right': 15}}}) is theme
+    assert app.pdf_theme_for({'theme': {'primary': '#654321'}}) is not theme
+    assert theme.h1.textColor == app.colors.HexColor('#123456')
+    assert theme.available_width == pytest.approx(app.A4[0] - 35 * app.mm)
+
+
+def test_missing_theme_uses_the_default_colors_and_margins():
+    theme = app.pdf_theme_for({})
+    assert theme is app.get_pdf_theme('#0C4A45', 18, 18, 24, 28)
+    assert theme.top_margin == 24 * app.mm
+
+
+def test_list_styles_are_created_once_per_level():
+    theme = app.pdf_theme_for({})
+    assert theme.list_style(2) is theme.list_style(2)
+    assert theme.list_style(2).leftIndent == 60
+    assert theme.list_style(0) is not theme.list_style(1)
+
+
+def test_theme_cache_is_bounded():
+    assert app.get_pdf_theme.cache_info().maxsize == app.PDF_THEME_CACHE_SIZE
+
+
+def test_exports_with_the_same_theme_do_not_rebuild_styles():
+    project = {'report': {'generated': '<h2>Décisions</h2><p>Recette validée</p>'},
+               'pdfConfig': {'theme': {'primary': '#0A7B83'}}}
+    app.render_pdf(project, io.BytesIO())
+    before = app.get_pdf_theme.cache_info()
+    app.render_pdf(project, io.BytesIO())
+    after = app.get_pdf_theme.cache_info()
+    assert after.hits == before.hits + 1
+    assert after.misses == before.misses
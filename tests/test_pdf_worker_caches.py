@@ -0,0 +1,35 @@
+"""Caches de rendu du pool PDF : budgets répartis entre les workers, statistiques remontées et additionnées"""
+import app
+
+
+def test_worker_gets_its_share_of_the_cache_budgets(monkeypatch):
+    monkeypatch.setattr(app.image_cache, 'max_bytes', app.image_cache.max_bytes)
+    monkeypatch.setattr(app.diagram_cache, 'max_entries', app.diagram_cache.max_entries)
+    monkeypatch.setattr(app.report_recipes, 'max_entries', app.report_recipes.max_entries)
+    monkeypatch.setattr(app, 'DIAGRAM_CACHE_SIZE', 5)
+    monkeypatch.setattr(app, 'REPORT_RECIPE_CACHE_SIZE', 0)
+
+    app.warm_pdf_worker(None, 4)
+
+    assert app.image_cache.max_bytes == int(app.PDF_IMAGE_CACHE_MB * 1024 * 1024) // 4
+    assert app.diagram_cache.max_entries == 2
+    assert app.report_recipes.max_entries == 0
+
+
+def test_pool_sums_the_latest_stats_of_each_worker():
+    pool = app.PdfRenderPool(2, 0, 10)
+    first = app.pdf_cache_stats()
+    first['images'].update(hits=3, misses=1, prepare_ms=1.25)
+    second = {**app.pdf_cache_stats(), 'pid': first['pid'] + 1}
+    second['images'] = {**second['images'], 'hits': 2, 'misses': 4, 'prepare_ms': 2.5}
+    pool._record_caches(first)
+    pool._record_caches(second)
+    pool._record_caches({**first, 'images': {**first['images'], 'hits': 5}})
+
+    totals = pool.cache_snapshot()
+
+    assert totals['images']['hits'] == 7
+    assert totals['images']['misses'] == 5
+    assert totals['images']['prepare_ms'] == 3.8
+    assert totals['images']['max_bytes'] == 2 * app.image_cache.max_bytes
+    assert len(pool.snapshot()['caches']) == 2
@@ -0,0 +1,35 @@
+"""Mode production : limite de taille des requêtes et vidange de waitress à l'arrêt"""
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+from waitress import create_server
+
+import app
+
+
+@pytest.mark.parametrize('env, expected', [('production', 100 * 1024 * 1024), ('development', None)])
+def test_request_size_limit_defaults_to_production_only(env, expected):
+    environ = {k: v for k, v in os.environ.items() if k != 'MAX_CONTENT_LENGTH_MB'}
+    environ['PATHWAY_ENV'] = env
+    out = subprocess.run([sys.executable, '-c', "import app; print(app.app.config['MAX_CONTENT_LENGTH'])"],
+                         cwd=os.path.dirname(app.__file__), env=environ, capture_output=True, text=True, check=True)
+    assert out.stdout.split()[-1] == str(expected)
+
+
+def test_idle_waitress_server_is_drained():
+    server = create_server(app.app, host='127.0.0.1', port=0)
+    try:
+        # Les threads de waitress comptent comme actifs jusqu'à leur première attente de tâche
+        deadline = time.monotonic() + 5
+        while not app.waitress_drained(server) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert app.waitress_drained(server) is True
+    finally:
+        server.close()
+
+
+def test_unknown_waitress_internals_fall_back_to_the_full_timeout():
+    assert app.waitress_drained(object()) is None
@@ -0,0 +1,107 @@
+"""Projets côté serveur : sauvegardes incrémentales (sections, imageChanges) et contrôle de version"""
+import base64
+import io
+
+import pytest
+from PIL import Image
+
+import app
+
+
+def data_url():
+    """Image de bruit : sa data URL dépasse BLOB_MIN_CHARS et part donc dans la table des blobs"""
+    buffer = io.BytesIO()
+    Image.merge('RGB', [Image.effect_noise((32, 32), sigma) for sigma in (40, 60, 80)]).save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+FIRST, SECOND = data_url(), data_url()
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    monkeypatch.setattr(app, 'project_store', app.ProjectStore(str(tmp_path / 'projects.sqlite3')))
+    return app.app.test_client()
+
+
+def create(client, **project):
+    response = client.post('/api/projects', json={
+        'id': 'chu-1', 'name': 'CHU', 'report': {'generated': '<p>v1</p>'}, 'diagram': {'code': 'flowchart TD'},
+        'images': [{'id': 'a', 'title': 'Schéma', 'data': FIRST}, {'id': 'b', 'title': 'Copie', 'data': FIRST}],
+        **project})
+    assert response.status_code == 201
+    return response.get_json()
+
+
+def test_project_round_trips_with_images_stored_once(client):
+    summary = create(client)
+    assert summary == {**summary, 'id': 'chu-1', 'name': 'CHU', 'version': 1, 'images': 2}
+    project = client.get('/api/projects/chu-1').get_json()
+    assert [img['data'] for img in project['images']] == [FIRST, FIRST]
+    assert project['report'] == {'generated': '<p>v1</p>'}
+    assert app.project_store.snapshot()['blobs'] == 1
+
+
+def test_patch_rewrites_only_the_sections_sent(client):
+    create(client)
+    response = client.patch('/api/projects/chu-1', json={'report': {'generated': '<p>v2</p>'}, 'version': 1})
+    assert response.status_code == 200
+    assert response.get_json()['version'] == 2
+    project = client.get('/api/projects/chu-1').get_json()
+    assert project['report'] == {'generated': '<p>v2</p>'}
+    assert project['diagram'] == {'code': 'flowchart TD'}
+    assert len(project['images']) == 2
+
+
+def test_image_changes_upsert_delete_and_reorder(client):
+    create(client)
+    client.patch('/api/projects/chu-1', json={'imageChanges': {
+        'upsert': [{'id': 'a', 'title': 'Renommée'}, {'id': 'c', 'title': 'Nouvelle', 'data': SECOND}],
+        'delete': ['b'],
+        'order': ['c', 'a'],
+    }})
+    images = client.get('/api/projects/chu-1').get_json()['images']
+    assert [(img['id'], img['title']) for img in images] == [('c', 'Nouvelle'), ('a', 'Renommée')]
+    assert images[1]['data'] == FIRST  # métadonnées seules : l'image stockée est conservée
+    assert images[0]['data'] == SECOND
+
+
+def test_stale_version_is_rejected_with_409(client):
+    create(client)
+    assert client.patch('/api/projects/chu-1', json={'name': 'Onglet 1', 'version': 1}).status_code == 200
+    response = client.patch('/api/projects/chu-1', json={'name': 'Onglet 2', 'version': 1})
+    assert response.status_code == 409
+    assert 'version 2' in response.get_json()['error']
+    assert client.get('/api/projects/chu-1').get_json()['name'] == 'Onglet 1'
+
+
+def test_unused_images_are_collected(client):
+    create(client)
+    client.patch('/api/projects/chu-1', json={'imageChanges': {'delete': ['a', 'b']}})
+    assert app.project_store.snapshot()['blobs'] == 0
+
+
+def test_replayed_import_keeps_the_existing_project(client):
+    create(client)
+    response = client.post('/api/projects?keep_existing=1', json={'id': 'chu-1', 'name': 'Autre'})
+    assert response.status_code == 200
+    assert response.get_json()['name'] == 'CHU'
+    duplicate = client.post('/api/projects', json={'id': 'chu-1', 'name': 'Copie'}).get_json()
+    assert duplicate['id'] != 'chu-1'
+    assert client.get('/api/projects').get_json()['total'] == 2
+
+
+def test_unknown_or_invalid_requests(client):
+    assert client.patch('/api/projects/inconnu', json={'name': 'x'}).status_code == 404
+    assert client.get('/api/projects/inconnu').status_code == 404
+    assert client.delete('/api/projects/inconnu').status_code == 404
+    assert client.post('/api/projects', json=['pas', 'un', 'objet']).status_code == 400
+    assert client.get('/api/projects?page=abc').status_code == 400
+
+
+def test_stored_project_is_exported_by_id(client):
+    create(client, pdfConfig={'title': 'Compte rendu'})
+    response = client.post('/api/generate-pdf', json={'project_id': 'chu-1'})
+    assert response.status_code == 200
+    assert response.data.startswith(b'%PDF')
+    assert client.post('/api/generate-pdf', json={'project_id': 'inconnu'}).status_code == 404
@@ -0,0 +1,58 @@
+"""Nettoyage des comptes rendus : le flux (ReportStreamCleaner) et l'appel bloquant donnent le même texte"""
+import re
+
+import pytest
+
+import app
+
+TOKEN_RE = re.compile(r'\s*\S+|\s+')
+
+CASES = [
+    # (réponse du modèle, compte rendu attendu)
+    ('## Synthèse\nTexte\n\n## Décisions\n1. Go', '## Synthèse\nTexte\n\n## Décisions\n1. Go'),
+    ('# Titre\nTexte', '# Titre\nTexte'),
+    ('  \n## A\nTexte  \n\n', '## A\nTexte'),
+    ('Voici le compte rendu :\n\n## A\nTexte', '## A\nTexte'),
+    ('Intro\n# Titre\n## A\nTexte', '## A\nTexte'),
+    ('Intro\n### Détail\nTexte', '### Détail\nTexte'),
+    ('Pas de titre du tout.\nDeuxième ligne.', 'Pas de titre du tout.\nDeuxième ligne.'),
+    ('```markdown\n## A\nTexte\n```', '## A\nTexte'),
+    ('Voici :\n```markdown\n## A\nTexte\n```\nBonne lecture !', '## A\nTexte'),
+    ('```\n## A\nTexte\n```', '## A\nTexte'),
+    ('```md\nIntro\n## A\nTexte\n```', '## A\nTexte'),
+    ('```markdown\n## A\nTexte tronqué', '## A\nTexte tronqué'),
+    ('Intro\n```\nsans titre\n```\nfin', 'sans titre'),
+    ('## A\n```\nx\n```', '## A\n```\nx\n```'),
+    ('## A\n``\ninline', '## A\n``\ninline'),
+    ('', ''),
+]
+
+
+def feed_all(pieces):
+    cleaner = app.ReportStreamCleaner()
+    out = [cleaner.feed(piece) for piece in pieces]
+    out.append(cleaner.finish())
+    assert ''.join(out) == cleaner.text
+    return cleaner.text
+
+
+@pytest.mark.parametrize('raw, expected', CASES)
+def test_blocking_cleaner(raw, expected):
+    assert app.clean_report_markdown(raw) == expected
+
+
+@pytest.mark.parametrize('raw, expected', CASES)
+def test_stream_matches_blocking_token_by_token(raw, expected):
+    assert feed_all(TOKEN_RE.findall(raw)) == app.clean_report_markdown(raw) == expected
+
+
+@pytest.mark.parametrize('raw, expected', CASES)
+def test_stream_matches_blocking_char_by_char(raw, expected):
+    assert feed_all(list(raw)) == expected
+
+
+def test_heading_is_emitted_before_the_line_ends():
+    cleaner = app.ReportStreamCleaner()
+    assert cleaner.feed('Intro\n') == ''
+    assert cleaner.feed('## Synth') == '## Synth'
+    assert cleaner.feed('èse\nTexte') == 'èse\nTexte'
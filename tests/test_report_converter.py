@@ -0,0 +1,44 @@
+"""Conversion HTML du compte rendu -> recette PDF : mêmes recettes que l'ancien convertisseur BeautifulSoup"""
+import pytest
+from lxml import html as lxml_html
+
+import app
+from report_converter_reference import EDGE_CASES, quill_report
+
+
+@pytest.fixture(scope='module')
+def reference_converter():
+    pytest.importorskip('bs4')
+    from report_converter_reference import legacy_report_recipe
+    return legacy_report_recipe
+
+
+def lxml_recipe(html_input):
+    return app.ReportHtmlConverter().convert(lxml_html.document_fromstring(html_input).body)
+
+
+def assert_same_recipe(reference_converter, html_input):
+    html_input = app.sanitize_report_html(html_input)
+    assert lxml_recipe(html_input) == reference_converter(html_input)
+
+
+@pytest.mark.parametrize('html_input', EDGE_CASES, ids=range(1, len(EDGE_CASES) + 1))
+def test_edge_cases_match_reference(reference_converter, html_input):
+    assert_same_recipe(reference_converter, html_input)
+
+
+@pytest.mark.parametrize('items', [10, 200])
+def test_synthetic_quill_reports_match_reference(reference_converter, items):
+    assert_same_recipe(reference_converter, quill_report(items))
+
+
+def test_recipe_keeps_formatting_lists_and_tables():
+    recipe = lxml_recipe(app.sanitize_report_html(
+        '<h2>Décisions</h2><p>Flux <b>HL7</b> validé</p><ol><li>Recette<ul><li>MOA</li></ul></li></ol>'
+        '<table><thead><tr><th>Action</th></tr></thead><tbody><tr><td>Go-live</td></tr></tbody></table>'))
+    assert ('paragraph', 'Décisions', 'h2') in recipe
+    assert ('paragraph', 'Flux <b>HL7</b> validé', 'normal') in recipe
+    assert ('paragraph', '1.  Recette', ('list', 0)) in recipe
+    assert ('paragraph', '- MOA', ('list', 1)) in recipe
+    assert ('table', (('table_header_cell', ('<font color="white"><b>Action</b></font>',)),
+                      ('table_cell', ('Go-live',)))) in recipe
@@ -0,0 +1,56 @@
+"""Recettes de compte rendu mémorisées par HTML : conversion une fois, flowables neufs à chaque export"""
+import io
+
+import app
+
+REPORT = '<h2>Décisions</h2><p>Flux <b>HL7</b> validé</p><ul><li>Recette</li></ul>'
+
+
+def test_same_report_is_converted_once(monkeypatch):
+    cache = app.ReportRecipeCache(4)
+    calls = []
+    build = app.build_report_recipe
+    monkeypatch.setattr(app, 'build_report_recipe', lambda html_input: calls.append(html_input) or build(html_input))
+    recipe = cache.get(REPORT)
+    assert cache.get(REPORT) is recipe
+    assert calls == [REPORT]
+    assert cache.snapshot() == {'hits': 1, 'misses': 1, 'evictions': 0, 'entries': 1, 'max_entries': 4}
+
+
+def test_edited_report_gets_a_new_recipe_and_old_ones_are_evicted():
+    cache = app.ReportRecipeCache(2)
+    first = cache.get(REPORT)
+    assert cache.get(REPORT + '<p>Ajout</p>') != first
+    cache.get('<p>Troisième version</p>')
+    assert cache.snapshot()['evictions'] == 1
+    cache.get(REPORT)
+    assert cache.snapshot()['misses'] == 4
+
+
+def test_zero_size_disables_memoization():
+    cache = app.ReportRecipeCache(0)
+    cache.get(REPORT)
+    cache.get(REPORT)
+    assert cache.snapshot()['misses'] == 2
+    assert cache.snapshot()['entries'] == 0
+
+
+def test_recipe_is_immutable_and_theme_independent():
+    recipe = app.ReportRecipeCache(1).get(REPORT)
+    assert isinstance(recipe, tuple) and all(isinstance(op, tuple) for op in recipe)
+    red = app.report_flowables(recipe, app.pdf_theme_for({'theme': {'primary': '#AA0000'}}))
+    blue = app.report_flowables(recipe, app.pdf_theme_for({'theme': {'primary': '#0000AA'}}))
+    assert red[0].style.textColor == app.colors.HexColor('#AA0000')
+    assert blue[0].style.textColor == app.colors.HexColor('#0000AA')
+    assert red[0] is not blue[0]  # flowables neufs à chaque document
+
+
+def test_second_export_of_the_same_report_hits_the_cache(monkeypatch):
+    cache = app.ReportRecipeCache(4)
+    monkeypatch.setattr(app, 'report_recipes', cache)
+    project = {'report': {'generated': REPORT}, 'pdfConfig': {}}
+    first, second = io.BytesIO(), io.BytesIO()
+    app.render_pdf(project, first)
+    app.render_pdf(project, second)
+    assert cache.snapshot()['hits'] == 1
+    assert first.getvalue()[:4] == second.getvalue()[:4] == b'%PDF'
@@ -0,0 +1,69 @@
+"""Validation des requêtes de compte rendu : erreurs JSON 400 (et 500 JSON en dernier recours), jamais de page HTML"""
+import pytest
+
+import app
+
+ROUTES = ['/api/generate-report', '/api/generate-report/stream']
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setitem(app.config, 'mistral_api_key', 'test')
+    return app.app.test_client()
+
+
+@pytest.mark.parametrize('route', ROUTES)
+@pytest.mark.parametrize('body, message', [
+    ({'notes': 5}, 'Le champ notes doit être du texte'),
+    ({'notes': ['a']}, 'Le champ notes doit être du texte'),
+    ({'notes': 'Réunion', 'meta': 'CHU'}, 'Le champ meta doit être un objet'),
+    ({'notes': 'Réunion', 'template': ['client_formel']}, "Template inconnu: ['client_formel']"),
+    ({'notes': '  '}, 'Notes requises'),
+    (['Réunion'], 'Notes requises'),
+])
+def test_invalid_body_is_a_json_400(client, route, body, message):
+    response = client.post(route, json=body)
+    assert response.status_code == 400
+    assert response.get_json() == {'error': message}
+
+
+@pytest.mark.parametrize('route', ROUTES)
+def test_missing_body_is_a_json_400(client, route):
+    response = client.post(route, data='pas du JSON')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Notes requises'}
+
+
+def test_null_meta_is_accepted(client, monkeypatch):
+    seen = {}
+
+    def fake_run_report(notes, template, meta):
+        seen.update(notes=notes, meta=meta)
+        return app.jsonify({'report': '## CR'}), 200
+    monkeypatch.setattr(app, 'run_report', fake_run_report)
+
+    response = client.post('/api/generate-report', json={'notes': ' Réunion ', 'meta': None})
+    assert response.status_code == 200
+    assert seen == {'notes': 'Réunion', 'meta': {}}
+
+
+def test_unexpected_error_is_a_json_500(client, monkeypatch):
+    def broken(notes, template, meta):
+        raise RuntimeError('panne')
+    monkeypatch.setattr(app, 'run_report', broken)
+
+    response = client.post('/api/generate-report', json={'notes': 'Réunion'})
+    assert response.status_code == 500
+    assert response.get_json() == {'error': 'Erreur lors de la génération du compte rendu: panne'}
+
+
+def test_coalescing_key_error_is_a_json_500(client, monkeypatch):
+    # Clé de regroupement construite hors de generate_mistral_report : ses erreurs restent en JSON, jobs compris
+    def broken(template, user_prompt, stream=False):
+        raise ValueError('modèle introuvable')
+    monkeypatch.setattr(app, 'build_report_request', broken)
+
+    with app.app.app_context():
+        response, status = app.run_report('Réunion', 'client_formel', {})
+    assert status == 500
+    assert response.get_json() == {'error': 'Erreur lors de la génération du compte rendu: modèle introuvable'}
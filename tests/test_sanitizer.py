@@ -0,0 +1,57 @@
+"""Nettoyage du HTML de compte rendu en une étape : même texte que l'ancienne chaîne de generate_pdf"""
+import pytest
+from lxml import html as lxml_html
+
+import app
+from sanitizer_reference import SQUARE_CHARS, legacy_clean_squares, legacy_sanitize, quill_report
+
+CASES = [
+    '<p>Migration ■ vers FHIR ▪ validée</p>',
+    '<p>Entités &#9632; &#x25AA; &#9633; &#x2B1B; conservées : &#233;t&#xE9; &#60;</p>',
+    '<p>Le client&nbsp;a&#160;validé&#xA0;le\xa0planning</p>',
+    '<p>Espaces\u200binvisibles\u200c&zwj;et&zwnj;liés\u2060ici &#8203;</p>',
+    '<ol><li data-list="bullet"><span class="ql-ui"></span>Point</li><li data-list=\'ordered\'>Suite</li></ol>',
+    '<ul><li data-list="checked">Coché</li><li class="x" data-list="bullet" data-x="1">Puce</li></ul>',
+    '<p>Puces conservées • et · ; flèches → et ⇒</p>',
+    '<p>Blocs ▀ ▄ █ ░ et ⬜ ⬛ ◆ ◇</p>',
+    '',
+]
+
+
+def text_nodes(html_input, clean):
+    """Texte de chaque nœud après nettoyage, comme le lit le convertisseur PDF"""
+    if not html_input.strip():
+        return []
+    root = lxml_html.document_fromstring(html_input)
+    return [clean(text) for text in root.itertext() if clean(text)]
+
+
+@pytest.mark.parametrize('html_input', CASES + [quill_report(4)])
+def test_same_text_as_the_legacy_cleaning(html_input):
+    legacy = text_nodes(legacy_sanitize(html_input), legacy_clean_squares)
+    assert text_nodes(app.sanitize_report_html(html_input), app.clean_squares) == legacy
+
+
+def test_list_attributes_and_squares_are_removed_and_counted():
+    stats = {}
+    cleaned = app.sanitize_report_html(quill_report(2), stats)
+    assert 'data-list' not in cleaned
+    assert not any(char in cleaned for char in SQUARE_CHARS)
+    assert '&nbsp;' not in cleaned and '\u200b' not in cleaned
+    assert stats['squares'] > 0 and stats['invisible'] > 0 and stats['list_attrs'] > 0
+
+
+def test_clean_html_is_returned_unchanged():
+    html_input = '<h2>Décisions</h2><p>Flux <b>HL7</b> validé &amp; recetté — 12/03</p>'
+    stats = {}
+    assert app.sanitize_report_html(html_input, stats) == html_input
+    assert stats == {'squares': 0, 'invisible': 0, 'list_attrs': 0}
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('  Planning ▪ de\u200brecette\xa0 validé  ', 'Planning de recette validé'),
+    ('Puce • conservée', 'Puce • conservée'),
+    ('', ''),
+])
+def test_clean_squares(text, expected):
+    assert app.clean_squares(text) == expected
@@ -0,0 +1,128 @@
+"""Générations en streaming identiques et simultanées : un seul appel amont, même flux pour tous"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import app
+
+MERMAID = ['flowchart TD\n', '  A[Admission] --> B[DPI]\n', '  B --> C[ACK]']
+REPORT = ['## Compte rendu\n\n', '### Décisions\n', '- Flux HL7 validés']
+
+
+class Upstream(ThreadingHTTPServer):
+    """LLM factice : compte les appels et retient sa réponse jusqu'à ce que le test la libère"""
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), UpstreamHandler)
+        self.calls = 0
+        self.release = threading.Event()
+
+
+class UpstreamHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self.server.calls += 1
+        self.server.release.wait(5)
+        if self.path == '/api/generate':
+            lines = [json.dumps({'response': piece, 'done': False}) + '\n' for piece in MERMAID]
+            lines.append(json.dumps({'response': '', 'done': True}) + '\n')
+            content_type = 'application/x-ndjson'
+        else:
+            lines = [f"data: {json.dumps({'choices': [{'delta': {'content': piece}}]})}\n\n" for piece in REPORT]
+            lines.append('data: [DONE]\n\n')
+            content_type = 'text/event-stream'
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for line in lines:
+            data = line.encode('utf-8')
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+            self.wfile.flush()
+            time.sleep(0.01)
+        self.wfile.write(b'0\r\n\r\n')
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    server = Upstream()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}'
+    monkeypatch.setitem(app.config, 'ollama_base_url', url)
+    monkeypatch.setitem(app.config, 'mistral_base_url', url)
+    monkeypatch.setitem(app.config, 'mistral_api_key', 'test')
+    monkeypatch.setattr(app, 'response_cache', None)
+    monkeypatch.setattr(app, 'stream_flights', app.StreamFlight())
+    yield server
+    server.release.set()
+    server.shutdown()
+    server.server_close()
+
+
+def release_when_coalesced(server, count):
+    """Libère la réponse amont une fois `count` suiveurs rattachés à la génération en cours"""
+    deadline = time.monotonic() + 5
+    while app.stream_flights.stats['coalesced'] < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    server.release.set()
+
+
+def post(route, body, results, read=True):
+    with app.app.test_client().post(route, json=body) as response:
+        results.append((response.status_code, response.get_data(as_text=True) if read else None))
+
+
+def events(body):
+    return [line[len('event: '):] for line in body.splitlines() if line.startswith('event: ')]
+
+
+@pytest.mark.parametrize('route, body, final', [
+    ('/api/generate/stream', {'prompt': 'Admission patient', 'engine': 'ollama', 'model': 'mistral'}, 'mermaid'),
+    ('/api/generate-report/stream', {'notes': 'Recette des flux HL7 validée', 'template': 'client_formel'}, 'report'),
+])
+def test_identical_streams_share_one_upstream_call(upstream, route, body, final):
+    results = []
+    clients = [threading.Thread(target=post, args=(route, body, results)) for _ in range(2)]
+    for client in clients:
+        client.start()
+    release_when_coalesced(upstream, 1)
+    for client in clients:
+        client.join(10)
+
+    assert upstream.calls == 1
+    assert app.stream_flights.snapshot() == {'leaders': 1, 'coalesced': 1, 'in_flight': 0}
+    assert [status for status, _ in results] == [200, 200]
+    assert results[0][1] == results[1][1]
+    assert events(results[0][1])[-1] == 'done'
+    done = json.loads(results[0][1].rstrip().splitlines()[-1][len('data: '):])
+    assert done[final]
+
+
+def test_follower_completes_when_leader_disconnects(upstream):
+    body = {'prompt': 'Admission patient', 'engine': 'ollama', 'model': 'mistral'}
+    route = '/api/generate/stream'
+    leader, follower = [], []
+    # Le meneur ferme sa réponse sans la lire ; le suiveur doit tout de même recevoir le diagramme
+    leading = threading.Thread(target=post, args=(route, body, leader, False))
+    leading.start()
+    while app.stream_flights.stats['leaders'] < 1:
+        time.sleep(0.01)
+    following = threading.Thread(target=post, args=(route, body, follower))
+    following.start()
+    release_when_coalesced(upstream, 1)
+    leading.join(10)
+    following.join(10)
+
+    assert upstream.calls == 1
+    assert events(follower[0][1])[-1] == 'done'
+    assert 'error' not in events(follower[0][1])
+    assert app.stream_flights.snapshot()['in_flight'] == 0